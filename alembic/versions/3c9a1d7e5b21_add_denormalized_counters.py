@@ -0,0 +1,56 @@
+"""add_denormalized_counters
+
+Revision ID: 3c9a1d7e5b21
+Revises: e20a04e2ac13
+Create Date: 2026-10-19 09:12:41.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1d7e5b21'
+down_revision: Union[str, None] = 'e20a04e2ac13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('posts', sa.Column('media_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('categories', sa.Column('post_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('tags', sa.Column('post_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # Backfill from the existing rows
+    op.execute("""
+        UPDATE posts SET comment_count = c.cnt
+        FROM (SELECT post_id, COUNT(*) AS cnt FROM comments GROUP BY post_id) AS c
+        WHERE posts.post_id = c.post_id
+    """)
+    op.execute("""
+        UPDATE posts SET media_count = m.cnt
+        FROM (SELECT post_id, COUNT(*) AS cnt FROM media WHERE post_id IS NOT NULL GROUP BY post_id) AS m
+        WHERE posts.post_id = m.post_id
+    """)
+    op.execute("""
+        UPDATE categories SET post_count = pc.cnt
+        FROM (SELECT category_id, COUNT(*) AS cnt FROM post_categories GROUP BY category_id) AS pc
+        WHERE categories.category_id = pc.category_id
+    """)
+    op.execute("""
+        UPDATE tags SET post_count = pt.cnt
+        FROM (SELECT tag_id, COUNT(*) AS cnt FROM post_tags GROUP BY tag_id) AS pt
+        WHERE tags.tag_id = pt.tag_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tags', 'post_count')
+    op.drop_column('categories', 'post_count')
+    op.drop_column('posts', 'media_count')
+    op.drop_column('posts', 'comment_count')
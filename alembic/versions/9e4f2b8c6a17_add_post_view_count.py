@@ -0,0 +1,36 @@
+"""add_post_view_count
+
+Revision ID: 9e4f2b8c6a17
+Revises: 3c9a1d7e5b21
+Create Date: 2026-10-19 10:03:17.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4f2b8c6a17'
+down_revision: Union[str, None] = '3c9a1d7e5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('view_count', sa.BigInteger(), server_default=sa.text('0'), nullable=False))
+    op.create_index(op.f('ix_posts_view_count'), 'posts', ['view_count'], unique=False)
+    op.create_table('post_view_flushes',
+    sa.Column('batch_id', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('batch_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('post_view_flushes')
+    op.drop_index(op.f('ix_posts_view_count'), table_name='posts')
+    op.drop_column('posts', 'view_count')
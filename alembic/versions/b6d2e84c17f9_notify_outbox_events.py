@@ -0,0 +1,51 @@
+"""notify_outbox_events
+
+Revision ID: b6d2e84c17f9
+Revises: a3f9c2e71b04
+Create Date: 2026-10-19 17:41:06.582310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d2e84c17f9'
+down_revision: Union[str, None] = 'a3f9c2e71b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # NOTIFY payloads are capped at 8000 bytes; bigger events go out
+    # without their payload and listeners drop everything instead
+    op.execute("""
+        CREATE FUNCTION notify_outbox_event() RETURNS trigger AS $$
+        DECLARE
+            message text := json_build_object(
+                'topic', NEW.topic, 'aggregate_id', NEW.aggregate_id, 'payload', NEW.payload
+            )::text;
+        BEGIN
+            IF octet_length(message) > 7900 THEN
+                message := json_build_object(
+                    'topic', NEW.topic, 'aggregate_id', NEW.aggregate_id, 'overflow', true
+                )::text;
+            END IF;
+            PERFORM pg_notify('outbox', message);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER outbox_notify AFTER INSERT ON outbox
+        FOR EACH ROW EXECUTE FUNCTION notify_outbox_event()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS outbox_notify ON outbox")
+    op.execute("DROP FUNCTION IF EXISTS notify_outbox_event()")
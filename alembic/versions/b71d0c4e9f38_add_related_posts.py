@@ -0,0 +1,40 @@
+"""add_related_posts
+
+Revision ID: b71d0c4e9f38
+Revises: 9e4f2b8c6a17
+Create Date: 2026-10-19 11:26:05.730114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71d0c4e9f38'
+down_revision: Union[str, None] = '9e4f2b8c6a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('related_posts',
+    sa.Column('post_id', sa.UUID(), nullable=False),
+    sa.Column('related_post_id', sa.UUID(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.post_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['related_post_id'], ['posts.post_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'related_post_id')
+    )
+    op.create_index('ix_related_posts_post_id_score', 'related_posts', ['post_id', sa.text('score DESC')], unique=False)
+    op.create_index('ix_related_posts_related_post_id', 'related_posts', ['related_post_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_related_posts_related_post_id', table_name='related_posts')
+    op.drop_index('ix_related_posts_post_id_score', table_name='related_posts')
+    op.drop_table('related_posts')
@@ -0,0 +1,28 @@
+"""index_post_tags_tag_id
+
+Revision ID: c4a8e1f2d903
+Revises: b71d0c4e9f38
+Create Date: 2026-10-19 12:02:41.218653
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e1f2d903'
+down_revision: Union[str, None] = 'b71d0c4e9f38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_post_tags_tag_id', 'post_tags', ['tag_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_tags_tag_id', table_name='post_tags')
@@ -0,0 +1,57 @@
+"""add_comment_path
+
+Revision ID: d5e2a7c9b140
+Revises: c4a8e1f2d903
+Create Date: 2026-10-19 13:41:07.532916
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e2a7c9b140'
+down_revision: Union[str, None] = 'c4a8e1f2d903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same segment as app.service.comment.path_segment: 13 hex digits of the
+# creation time in microseconds, then 3 hex digits of the comment id
+SEGMENT = (
+    "lpad(to_hex((extract(epoch FROM c.created_at) * 1000000)::bigint), 13, '0')"
+    " || left(replace(c.comment_id::text, '-', ''), 3)"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('comments', sa.Column('path', sa.Text(collation='C'), nullable=True))
+    op.add_column('comments', sa.Column('depth', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # Backfill by walking each thread from its root
+    op.execute(f"""
+        WITH RECURSIVE tree AS (
+            SELECT c.comment_id, ({SEGMENT}) COLLATE "C" AS path, 0 AS depth
+            FROM comments c
+            WHERE c.parent_id IS NULL
+            UNION ALL
+            SELECT c.comment_id, (tree.path || {SEGMENT}) COLLATE "C", tree.depth + 1
+            FROM comments c
+            JOIN tree ON c.parent_id = tree.comment_id
+        )
+        UPDATE comments SET path = tree.path, depth = tree.depth
+        FROM tree
+        WHERE comments.comment_id = tree.comment_id
+    """)
+
+    op.alter_column('comments', 'path', nullable=False)
+    op.create_index('ix_comments_post_id_path', 'comments', ['post_id', 'path'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comments_post_id_path', table_name='comments')
+    op.drop_column('comments', 'depth')
+    op.drop_column('comments', 'path')
@@ -0,0 +1,43 @@
+"""add_comment_reply_count
+
+Revision ID: e8b3f61d2a57
+Revises: d5e2a7c9b140
+Create Date: 2026-10-19 14:26:53.104227
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f61d2a57'
+down_revision: Union[str, None] = 'd5e2a7c9b140'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('comments', sa.Column('reply_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # Backfill from the existing rows
+    op.execute("""
+        UPDATE comments SET reply_count = r.cnt
+        FROM (SELECT parent_id, COUNT(*) AS cnt FROM comments WHERE parent_id IS NOT NULL GROUP BY parent_id) AS r
+        WHERE comments.comment_id = r.parent_id
+    """)
+
+    op.create_index('ix_comments_parent_id_path', 'comments', ['parent_id', 'path'], unique=False)
+    op.create_index(
+        'ix_comments_post_id_root_path', 'comments', ['post_id', 'path'], unique=False,
+        postgresql_where=sa.text('parent_id IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comments_post_id_root_path', table_name='comments', postgresql_where=sa.text('parent_id IS NULL'))
+    op.drop_index('ix_comments_parent_id_path', table_name='comments')
+    op.drop_column('comments', 'reply_count')
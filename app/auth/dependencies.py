@@ -7,9 +7,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 import uuid
 
-from ..database import get_db
+from ..database import get_db, get_loader
 from ..models import User
 from ..config import settings
+from ..utils.security.revocation import revocation_epochs
 
 security = HTTPBearer()
 
@@ -29,6 +30,9 @@ async def get_current_user(
         user_id_str: str = payload.get("sub")
         if user_id_str is None:
             raise credentials_exception
+        # Refresh tokens are only good for /auth/refresh
+        if payload.get("type") != "access":
+            raise credentials_exception
         
         try:
             user_id = uuid.UUID(user_id_str)
@@ -48,10 +52,12 @@ async def get_current_user(
             
     except jwt.InvalidTokenError:
         raise credentials_exception
+
+    # Signed out everywhere since this token was issued
+    if not await revocation_epochs.is_current(user_id_str, payload.get("epc", 0)):
+        raise credentials_exception
     
-    query = select(User).where(User.user_id == user_id)
-    result = await db.execute(query)
-    user = result.scalar_one_or_none()
+    user = await get_loader(db).load(User, user_id)
     
     if user is None:
         raise credentials_exception
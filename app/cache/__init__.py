@@ -0,0 +1,15 @@
+from fastapi_cache.backends.redis import RedisBackend
+
+from .redis import redis_client, redis_blocking_client
+from .backend import FallbackBackend, MemoryBackend, CacheMetrics, MODE_REDIS, MODE_MEMORY
+from .decorator import cached, result_tags, tag_key
+from .batch import EntityCache, batch_ids, entity_key
+
+# Process-wide cache backend used by FastAPICache
+cache_backend = FallbackBackend(RedisBackend(redis_client))
+
+__all__ = [
+    'redis_client', 'redis_blocking_client', 'cache_backend', 'FallbackBackend', 'MemoryBackend',
+    'CacheMetrics', 'MODE_REDIS', 'MODE_MEMORY', 'cached', 'result_tags', 'tag_key', 'EntityCache', 'batch_ids',
+    'entity_key'
+]
@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+MODE_REDIS = "redis"
+MODE_MEMORY = "memory"
+
+# KEYS: tag sets; deletes every key in them and the sets themselves
+PURGE_TAGS_SCRIPT = """
+local deleted = 0
+for _, tag in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag)
+    for i = 1, #members, 500 do
+        deleted = deleted + redis.call('DEL', unpack(members, i, math.min(i + 499, #members)))
+    end
+    redis.call('DEL', tag)
+end
+return deleted
+"""
+
+
+class MemoryBackend(Backend):
+    """Bounded in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._store: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # tag -> keys tagged with it; may name keys already evicted
+        self._tags: Dict[str, Set[str]] = {}
+
+    def _get(self, key: str) -> Optional[Tuple[float, str]]:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        expires_at, _ = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._store[key]
+            return None
+        self._store.move_to_end(key)
+        return entry
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str]]:
+        entry = self._get(key)
+        if entry is None:
+            return 0, None
+        expires_at, value = entry
+        ttl = int(expires_at - time.monotonic()) if expires_at else -1
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._get(key)
+        return entry[1] if entry else None
+
+    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + expire if expire else 0.0
+        self._store[key] = (expires_at, value)
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_entries:
+            self._store.popitem(last=False)
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, items: Dict[str, str], expire: Optional[int] = None) -> None:
+        for key, value in items.items():
+            await self.set(key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            keys = [k for k in self._store if k.startswith(namespace)]
+            for k in keys:
+                del self._store[k]
+            return len(keys)
+        elif key:
+            return 1 if self._store.pop(key, None) is not None else 0
+        return 0
+
+    def tag(self, keys: Iterable[str], tags: Iterable[str]) -> None:
+        keys = list(keys)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).update(keys)
+        if sum(map(len, self._tags.values())) > self.max_entries * 4:
+            # Forget evicted and expired keys
+            self._tags = {
+                tag: live for tag, members in self._tags.items() if (live := members & self._store.keys())
+            }
+
+    def purge(self, tags: Iterable[str], keys: Iterable[str] = ()) -> int:
+        """Delete `keys` and every key tagged with one of `tags`"""
+        doomed = set(keys)
+        for tag in tags:
+            doomed |= self._tags.pop(tag, set())
+        return sum(self._store.pop(key, None) is not None for key in doomed)
+
+    def flush(self) -> None:
+        self._store.clear()
+        self._tags.clear()
+
+    @property
+    def size(self) -> int:
+        # Not __len__: FastAPICache asserts the backend is truthy
+        return len(self._store)
+
+
+def _memory_expire(expire: Optional[int]) -> int:
+    return min(expire, settings.CACHE_MEMORY_MAX_EXPIRE) if expire else settings.CACHE_MEMORY_MAX_EXPIRE
+
+
+@dataclass
+class CacheMetrics:
+    mode: str = MODE_REDIS
+    mode_changes: int = 0
+    failovers: int = 0
+    recoveries: int = 0
+    redis_errors: int = 0
+    memory_hits: int = 0
+    memory_misses: int = 0
+    last_mode_change: Optional[float] = None
+    last_error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class FallbackBackend(Backend):
+    """
+    Cache backend that serves from Redis while it is healthy and from a
+    bounded in-process cache while it is not.
+
+    A few consecutive Redis errors (from requests or from the periodic ping)
+    switch to memory mode; from then on requests never touch Redis, so they
+    don't pay connection timeouts. The health check loop switches back once
+    Redis answers pings again.
+
+    Memory entries live at most CACHE_MEMORY_MAX_EXPIRE seconds, whatever
+    was asked for: the purges that keep long-lived entries correct reach
+    them only through the invalidation bus (service.invalidation_bus),
+    which may be down or disabled too.
+    """
+
+    def __init__(
+        self,
+        redis_backend: RedisBackend,
+        max_entries: int = settings.CACHE_MEMORY_MAX_ENTRIES,
+        check_interval: float = settings.CACHE_HEALTH_CHECK_INTERVAL,
+        failure_threshold: int = settings.CACHE_FAILURE_THRESHOLD,
+        recovery_threshold: int = settings.CACHE_RECOVERY_THRESHOLD,
+    ):
+        self.redis_backend = redis_backend
+        self.memory_backend = MemoryBackend(max_entries=max_entries)
+        self.check_interval = check_interval
+        self.failure_threshold = failure_threshold
+        self.recovery_threshold = recovery_threshold
+        self.metrics = CacheMetrics()
+        self._failures = 0
+        self._successes = 0
+        self._task: Optional[asyncio.Task] = None
+        self._purge_tags = redis_backend.redis.register_script(PURGE_TAGS_SCRIPT)
+
+    @property
+    def mode(self) -> str:
+        return self.metrics.mode
+
+    @property
+    def redis(self):
+        return self.redis_backend.redis
+
+    def _switch(self, mode: str) -> None:
+        if self.metrics.mode == mode:
+            return
+        self.metrics.mode = mode
+        self.metrics.mode_changes += 1
+        self.metrics.last_mode_change = time.time()
+        if mode == MODE_MEMORY:
+            self.metrics.failovers += 1
+            logger.warning("Redis unavailable, cache switched to in-memory mode")
+        else:
+            self.metrics.recoveries += 1
+            # Entries written while degraded may be stale once Redis is back
+            self.memory_backend.flush()
+            logger.info("Redis recovered, cache switched back to redis mode")
+
+    def _record_failure(self, exc: Exception) -> None:
+        self.metrics.redis_errors += 1
+        self.metrics.last_error = repr(exc)
+        self._successes = 0
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._switch(MODE_MEMORY)
+
+    def _record_success(self) -> None:
+        self._failures = 0
+        if self.metrics.mode == MODE_MEMORY:
+            self._successes += 1
+            if self._successes >= self.recovery_threshold:
+                self._successes = 0
+                self._switch(MODE_REDIS)
+
+    async def check_health(self) -> bool:
+        try:
+            await self.redis.ping()
+        except Exception as e:
+            self._record_failure(e)
+            return False
+        self._record_success()
+        return True
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_health()
+
+    async def start(self) -> None:
+        """Probe Redis once and start the periodic health check task"""
+        if not await self.check_health():
+            # Don't wait for the threshold on startup, Redis is simply not there
+            self._switch(MODE_MEMORY)
+        if self._task is None:
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str]]:
+        if self.metrics.mode == MODE_REDIS:
+            try:
+                result = await self.redis_backend.get_with_ttl(key)
+                self._failures = 0
+                return result
+            except Exception as e:
+                self._record_failure(e)
+        ttl, value = await self.memory_backend.get_with_ttl(key)
+        if value is None:
+            self.metrics.memory_misses += 1
+        else:
+            self.metrics.memory_hits += 1
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[str]:
+        _, value = await self.get_with_ttl(key)
+        return value
+
+    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+        if self.metrics.mode == MODE_REDIS:
+            try:
+                await self.redis_backend.set(key, value, expire)
+                self._failures = 0
+                return
+            except Exception as e:
+                self._record_failure(e)
+        await self.memory_backend.set(key, value, _memory_expire(expire))
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[str]]:
+        """One MGET round trip for many keys"""
+        if not keys:
+            return []
+        if self.metrics.mode == MODE_REDIS:
+            try:
+                values = await self.redis.mget(keys)
+                self._failures = 0
+                return list(values)
+            except Exception as e:
+                self._record_failure(e)
+        values = await self.memory_backend.get_many(keys)
+        hits = sum(value is not None for value in values)
+        self.metrics.memory_hits += hits
+        self.metrics.memory_misses += len(values) - hits
+        return values
+
+    async def set_many(self, items: Dict[str, str], expire: Optional[int] = None) -> None:
+        """Many SETs in one pipelined round trip"""
+        if not items:
+            return
+        if self.metrics.mode == MODE_REDIS:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, value in items.items():
+                        pipe.set(key, value, ex=expire)
+                    await pipe.execute()
+                self._failures = 0
+                return
+            except Exception as e:
+                self._record_failure(e)
+        await self.memory_backend.set_many(items, _memory_expire(expire))
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        # Always clear the local copy as well so a later failover can't serve it
+        count = await self.memory_backend.clear(namespace, key)
+        if self.metrics.mode == MODE_REDIS:
+            try:
+                count += await self.redis_backend.clear(namespace, key)
+            except Exception as e:
+                self._record_failure(e)
+        return count
+
+    async def tag(self, keys: Sequence[str], tags: Sequence[str], expire: int) -> None:
+        """
+        Record that `keys` depend on `tags` (tag set keys), so purge() can
+        find them. Sets live at least `expire` seconds after their last
+        addition.
+        """
+        if not keys or not tags:
+            return
+        if self.metrics.mode == MODE_REDIS:
+            try:
+                ttl = max(expire, settings.CACHE_TAG_TTL)
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for tag in tags:
+                        pipe.sadd(tag, *keys)
+                        pipe.expire(tag, ttl)
+                    await pipe.execute()
+                self._failures = 0
+                return
+            except Exception as e:
+                self._record_failure(e)
+        self.memory_backend.tag(keys, tags)
+
+    async def purge(self, tags: Sequence[str], keys: Sequence[str] = ()) -> int:
+        """
+        Delete `keys` and everything tagged with `tags`, here and in Redis.
+        Unlike the other methods this raises when Redis fails or isn't in
+        use (memory mode), so callers that must not lose an invalidation
+        can retry it.
+        """
+        count = self.memory_backend.purge(tags, keys)
+        if self.metrics.mode != MODE_REDIS:
+            # Redis still holds its copies, whatever this worker serves now
+            raise ConnectionError("Cache in memory mode, Redis entries not purged")
+        try:
+            if tags:
+                count += await self._purge_tags(keys=list(tags))
+            if keys:
+                count += await self.redis.delete(*keys)
+            self._failures = 0
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        return count
+
+    def stats(self) -> dict:
+        data = self.metrics.as_dict()
+        data["memory_entries"] = self.memory_backend.size
+        data["memory_max_entries"] = self.memory_backend.max_entries
+        return data
@@ -0,0 +1,255 @@
+import base64
+import hashlib
+import inspect
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import wraps
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Union
+
+from fastapi_cache import FastAPICache
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ..config import settings
+from ..models import User
+from ..utils.compression import negotiate_encoding, compress
+from ..utils.fieldsets import Shaped
+from ..utils.serialization import dump_json
+
+REQUEST_PARAM = "_cache_request"
+
+# Variants stored next to a cached body, purged with it
+KEY_SUFFIXES = ("", ":meta", ":gzip", ":br")
+
+TagSpec = Union[str, Callable[[dict, Any], Iterable[str]]]
+
+
+def tag_key(tag: str) -> str:
+    """Key of the set holding the cache keys tagged `tag`"""
+    return f"{FastAPICache.get_prefix()}:tag:{tag}"
+
+
+def request_key_builder(func, namespace: str, kwargs: dict) -> str:
+    """
+    Cache key from the endpoint and its resolved parameters.
+    Sessions are left out and users are reduced to their id, so the key is
+    the same for every request asking for the same thing.
+    """
+    params = []
+    for name, value in sorted(kwargs.items()):
+        if isinstance(value, AsyncSession):
+            continue
+        if isinstance(value, User):
+            value = value.user_id
+        params.append((name, value))
+    raw = f"{func.__module__}:{func.__name__}:{params}"
+    return f"{FastAPICache.get_prefix()}:{namespace}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def serialize_result(request: Request, result: Any) -> str:
+    """Serialize an endpoint result the way its route's response_model would"""
+    route = request.scope.get("route")
+    return dump_json(getattr(route, "response_model", None), result).decode()
+
+
+def _field(item: Any, name: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name, None)
+
+
+def _items(result: Any) -> list:
+    if isinstance(result, Shaped):
+        result = result.content
+    return list(result) if isinstance(result, (list, tuple)) else [result]
+
+
+def result_tags(name: str, id_attr: str, fallback: str, **related: str) -> Callable[[dict, Any], List[str]]:
+    """
+    Tags naming the entities in a result: ``<name>:<id>`` per item and,
+    for each ``tag_name="relation.id_attr"``, ``<tag_name>:<id>`` per
+    related entity embedded in it, one or a list (``tag="tags.tag_id"``).
+    Items whose id a sparse fieldset left out are tagged `fallback`
+    instead.
+    """
+    def tags(kwargs: dict, result: Any) -> List[str]:
+        found = set()
+        for item in _items(result):
+            entity_id = _field(item, id_attr)
+            found.add(f"{name}:{entity_id}" if entity_id is not None else fallback)
+            for tag_name, path in related.items():
+                relation, related_id = path.split(".")
+                children = _field(item, relation)
+                if not isinstance(children, (list, tuple)):
+                    children = [] if children is None else [children]
+                for child in children:
+                    child_id = _field(child, related_id)
+                    if child_id is not None:
+                        found.add(f"{tag_name}:{child_id}")
+        return sorted(found)
+    return tags
+
+
+def tags_of(specs: Sequence[TagSpec], kwargs: dict, result: Any) -> List[str]:
+    """Tag set keys for a result: templates formatted with the endpoint's parameters, callables applied"""
+    tags = set()
+    for spec in specs:
+        if callable(spec):
+            tags.update(spec(kwargs, result))
+        else:
+            tags.add(spec.format(**kwargs))
+    return [tag_key(tag) for tag in sorted(tags)]
+
+
+def stored_now() -> str:
+    """
+    Last-Modified of a body being cached: the time it's stored. Not the
+    newest updated_at in it, which list removals and counter updates leave
+    alone, so clients would be told a changed body is unmodified. A purge
+    or expiry stores a new body and moves this on.
+    """
+    return format_datetime(datetime.now(timezone.utc), usegmt=True)
+
+
+def etag_of(body: str) -> str:
+    return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    """Strong ETag of an encoded representation: same hash, encoding suffix"""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def _strip_variant(tag: str) -> str:
+    tag = tag[2:] if tag.startswith("W/") else tag
+    for encoding in ("-br", "-gzip"):
+        if tag.endswith(f'{encoding}"'):
+            return tag[:-len(encoding) - 1] + '"'
+    return tag
+
+
+def is_not_modified(request: Request, meta: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since (RFC 9110 13.1.3);
+        # any encoding of the same body counts as a match
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or meta["etag"] in map(_strip_variant, tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and meta.get("last_modified"):
+        try:
+            return parsedate_to_datetime(meta["last_modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _validator_headers(meta: dict, max_age: int, encoding: Optional[str] = None) -> dict:
+    headers = {
+        "ETag": variant_etag(meta["etag"], encoding),
+        "Cache-Control": f"max-age={max(max_age, 0)}",
+        "Vary": "Accept-Encoding",
+    }
+    if meta.get("last_modified"):
+        headers["Last-Modified"] = meta["last_modified"]
+    return headers
+
+
+async def _encoded_body(backend, key: str, body: str, encoding: str, ttl: int) -> bytes:
+    """The cached compressed variant of a body, compressing and storing it on first use"""
+    variant_key = f"{key}:{encoding}"
+    stored = await backend.get(variant_key)
+    if stored is not None:
+        return base64.b64decode(stored)
+    data = compress(body.encode(), encoding)
+    if ttl > 0:
+        await backend.set(variant_key, base64.b64encode(data).decode(), ttl)
+    return data
+
+
+def cached(expire: int = 60, namespace: str = "", tags: Sequence[TagSpec] = ()):
+    """
+    Cache a GET endpoint's serialized response and answer conditional requests.
+
+    The response body is stored already serialized, next to a small metadata
+    entry holding its strong ETag (hash of the body) and Last-Modified (when
+    the body was stored). A request carrying If-None-Match or
+    If-Modified-Since that matches the metadata gets a 304 without the
+    endpoint running and without reading the body from the cache.
+
+    Bodies above COMPRESSION_MIN_SIZE are also stored gzip/brotli encoded
+    (``key:gzip`` / ``key:br``, same lifetime as the body) the first time a
+    client asks for that encoding, so hot entries are compressed once rather
+    than by the compression middleware on every hit.
+
+    `tags` name what the response depends on, so a change can purge it
+    (see service.outbox) rather than wait for it to expire: format strings
+    over the endpoint's parameters (``"post:{post_id}"``) or callables of
+    the parameters and the result (``result_tags(...)``). Clients are told
+    max-age CACHE_CLIENT_MAX_AGE at most for tagged responses, since a
+    purge can't reach their copy.
+    """
+    def max_age(ttl: int) -> int:
+        return min(ttl, settings.CACHE_CLIENT_MAX_AGE) if tags else ttl
+
+    def wrapper(func):
+        signature = inspect.signature(func)
+        func.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            request: Request = kwargs.pop(REQUEST_PARAM)
+            if request.headers.get("Cache-Control") in ("no-store", "no-cache") or not FastAPICache.get_enable():
+                return await func(*args, **kwargs)
+
+            backend = FastAPICache.get_backend()
+            key = request_key_builder(func, namespace, kwargs)
+            meta_key = f"{key}:meta"
+
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+
+            conditional = "if-none-match" in request.headers or "if-modified-since" in request.headers
+            meta_raw = await backend.get(meta_key) if conditional else None
+            if meta_raw is not None:
+                meta = json.loads(meta_raw)
+                if is_not_modified(request, meta):
+                    ttl, _ = await backend.get_with_ttl(meta_key)
+                    variant = encoding if meta.get("size", 0) >= settings.COMPRESSION_MIN_SIZE else None
+                    return Response(status_code=304, headers=_validator_headers(meta, max_age(ttl), variant))
+
+            ttl, body = await backend.get_with_ttl(key)
+            if body is not None:
+                if meta_raw is None:
+                    meta_raw = await backend.get(meta_key)
+                meta = json.loads(meta_raw) if meta_raw else {"etag": etag_of(body)}
+            else:
+                result = await func(*args, **kwargs)
+                if isinstance(result, Response):
+                    return result
+                body = serialize_result(request, result)
+                meta = {"etag": etag_of(body), "last_modified": stored_now(), "size": len(body)}
+                await backend.set(key, body, expire)
+                await backend.set(meta_key, json.dumps(meta), expire)
+                if tags and hasattr(backend, "tag"):
+                    await backend.tag([key + suffix for suffix in KEY_SUFFIXES], tags_of(tags, kwargs, result), expire)
+                ttl = expire
+
+            if len(body) < settings.COMPRESSION_MIN_SIZE:
+                encoding = None
+            headers = _validator_headers(meta, max_age(ttl), encoding)
+            if is_not_modified(request, meta):
+                return Response(status_code=304, headers=headers)
+            if encoding is None:
+                return Response(content=body, media_type="application/json", headers=headers)
+            content = await _encoded_body(backend, key, body, encoding, ttl)
+            headers["Content-Encoding"] = encoding
+            return Response(content=content, media_type="application/json", headers=headers)
+
+        return inner
+
+    return wrapper
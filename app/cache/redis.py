@@ -0,0 +1,23 @@
+from redis import asyncio as aioredis
+
+from ..config import settings
+
+# Shared client for the whole process. Short socket timeouts keep a Redis
+# outage from stalling request handlers while the cache backend fails over.
+redis_client = aioredis.from_url(
+    settings.REDIS_URL,
+    encoding="utf-8",
+    decode_responses=True,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+)
+
+# For long-lived subscriptions and blocking reads, which sit idle on the
+# socket by design and so can't use the short read timeout above.
+redis_blocking_client = aioredis.from_url(
+    settings.REDIS_URL,
+    encoding="utf-8",
+    decode_responses=True,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    health_check_interval=30,
+)
@@ -7,10 +7,8 @@ from typing import AsyncGenerator
 load_dotenv()
 
 async def get_redis() -> AsyncGenerator[Redis, None]:
-    try:
-        yield redis
-    finally:
-        await redis.close()
+    from .cache.redis import redis_client
+    yield redis_client
 
 class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL")
@@ -24,4 +22,118 @@ class Settings:
     API_KEY: str = os.getenv("API_KEY")
     API_SECRET: str = os.getenv("API_SECRET")
 
-settings = Settings()
\ No newline at end of file
+    # Redis / cache settings
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379")
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+    CACHE_HEALTH_CHECK_INTERVAL: float = float(os.getenv("CACHE_HEALTH_CHECK_INTERVAL", "5"))
+    CACHE_FAILURE_THRESHOLD: int = int(os.getenv("CACHE_FAILURE_THRESHOLD", "3"))
+    CACHE_RECOVERY_THRESHOLD: int = int(os.getenv("CACHE_RECOVERY_THRESHOLD", "2"))
+    CACHE_MEMORY_MAX_ENTRIES: int = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "10000"))
+
+    # Post view counter: in-process buffer -> Redis -> Postgres
+    VIEW_LOCAL_FLUSH_INTERVAL: float = float(os.getenv("VIEW_LOCAL_FLUSH_INTERVAL", "1"))
+    VIEW_DB_FLUSH_INTERVAL: float = float(os.getenv("VIEW_DB_FLUSH_INTERVAL", "30"))
+
+    # Trending posts: time-decayed score per post
+    TRENDING_HALF_LIFE_HOURS: float = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "6"))
+    TRENDING_VIEW_WEIGHT: float = float(os.getenv("TRENDING_VIEW_WEIGHT", "1"))
+    TRENDING_COMMENT_WEIGHT: float = float(os.getenv("TRENDING_COMMENT_WEIGHT", "5"))
+    TRENDING_PUBLISH_WEIGHT: float = float(os.getenv("TRENDING_PUBLISH_WEIGHT", "20"))
+
+    # Related posts: weighted Jaccard over tags and categories
+    RELATED_POSTS_K: int = int(os.getenv("RELATED_POSTS_K", "10"))
+    RELATED_TAG_WEIGHT: float = float(os.getenv("RELATED_TAG_WEIGHT", "1"))
+    RELATED_CATEGORY_WEIGHT: float = float(os.getenv("RELATED_CATEGORY_WEIGHT", "0.5"))
+    RELATED_MAX_FEATURE_POSTS: int = int(os.getenv("RELATED_MAX_FEATURE_POSTS", "5000"))
+
+    # Response compression
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", "5"))
+
+    # Taxonomy snapshot
+    TAXONOMY_VERSION_CHECK_INTERVAL: float = float(os.getenv("TAXONOMY_VERSION_CHECK_INTERVAL", "1"))
+    TAXONOMY_MAX_AGE: float = float(os.getenv("TAXONOMY_MAX_AGE", "60"))
+
+    # Batch multi-get endpoints
+    BATCH_MAX_IDS: int = int(os.getenv("BATCH_MAX_IDS", "100"))
+    ENTITY_CACHE_EXPIRE: int = int(os.getenv("ENTITY_CACHE_EXPIRE", "60"))
+
+    # Comment threads: 16 bytes of path per level keeps index entries well
+    # under Postgres' btree limit (~2.7kB) up to this depth
+    COMMENT_MAX_DEPTH: int = int(os.getenv("COMMENT_MAX_DEPTH", "100"))
+    # Replies returned under a comment by writes and the per-user listing;
+    # the rest are behind the comment's replies_cursor
+    COMMENT_REPLY_PREVIEW: int = int(os.getenv("COMMENT_REPLY_PREVIEW", "3"))
+
+    # Live comment stream (SSE)
+    COMMENT_STREAM_HISTORY: int = int(os.getenv("COMMENT_STREAM_HISTORY", "500"))
+    COMMENT_STREAM_HISTORY_TTL: int = int(os.getenv("COMMENT_STREAM_HISTORY_TTL", "86400"))
+    COMMENT_STREAM_KEEPALIVE: float = float(os.getenv("COMMENT_STREAM_KEEPALIVE", "15"))
+    COMMENT_STREAM_QUEUE_SIZE: int = int(os.getenv("COMMENT_STREAM_QUEUE_SIZE", "100"))
+    COMMENT_STREAM_MAX_SUBSCRIBERS: int = int(os.getenv("COMMENT_STREAM_MAX_SUBSCRIBERS", "10000"))
+
+    # Rate limiting: token buckets in Redis, per worker while it's down
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
+    # Comment creates and replies: per user, and for everyone together
+    COMMENT_WRITE_LIMIT: int = int(os.getenv("COMMENT_WRITE_LIMIT", "10"))
+    COMMENT_WRITE_PERIOD: float = float(os.getenv("COMMENT_WRITE_PERIOD", "60"))
+    COMMENT_WRITE_GLOBAL_LIMIT: int = int(os.getenv("COMMENT_WRITE_GLOBAL_LIMIT", "600"))
+
+    # bcrypt cost (log2 rounds); pick it with benchmarks/bench_bcrypt_cost.py.
+    # Changing it upgrades stored hashes as users log in.
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+    # Login brute-force protection: lockouts double past the free attempts
+    LOGIN_EMAIL_FREE_ATTEMPTS: int = int(os.getenv("LOGIN_EMAIL_FREE_ATTEMPTS", "5"))
+    LOGIN_IP_FREE_ATTEMPTS: int = int(os.getenv("LOGIN_IP_FREE_ATTEMPTS", "20"))
+    LOGIN_BACKOFF_BASE: float = float(os.getenv("LOGIN_BACKOFF_BASE", "1"))
+    LOGIN_BACKOFF_MAX: float = float(os.getenv("LOGIN_BACKOFF_MAX", "900"))
+    LOGIN_FAILURE_WINDOW: int = int(os.getenv("LOGIN_FAILURE_WINDOW", "3600"))
+    # bcrypt verifications in flight per worker, and how long to queue for one
+    LOGIN_HASH_CONCURRENCY: int = int(os.getenv("LOGIN_HASH_CONCURRENCY", "4"))
+    LOGIN_HASH_QUEUE_TIMEOUT: float = float(os.getenv("LOGIN_HASH_QUEUE_TIMEOUT", "2"))
+
+    # Token revocation: how long a worker trusts the epochs it has read,
+    # i.e. how late another worker may notice a logout-everywhere
+    REVOCATION_EPOCH_CACHE_TTL: float = float(os.getenv("REVOCATION_EPOCH_CACHE_TTL", "5"))
+    REVOCATION_EPOCH_CACHE_SIZE: int = int(os.getenv("REVOCATION_EPOCH_CACHE_SIZE", "100000"))
+
+    # Background jobs: "redis" (run by python -m app.jobs.worker) or
+    # "memory" (run inside the API process; tests, local development)
+    JOB_QUEUE_MODE: str = os.getenv("JOB_QUEUE_MODE", "redis")
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_BASE: float = float(os.getenv("JOB_RETRY_BASE", "2"))
+    JOB_RETRY_MAX: float = float(os.getenv("JOB_RETRY_MAX", "600"))
+    JOB_TIMEOUT: float = float(os.getenv("JOB_TIMEOUT", "300"))
+    JOB_IDEMPOTENCY_TTL: int = int(os.getenv("JOB_IDEMPOTENCY_TTL", "3600"))
+    JOB_HEARTBEAT_TTL: int = int(os.getenv("JOB_HEARTBEAT_TTL", "30"))
+    JOB_DEAD_MAX: int = int(os.getenv("JOB_DEAD_MAX", "1000"))
+
+    # Outbox: changes are published by a relay in every API worker, which
+    # purges the cache entries tagged with what changed. The relays are
+    # woken by the invalidation bus; polling is the fallback for when it's
+    # down or disabled.
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    # Longer than taxonomy snapshots take to catch up, see app/service/outbox.py
+    OUTBOX_REPURGE_DELAY: float = float(os.getenv("OUTBOX_REPURGE_DELAY", "2"))
+    OUTBOX_STREAM_MAXLEN: int = int(os.getenv("OUTBOX_STREAM_MAXLEN", "100000"))
+    # Lifetimes of tag-invalidated responses: taxonomy reads change only
+    # through the outbox; post reads also carry view counts, which don't
+    # publish events and so are as stale as CACHE_POST_EXPIRE allows
+    CACHE_LONG_EXPIRE: int = int(os.getenv("CACHE_LONG_EXPIRE", "86400"))
+    CACHE_POST_EXPIRE: int = int(os.getenv("CACHE_POST_EXPIRE", "600"))
+    # Clients can't be told about purges: they get this max-age at most
+    # and revalidate with the ETag
+    CACHE_CLIENT_MAX_AGE: int = int(os.getenv("CACHE_CLIENT_MAX_AGE", "60"))
+    CACHE_TAG_TTL: int = int(os.getenv("CACHE_TAG_TTL", "86400"))
+    CACHE_MEMORY_MAX_EXPIRE: int = int(os.getenv("CACHE_MEMORY_MAX_EXPIRE", "60"))
+
+    # Postgres LISTEN/NOTIFY: one connection per worker, outside the pool,
+    # drops in-process state when the outbox records a change
+    INVALIDATION_BUS_ENABLED: bool = os.getenv("INVALIDATION_BUS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+settings = Settings()
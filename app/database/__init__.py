@@ -1 +1,2 @@
 from .session import get_db, init_db, Base, engine, AsyncSessionLocal
+from .loader import get_loader, loader_stats
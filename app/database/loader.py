@@ -0,0 +1,176 @@
+"""
+Request-scoped primary-key loader.
+
+Every request gets its own AsyncSession (get_db) and, kept in
+``session.info``, an EntityLoader. Services fetch users, posts, tags and
+categories by primary key through it instead of issuing their own SELECT:
+
+- an entity already in the session's identity map, with every column and
+  the relationships the caller asks for loaded, is returned without a
+  query, so a permission check followed by the service's own lookup of the
+  same row costs one query instead of two;
+- lookups issued together (``load_many``, or several ``load`` calls awaited
+  with asyncio.gather) go out as one ``IN`` query per model and set of
+  relationships, each relationship selectin-loaded once for the batch;
+- ids known not to exist are remembered for the rest of the request.
+
+Each loader counts the lookups asked of it and the queries it ran; the
+difference is what it saved. Totals are logged at DEBUG when the session
+closes and accumulated process-wide in ``loader_stats``.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import inspect as sa_inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.util import identity_key
+
+logger = logging.getLogger(__name__)
+
+INFO_KEY = "entity_loader"
+
+
+@dataclass
+class LoaderStats:
+    requests: int = 0
+    lookups: int = 0
+    queries: int = 0
+
+    @property
+    def saved(self) -> int:
+        return self.lookups - self.queries
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["saved"] = self.saved
+        return data
+
+
+# Process-wide totals, fed by every request's loader
+loader_stats = LoaderStats()
+
+
+class EntityLoader:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.stats = LoaderStats(requests=1)
+        self._missing: set = set()
+        self._pending: Dict[Tuple[Any, Tuple[str, ...]], Dict[Hashable, asyncio.Future]] = {}
+        self._lock = asyncio.Lock()
+        self._tasks: set = set()
+
+    def _resident(self, model, pk, relations: Tuple[str, ...]):
+        """The entity from the identity map if it has everything the caller needs"""
+        entity = self.db.sync_session.identity_map.get(identity_key(model, pk))
+        if entity is None:
+            return None
+        state = sa_inspect(entity)
+        if state.deleted or state.detached:
+            return None
+        needed = {attr.key for attr in state.mapper.column_attrs}
+        needed.update(relations)
+        if needed & state.unloaded:
+            return None
+        return entity
+
+    async def load(self, model, pk, relations: Iterable[str] = ()) -> Optional[Any]:
+        """One entity by primary key, or None; batched with concurrent loads"""
+        relations = tuple(sorted(relations))
+        self.stats.lookups += 1
+        entity = self._resident(model, pk, relations)
+        if entity is not None or (model, pk) in self._missing:
+            return entity
+
+        key = (model, relations)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = {}
+            # Let every load issued in this turn of the event loop join the batch
+            asyncio.get_running_loop().call_soon(self._schedule, key)
+        future = batch.get(pk)
+        if future is None:
+            future = batch[pk] = asyncio.get_running_loop().create_future()
+        return await asyncio.shield(future)
+
+    async def load_many(self, model, pks: Sequence, relations: Iterable[str] = ()) -> Dict[Hashable, Any]:
+        """Entities by primary key; ids that don't exist are left out"""
+        relations = tuple(relations)
+        entities = await asyncio.gather(*(self.load(model, pk, relations) for pk in dict.fromkeys(pks)))
+        return {pk: entity for pk, entity in zip(dict.fromkeys(pks), entities) if entity is not None}
+
+    def _schedule(self, key) -> None:
+        task = asyncio.ensure_future(self._dispatch(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, key) -> None:
+        model, relations = key
+        batch = self._pending.pop(key)
+        try:
+            async with self._lock:
+                rows = await self._query(model, list(batch), relations)
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        found = {sa_inspect(row).identity[0]: row for row in rows}
+        for pk, future in batch.items():
+            if pk not in found:
+                self._missing.add((model, pk))
+            if not future.done():
+                future.set_result(found.get(pk))
+
+    async def _query(self, model, pks, relations, populate_existing: bool = False):
+        (pk_column,) = sa_inspect(model).primary_key
+        query = (
+            select(model)
+            .where(pk_column.in_(pks) if len(pks) > 1 else pk_column == pks[0])
+            .options(*(selectinload(getattr(model, name)) for name in relations))
+        )
+        if populate_existing:
+            query = query.execution_options(populate_existing=True)
+        self.stats.queries += 1
+        result = await self.db.execute(query)
+        return result.scalars().all()
+
+    async def reload(self, model, pk, relations: Iterable[str] = ()) -> Optional[Any]:
+        """Fresh copy of an entity after a write, overwriting what the session holds"""
+        self.stats.lookups += 1
+        async with self._lock:
+            rows = await self._query(model, [pk], tuple(sorted(relations)), populate_existing=True)
+        return rows[0] if rows else None
+
+    def close(self) -> None:
+        if self.stats.lookups:
+            logger.debug(
+                "Entity loader: %d lookups, %d queries, %d saved",
+                self.stats.lookups, self.stats.queries, self.stats.saved,
+            )
+        loader_stats.requests += 1
+        loader_stats.lookups += self.stats.lookups
+        loader_stats.queries += self.stats.queries
+
+
+def get_loader(db: AsyncSession) -> EntityLoader:
+    """The loader of this session (i.e. of this request), created on first use"""
+    loader = db.info.get(INFO_KEY)
+    if loader is None:
+        loader = db.info[INFO_KEY] = EntityLoader(db)
+    return loader
+
+
+def close_loader(db: AsyncSession) -> None:
+    loader = db.info.pop(INFO_KEY, None)
+    if loader is not None:
+        loader.close()
+
+
+__all__ = ['EntityLoader', 'LoaderStats', 'loader_stats', 'get_loader', 'close_loader']
@@ -2,6 +2,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import text
 from ..config import settings
+from .loader import close_loader
 
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -20,7 +21,10 @@ Base = declarative_base()
 
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
+        try:
+            yield session
+        finally:
+            close_loader(session)
 
 async def init_db():
     async with engine.begin() as conn:
@@ -1,8 +1,10 @@
+from uuid import UUID
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from .database.session import get_db
+from .database.loader import get_loader
 from .models.user import User
 from .utils.security.jwt import verify_token
 
@@ -12,13 +14,10 @@ async def get_current_user(
 ):
     try:
         token_data = credentials.credentials
-        payload = verify_token(token_data)
+        payload = await verify_token(token_data)
         
         # Get user from database based on user_id in token
-        result = await db.execute(
-            select(User).where(User.user_id == payload.sub)
-        )
-        user = result.scalars().first()
+        user = await get_loader(db).load(User, UUID(str(payload.sub)))
         
         if not user:
             raise HTTPException(
@@ -0,0 +1,285 @@
+"""
+Background job queue.
+
+Slow side effects (Cloudinary calls, precomputed-list refreshes) are
+enqueued once the request's commit has succeeded and run elsewhere, so the
+handler returns as soon as the database has what it wrote:
+
+    @job("media.destroy_asset", max_attempts=5)
+    async def destroy_asset(public_id: str, resource_type: str): ...
+
+    await job_queue.enqueue(
+        "media.destroy_asset", {"public_id": ..., "resource_type": ...}, key=f"media.destroy:{media_id}"
+    )
+
+Arguments must be JSON-serializable. Jobs run at least once: a worker can
+die after doing the work and before acknowledging it, so handlers must be
+safe to repeat. An idempotency `key` drops enqueues of a job whose key was
+taken within JOB_IDEMPOTENCY_TTL seconds; jobs registered with
+``release_key_on_start`` give the key back when they start, which
+coalesces bursts (ten retags of a post, one refresh) without losing a
+change made while the job runs.
+
+A failed job is retried with exponential backoff, JOB_RETRY_BASE * 2**n
+seconds with jitter up to JOB_RETRY_MAX, and after max_attempts it goes to
+the dead list.
+
+With JOB_QUEUE_MODE=redis, jobs are run by ``python -m app.jobs.worker``
+processes. The Redis keys are:
+
+- ``jobs:queue``: list of pending jobs;
+- ``jobs:processing:<worker>``: jobs a worker has taken (BLMOVE), removed
+  when they finish. Workers keep ``jobs:worker:<worker>`` alive; the
+  processing lists of workers whose heartbeat lapsed are put back on the
+  queue;
+- ``jobs:delayed``: retries, scored by due time;
+- ``jobs:dead``: jobs out of attempts, the last JOB_DEAD_MAX kept;
+- ``jobs:key:<key>``: idempotency keys.
+
+With JOB_QUEUE_MODE=memory (tests, local development), jobs run inside
+the API process. Redis mode falls back to the same when an enqueue can't
+reach Redis, so an outage delays nothing, although those jobs die with the
+process.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..cache import cache_backend, redis_client, MODE_MEMORY
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+MODE_REDIS = "redis"
+
+QUEUE_KEY = "jobs:queue"
+DELAYED_KEY = "jobs:delayed"
+DEAD_KEY = "jobs:dead"
+
+
+def processing_key(worker_id: str) -> str:
+    return f"jobs:processing:{worker_id}"
+
+
+def heartbeat_key(worker_id: str) -> str:
+    return f"jobs:worker:{worker_id}"
+
+
+def idempotency_key(key: str) -> str:
+    return f"jobs:key:{key}"
+
+
+# KEYS: idempotency key, queue; ARGV: job, job id, key ttl
+ENQUEUE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[2], 'NX', 'EX', ARGV[3]) then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    max_attempts: int
+    release_key_on_start: bool
+
+
+# Every handler, by name; workers import the modules that define them
+JOBS: Dict[str, JobSpec] = {}
+
+
+def job(name: str, max_attempts: int = settings.JOB_MAX_ATTEMPTS, release_key_on_start: bool = False):
+    """Register an async function as the handler of job `name`"""
+    def register(func):
+        JOBS[name] = JobSpec(name, func, max_attempts, release_key_on_start)
+        return func
+    return register
+
+
+@dataclass
+class Job:
+    name: str
+    args: Dict[str, Any]
+    key: Optional[str] = None
+    attempt: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    enqueued_at: float = field(default_factory=time.time)
+    error: Optional[str] = None
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def loads(cls, raw: str) -> "Job":
+        return cls(**json.loads(raw))
+
+
+def retry_delay(attempt: int) -> float:
+    delay = min(settings.JOB_RETRY_MAX, settings.JOB_RETRY_BASE * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def execute(
+    job: Job,
+    retry: Callable[[Job, float], Awaitable[None]],
+    bury: Callable[[Job], Awaitable[None]],
+    release: Callable[[str], Awaitable[None]],
+) -> bool:
+    """Run a job once; failures go to `retry` or, out of attempts, `bury`"""
+    spec = JOBS.get(job.name)
+    if spec is None:
+        job.error = "unknown job"
+        logger.error("No handler for job %s (%s)", job.name, job.id)
+        await bury(job)
+        return False
+    if spec.release_key_on_start and job.key:
+        await release(job.key)
+    job.attempt += 1
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(spec.func(**job.args), settings.JOB_TIMEOUT)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        job.error = repr(e)
+        if job.attempt >= spec.max_attempts:
+            logger.error("Job %s (%s) failed for good after %d attempts: %r", job.name, job.id, job.attempt, e)
+            await bury(job)
+        else:
+            delay = retry_delay(job.attempt)
+            logger.warning("Job %s (%s) attempt %d failed, retrying in %.1fs: %r", job.name, job.id, job.attempt, delay, e)
+            await retry(job, delay)
+        return False
+    logger.debug("Job %s (%s) done in %.3fs", job.name, job.id, time.perf_counter() - started)
+    return True
+
+
+class LocalJobQueue:
+    """Jobs run by tasks of this process"""
+
+    def __init__(self, concurrency: int = settings.JOB_WORKER_CONCURRENCY):
+        self.concurrency = concurrency
+        self.dead: List[Job] = []
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._keys: Dict[str, float] = {}
+        self._timers: set = set()
+        self._runners: List[asyncio.Task] = []
+
+    def submit(self, job: Job) -> bool:
+        now = time.monotonic()
+        if job.key:
+            if self._keys.get(job.key, 0) > now:
+                return False
+            self._keys[job.key] = now + settings.JOB_IDEMPOTENCY_TTL
+            if len(self._keys) > 10000:
+                self._keys = {key: until for key, until in self._keys.items() if until > now}
+        self._queue.put_nowait(job)
+        return True
+
+    async def _retry(self, job: Job, delay: float) -> None:
+        def due():
+            self._timers.discard(timer)
+            self._queue.put_nowait(job)
+        timer = asyncio.get_running_loop().call_later(delay, due)
+        self._timers.add(timer)
+
+    async def _bury(self, job: Job) -> None:
+        self.dead = [*self.dead[-(settings.JOB_DEAD_MAX - 1):], job]
+
+    async def _release(self, key: str) -> None:
+        self._keys.pop(key, None)
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await execute(job, self._retry, self._bury, self._release)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Local job runner error: %r", e)
+            finally:
+                self._queue.task_done()
+
+    async def drain(self) -> None:
+        """Wait until every queued job has run once (retries not included)"""
+        await self._queue.join()
+
+    @property
+    def size(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self) -> None:
+        if not self._runners:
+            self._runners = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+
+
+class JobQueue:
+    def __init__(self, redis=redis_client, mode: str = settings.JOB_QUEUE_MODE):
+        self.redis = redis
+        self.mode = mode
+        self.local = LocalJobQueue()
+        self.local_fallbacks = 0
+        self._enqueue = redis.register_script(ENQUEUE_SCRIPT)
+
+    async def enqueue(self, name: str, args: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> bool:
+        """Queue a job; False if its idempotency key is taken. Call after committing."""
+        if name not in JOBS:
+            raise ValueError(f"Unknown job: {name}")
+        job = Job(name=name, args=args or {}, key=key)
+        if self.mode == MODE_REDIS and cache_backend.mode != MODE_MEMORY:
+            try:
+                if key is None:
+                    await self.redis.lpush(QUEUE_KEY, job.dumps())
+                    return True
+                return bool(await self._enqueue(
+                    keys=[idempotency_key(key), QUEUE_KEY],
+                    args=[job.dumps(), job.id, settings.JOB_IDEMPOTENCY_TTL],
+                ))
+            except Exception as e:
+                logger.warning("Job %s not queued in Redis, running it in this process: %r", name, e)
+        if self.mode == MODE_REDIS:
+            self.local_fallbacks += 1
+        return self.local.submit(job)
+
+    async def stats(self) -> dict:
+        data = {"mode": self.mode, "local_queued": self.local.size, "local_fallbacks": self.local_fallbacks}
+        if self.mode == MODE_REDIS:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.llen(QUEUE_KEY)
+                    pipe.zcard(DELAYED_KEY)
+                    pipe.llen(DEAD_KEY)
+                    data["queued"], data["delayed"], data["dead"] = await pipe.execute()
+            except Exception as e:
+                data["error"] = repr(e)
+        else:
+            data["dead"] = len(self.local.dead)
+        return data
+
+    async def start(self) -> None:
+        # Runs memory-mode jobs, and redis-mode jobs Redis couldn't take
+        await self.local.start()
+
+    async def stop(self) -> None:
+        await self.local.stop()
+
+
+job_queue = JobQueue()
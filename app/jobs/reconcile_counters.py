@@ -0,0 +1,98 @@
+"""
+Repair drift in the denormalized counter columns.
+
+The services keep posts.comment_count, posts.media_count,
+comments.reply_count, categories.post_count and tags.post_count up to date
+transactionally; this job recomputes them from the source tables in
+primary-key batches and fixes only the rows that disagree. Each batch is
+its own transaction so the job never holds long locks, and records a
+``<kind>.updated`` outbox event per repaired row in that transaction, so
+cached responses and taxonomy snapshots drop the drifted counts.
+
+Run with: python -m app.jobs.reconcile_counters
+"""
+import asyncio
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..database import AsyncSessionLocal
+from ..models import Post, Tag, Category, Comment, Media, post_tags, post_categories
+from ..service.outbox import emit
+
+DEFAULT_BATCH_SIZE = 500
+
+# Model -> outbox kind of its rows
+KINDS = {Post: "post", Comment: "comment", Category: "category", Tag: "tag"}
+
+
+def _counter_specs():
+    """(model, primary key, counter column, correlated actual count)"""
+    reply = aliased(Comment)
+    return [
+        (
+            Post, Post.post_id, Post.comment_count,
+            select(func.count()).where(Comment.post_id == Post.post_id).scalar_subquery(),
+        ),
+        (
+            Post, Post.post_id, Post.media_count,
+            select(func.count()).where(Media.post_id == Post.post_id).scalar_subquery(),
+        ),
+        (
+            Comment, Comment.comment_id, Comment.reply_count,
+            select(func.count()).where(reply.parent_id == Comment.comment_id).scalar_subquery(),
+        ),
+        (
+            Category, Category.category_id, Category.post_count,
+            select(func.count()).where(post_categories.c.category_id == Category.category_id).scalar_subquery(),
+        ),
+        (
+            Tag, Tag.tag_id, Tag.post_count,
+            select(func.count()).where(post_tags.c.tag_id == Tag.tag_id).scalar_subquery(),
+        ),
+    ]
+
+
+async def reconcile_counter(db: AsyncSession, model, pk, counter, actual, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Recompute one counter column batch by batch, returns the number of rows repaired"""
+    repaired = 0
+    last_id = None
+    while True:
+        query = select(pk).order_by(pk).limit(batch_size)
+        if last_id is not None:
+            query = query.where(pk > last_id)
+        ids = (await db.execute(query)).scalars().all()
+        if not ids:
+            break
+        fixed_ids = (await db.execute(
+            update(model)
+            .where(pk.in_(ids), counter != actual)
+            .values({counter: actual, model.updated_at: model.updated_at})
+            .returning(pk)
+            .execution_options(synchronize_session=False)
+        )).scalars().all()
+        for fixed_id in fixed_ids:
+            emit(db, f"{KINDS[model]}.updated", fixed_id)
+        await db.commit()
+        repaired += len(fixed_ids)
+        last_id = ids[-1]
+    return repaired
+
+
+async def reconcile_counters(db: AsyncSession, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    report = {}
+    for model, pk, counter, actual in _counter_specs():
+        name = f"{model.__tablename__}.{counter.key}"
+        report[name] = await reconcile_counter(db, model, pk, counter, actual, batch_size)
+    return report
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        report = await reconcile_counters(db)
+    for name, repaired in report.items():
+        print(f"{name}: repaired {repaired} rows")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
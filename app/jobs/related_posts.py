@@ -0,0 +1,25 @@
+"""
+Rebuild the precomputed related posts for every published post.
+
+Incremental refreshes after tag/category changes keep lists mostly
+current; run this periodically (e.g. nightly) to repair lists that
+incremental merges could only shrink.
+
+Run with: python -m app.jobs.related_posts
+"""
+import asyncio
+import time
+
+from ..database import AsyncSessionLocal
+from ..service.related import rebuild_related_posts
+
+
+async def main():
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        processed = await rebuild_related_posts(db)
+    print(f"related posts rebuilt for {processed} posts in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+Background job worker: runs the jobs the API queues in Redis.
+
+Each worker takes up to JOB_WORKER_CONCURRENCY jobs at a time, moves due
+retries back onto the queue, and keeps a heartbeat. Jobs taken by a worker
+whose heartbeat has lapsed (killed, crashed) are put back on the queue by
+the other workers. SIGTERM/SIGINT stop it after the jobs in hand finish.
+
+Run with: python -m app.jobs.worker [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+
+from ..cache import redis_blocking_client
+from ..config import settings
+from .queue import (
+    JOBS, Job, DEAD_KEY, DELAYED_KEY, QUEUE_KEY, execute, heartbeat_key, idempotency_key, processing_key,
+)
+# Modules whose jobs this worker runs
+from ..service import media, related  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# KEYS: delayed, queue; ARGV: now, batch
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+
+POLL_TIMEOUT = 5
+
+
+class JobWorker:
+    def __init__(self, redis=redis_blocking_client, concurrency: int = settings.JOB_WORKER_CONCURRENCY):
+        self.redis = redis
+        self.concurrency = concurrency
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.processing = processing_key(self.id)
+        self._promote = redis.register_script(PROMOTE_SCRIPT)
+        self._stopping = asyncio.Event()
+
+    async def _retry(self, job: Job, delay: float) -> None:
+        await self.redis.zadd(DELAYED_KEY, {job.dumps(): time.time() + delay})
+
+    async def _bury(self, job: Job) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(DEAD_KEY, job.dumps())
+            pipe.ltrim(DEAD_KEY, 0, settings.JOB_DEAD_MAX - 1)
+            await pipe.execute()
+
+    async def _release(self, key: str) -> None:
+        await self.redis.delete(idempotency_key(key))
+
+    async def _take(self, raw: str) -> None:
+        try:
+            job = Job.loads(raw)
+        except (ValueError, TypeError) as e:
+            logger.error("Unreadable job moved to the dead list: %r", e)
+            await self.redis.lpush(DEAD_KEY, raw)
+        else:
+            await execute(job, self._retry, self._bury, self._release)
+        await self.redis.lrem(self.processing, 1, raw)
+
+    async def _consume(self) -> None:
+        delay = 1.0
+        while not self._stopping.is_set():
+            try:
+                raw = await self.redis.blmove(QUEUE_KEY, self.processing, POLL_TIMEOUT, src="RIGHT", dest="LEFT")
+                if raw is not None:
+                    # A job left in the processing list by an error here is
+                    # requeued once this worker is gone
+                    await self._take(raw)
+                delay = 1.0
+            except Exception as e:
+                logger.warning("Job worker lost Redis, retrying in %.0fs: %r", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    async def _recover(self) -> None:
+        """Requeue what dead workers had taken"""
+        async for key in self.redis.scan_iter(match=processing_key("*")):
+            worker_id = key[len(processing_key("")):]
+            if worker_id == self.id or await self.redis.exists(heartbeat_key(worker_id)):
+                continue
+            moved = 0
+            while await self.redis.lmove(key, QUEUE_KEY, src="RIGHT", dest="LEFT") is not None:
+                moved += 1
+            if moved:
+                logger.warning("Requeued %d jobs of lapsed worker %s", moved, worker_id)
+
+    async def _housekeeping(self) -> None:
+        ticks = 0
+        while not self._stopping.is_set():
+            try:
+                if ticks % 5 == 0:
+                    await self.redis.set(heartbeat_key(self.id), 1, ex=settings.JOB_HEARTBEAT_TTL)
+                if ticks % 60 == 0:
+                    await self._recover()
+                while await self._promote(keys=[DELAYED_KEY, QUEUE_KEY], args=[time.time(), 100]) == 100:
+                    pass
+            except Exception as e:
+                logger.warning("Job worker housekeeping failed: %r", e)
+            ticks += 1
+            try:
+                await asyncio.wait_for(self._stopping.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        await self.redis.set(heartbeat_key(self.id), 1, ex=settings.JOB_HEARTBEAT_TTL)
+        logger.info("Job worker %s running %d at a time: %s", self.id, self.concurrency, ", ".join(sorted(JOBS)))
+        try:
+            await asyncio.gather(self._housekeeping(), *(self._consume() for _ in range(self.concurrency)))
+        finally:
+            await self.redis.delete(heartbeat_key(self.id))
+
+
+async def main(concurrency: int) -> None:
+    worker = JobWorker(concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(parser.parse_args().concurrency))
@@ -1,12 +1,18 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 import os  # Add this import to check environment variables
 
 from .database import init_db
-from .routes import user_router, post_router, auth_router, test_router, category_router, tag_router, media_router, comment_router
-from .middlewares.core import setup_cors
+from .routes import user_router, post_router, auth_router, test_router, category_router, tag_router, media_router, comment_router, health_router
+from .middlewares.core import setup_cors, setup_compression, setup_rate_limit_headers
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from redis import asyncio as aioredis
+from .cache import cache_backend
+from .service.views import view_counter
+from .service.taxonomy import taxonomy
+from .service.comment_stream import comment_stream
+from .jobs.queue import job_queue
+from .service.outbox import outbox_relay
+from .service.invalidation_bus import invalidation_bus
 from .config import settings  # Import settings
 
 def create_app() -> FastAPI:
@@ -15,10 +21,13 @@ def create_app() -> FastAPI:
         title="Blog API",
         description="API for blogging platform",
         version="1.0.0",
-        docs_url="/docs"  # Có thể tắt bằng None nếu không cần
+        docs_url="/docs",  # Có thể tắt bằng None nếu không cần
+        default_response_class=ORJSONResponse
     )
 
     setup_cors(app)
+    setup_compression(app)
+    setup_rate_limit_headers(app)
 
     # Event handlers
     @app.on_event("startup")
@@ -34,14 +43,26 @@ def create_app() -> FastAPI:
         
         await init_db()
         # Có thể thêm các khởi tạo khác ở đây
-        redis = aioredis.from_url("redis://redis:6379", encoding="utf-8", decode_responses=True)
-        FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-        # print("✅ Redis Cache initialized!")
-        try:
-            pong = await redis.ping()
-            print(f"Redis connected: {pong}")
-        except Exception as e:
-            print(f"❌ Redis connection failed: {e}")
+        # Falls back to an in-process cache while Redis is unreachable
+        FastAPICache.init(cache_backend, prefix="fastapi-cache")
+        await cache_backend.start()
+        print(f"Cache backend mode: {cache_backend.mode}")
+        await view_counter.start()
+        await taxonomy.start()
+        await comment_stream.start()
+        await job_queue.start()
+        await outbox_relay.start()
+        await invalidation_bus.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await invalidation_bus.stop()
+        await outbox_relay.stop()
+        await job_queue.stop()
+        await comment_stream.stop()
+        await taxonomy.stop()
+        await view_counter.stop()
+        await cache_backend.stop()
 
     # Include routers với prefix
     app.include_router(user_router, prefix="/api/v1")
@@ -52,6 +73,7 @@ def create_app() -> FastAPI:
     app.include_router(test_router, prefix="/api/v1")
     app.include_router(media_router, prefix="/api/v1")
     app.include_router(comment_router, prefix="/api/v1")
+    app.include_router(health_router, prefix="/api/v1")
 
     return app
 
@@ -1,4 +1,6 @@
 from fastapi.middleware.cors import CORSMiddleware
+from .compression import CompressionMiddleware
+from .ratelimit import RateLimitHeadersMiddleware
 
 
 def setup_cors(app):
@@ -8,5 +10,16 @@ def setup_cors(app):
         allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
         allow_headers=["Authorization", "Content-Type", "Accept", "Origin", "X-Requested-With"],
         allow_credentials=True,
-        expose_headers=["Content-Disposition"]
-    )
\ No newline at end of file
+        expose_headers=[
+            "Content-Disposition", "Retry-After",
+            "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy",
+        ]
+    )
+
+
+def setup_compression(app):
+    app.add_middleware(CompressionMiddleware)
+
+
+def setup_rate_limit_headers(app):
+    app.add_middleware(RateLimitHeadersMiddleware)
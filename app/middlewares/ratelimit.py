@@ -0,0 +1,29 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..utils.ratelimit import STATE_KEY, rate_limit_headers
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Adds ``RateLimit-*`` headers to responses of routes with rate-limit
+    policies. The policies run as dependencies and record their results on
+    request.state; headers set on a dependency's Response would be dropped
+    for endpoints that return a Response themselves, which ours all do.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # request.state writes through to this dict
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and state.get(STATE_KEY):
+                message["headers"] = [*message.get("headers", ()), *rate_limit_headers(state[STATE_KEY])]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -7,5 +7,8 @@ from .post_category import post_categories
 from .post_tag import post_tags
 from .comment import Comment
 from .media import Media
+from .post_view_flush import PostViewFlush
+from .related_post import RelatedPost
+from .outbox import OutboxEvent
 
-__all__ = ['Base', 'User', 'Post', 'Category', 'Tag', 'post_categories', 'post_tags', 'Comment', 'Media']
\ No newline at end of file
+__all__ = ['Base', 'User', 'Post', 'Category', 'Tag', 'post_categories', 'post_tags', 'Comment', 'Media', 'PostViewFlush', 'RelatedPost', 'OutboxEvent']
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text
+from sqlalchemy import Column, String, Text, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import text
 from sqlalchemy.orm import relationship
@@ -11,6 +11,8 @@ class Category(BaseModel):
     name = Column(String(100), nullable=False)
     description = Column(Text)
     slug = Column(String(100), unique=True, nullable=False)
+    # Denormalized number of posts in this category
+    post_count = Column(Integer, nullable=False, server_default=text("0"), default=0)
 
     # Relationships
     posts = relationship("Post", secondary="post_categories", back_populates="categories")
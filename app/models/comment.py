@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Text, Boolean, ForeignKey, Integer, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func, text
 from sqlalchemy.orm import relationship, backref
@@ -13,6 +13,22 @@ class Comment(BaseModel):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
     parent_id = Column(UUID(as_uuid=True), ForeignKey("comments.comment_id", ondelete="CASCADE"), nullable=True)
 
+    # Materialized path: the parent's path plus a fixed-width segment that sorts
+    # by creation time, so a subtree is a contiguous range and ordering by path
+    # is threaded order. "C" collation makes the range a plain byte comparison.
+    path = Column(Text(collation="C"), nullable=False)
+    depth = Column(Integer, nullable=False, server_default=text("0"), default=0)
+
+    # Denormalized number of direct replies, maintained by the comment service
+    reply_count = Column(Integer, nullable=False, server_default=text("0"), default=0)
+
+    __table_args__ = (
+        Index("ix_comments_post_id_path", "post_id", "path"),
+        # Pages of replies and of a post's top-level comments, in path order
+        Index("ix_comments_parent_id_path", "parent_id", "path"),
+        Index("ix_comments_post_id_root_path", "post_id", "path", postgresql_where=text("parent_id IS NULL")),
+    )
+
     # Relationships
     replies = relationship(
         "Comment",
@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Column, String
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from .base import BaseModelNoUpdate
+
+class OutboxEvent(BaseModelNoUpdate):
+    """
+    Changes to publish, written in the same transaction as the change
+    itself and deleted by the outbox relay once published, see
+    app/service/outbox.py.
+    """
+    __tablename__ = "outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    topic = Column(String(64), nullable=False)
+    aggregate_id = Column(UUID(as_uuid=True), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, Boolean, DateTime, ForeignKey, Integer, BigInteger
 from sqlalchemy.sql import func, expression
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -20,6 +20,12 @@ class Post(BaseModel):
     published_at = Column(DateTime(timezone=True))
     author_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
 
+    # Denormalized counters, maintained by the comment and media services
+    comment_count = Column(Integer, nullable=False, server_default=text("0"), default=0)
+    media_count = Column(Integer, nullable=False, server_default=text("0"), default=0)
+    # Flushed in batches by the view counter, see app/service/views.py
+    view_count = Column(BigInteger, nullable=False, server_default=text("0"), default=0, index=True)
+
     author = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post")
     categories = relationship("Category", secondary="post_categories", back_populates="posts")
@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, ForeignKey
+from sqlalchemy import Table, Column, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import text
 from .base import BaseModel
@@ -9,5 +9,7 @@ post_tags = Table(
     BaseModel.metadata,
     Column("post_id", UUID(as_uuid=True), ForeignKey("posts.post_id"), primary_key=True),
     Column("tag_id", UUID(as_uuid=True), ForeignKey("tags.tag_id"), primary_key=True),
-    Column("created_at", BaseModel.created_at.type, server_default=text("CURRENT_TIMESTAMP"))
+    Column("created_at", BaseModel.created_at.type, server_default=text("CURRENT_TIMESTAMP")),
+    # The primary key covers (post_id, tag_id) lookups, this one serves "posts of a tag"
+    Index("ix_post_tags_tag_id", "tag_id")
 )
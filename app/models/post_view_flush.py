@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String
+from .base import BaseModelNoUpdate
+
+class PostViewFlush(BaseModelNoUpdate):
+    """
+    Batches of view counts already applied to posts.view_count.
+    Written in the same transaction as the counter update so a flush that
+    is retried after a crash is never applied twice.
+    """
+    __tablename__ = "post_view_flushes"
+
+    batch_id = Column(String(64), primary_key=True)
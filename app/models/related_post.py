@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Float, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from .base import BaseModelNoUpdate
+
+class RelatedPost(BaseModelNoUpdate):
+    """Precomputed top-k related posts, see app/service/related.py"""
+    __tablename__ = "related_posts"
+
+    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.post_id", ondelete="CASCADE"), primary_key=True)
+    related_post_id = Column(UUID(as_uuid=True), ForeignKey("posts.post_id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_related_posts_post_id_score", "post_id", score.desc()),
+        Index("ix_related_posts_related_post_id", "related_post_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import text
 from sqlalchemy.orm import relationship
@@ -10,6 +10,10 @@ class Tag(BaseModel):
     tag_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()"))
     name = Column(String(50), nullable=False)
     slug = Column(String(50), unique=True, nullable=False)
+    # Denormalized number of posts with this tag
+    post_count = Column(Integer, nullable=False, server_default=text("0"), default=0)
 
     # Relationships
-    posts = relationship("Post", secondary="post_tags", back_populates="tags")
+    # A popular tag has too many posts to ever load as a collection; go
+    # through post_tags (see app/service/tag.py) instead
+    posts = relationship("Post", secondary="post_tags", back_populates="tags", lazy="raise")
@@ -5,4 +5,5 @@ from .test import router as test_router
 from .category import router as category_router
 from .tag import router as tag_router
 from .media import router as media_router
-from .comment import router as comment_router
\ No newline at end of file
+from .comment import router as comment_router
+from .health import router as health_router
\ No newline at end of file
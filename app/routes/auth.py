@@ -1,27 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from ..schemas.auth import LoginRequest, TokenResponse, UserMeResponse, RefreshTokenRequest
 from ..schemas.user import UserOut
 from ..database.session import get_db
 from ..service import authenticate_user
-from ..utils.security.jwt import create_access_token, create_refresh_token, verify_token
+# Aliased: the /refresh endpoint below is named refresh_tokens
+from ..service.refresh_tokens import refresh_tokens as token_store
+from ..utils.security.jwt import verify_token
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from ..models.user import User
+from ..utils.serialization import FastJSONRoute
 from typing import Annotated
 
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=FastJSONRoute)
 
 security = HTTPBearer()
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(data: LoginRequest, response: Response, db: AsyncSession = Depends(get_db)):
+async def login(data: LoginRequest, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     """Login with email and password"""
-    user = await authenticate_user(db, data.email, data.password)
-    access_token = create_access_token(user_id=str(user.user_id))
-    refresh_token = create_refresh_token(user_id=str(user.user_id))
+    client_ip = request.client.host if request.client else None
+    user = await authenticate_user(db, data.email, data.password, client_ip)
+    tokens = await token_store.issue(str(user.user_id))
     
     # Set refresh token as a secure HTTP-only cookie (helpful for automatic refreshes)
     # response.set_cookie(
@@ -33,17 +36,20 @@ async def login(data: LoginRequest, response: Response, db: AsyncSession = Depen
     #     max_age=30 * 24 * 60 * 60  # 30 days in seconds
     # )
     
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    return tokens
 
 @router.post("/refresh", response_model=TokenResponse)
 async def refresh_tokens(
     data: RefreshTokenRequest,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get new access token using refresh token"""
+    """
+    Get new access token using refresh token. The refresh token is spent:
+    using it a second time revokes its whole family.
+    """
     try:
         # Verify the refresh token
-        payload = verify_token(data.refresh_token, token_type="refresh")
+        payload = await verify_token(data.refresh_token, token_type="refresh")
         
         # Get user ID from token payload
         user_id = payload.sub
@@ -65,15 +71,8 @@ async def refresh_tokens(
                 detail="User account is inactive"
             )
 
-        # Create new tokens
-        new_access_token = create_access_token(user_id=str(user.user_id))
-        new_refresh_token = create_refresh_token(user_id=str(user.user_id))
-        
-        return {
-            "access_token": new_access_token,
-            "refresh_token": new_refresh_token,
-            "token_type": "bearer"
-        }
+        # Rotate: new pair in the same family, old refresh token spent
+        return await token_store.rotate(payload)
         
     except HTTPException:
         raise
@@ -84,6 +83,20 @@ async def refresh_tokens(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(data: RefreshTokenRequest):
+    """Revoke the session (refresh token family) the refresh token belongs to"""
+    payload = await verify_token(data.refresh_token, token_type="refresh")
+    await token_store.revoke_family(payload)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_everywhere(credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]):
+    """Revoke every access and refresh token issued to the current user so far"""
+    payload = await verify_token(credentials.credentials)
+    await token_store.revoke_user(payload.sub)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @router.get("/me", response_model=UserOut)
 async def get_current_user(
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
@@ -91,7 +104,7 @@ async def get_current_user(
 ):
     """Get current authenticated user information"""
     try:
-        payload = verify_token(credentials.credentials)
+        payload = await verify_token(credentials.credentials)
         
         # Get user ID from token payload
         user_id = payload.sub
@@ -1,23 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_cache.decorator import cache
+from ..cache import cached, result_tags
+from ..config import settings
 
 from ..database.session import get_db
 from ..schemas.category import CategoryOut, CategoryCreate, CategoryUpdate
 from ..service import category as category_service
 from ..dependencies import require_superuser
+from ..utils.serialization import FastJSONRoute
+from ..utils.fieldsets import FieldSet
 
 from typing import List, Optional
 import uuid
 
-router = APIRouter(prefix="/categories", tags=["categories"])
+router = APIRouter(prefix="/categories", tags=["categories"], route_class=FastJSONRoute)
+category_fieldset = category_service.CATEGORIES.query()
+category_tags = result_tags("category", "category_id", "categories")
 
 @router.get("/", response_model=List[CategoryOut])
-@cache(expire=60)
+@cached(expire=settings.CACHE_LONG_EXPIRE, tags=("categories", category_tags))
 async def read_categories(
     skip: int = 0, 
     limit: int = 100,
     with_post_count: bool = False,
+    fieldset: FieldSet = Depends(category_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -33,21 +39,24 @@ async def read_categories(
         with_post_count=with_post_count
     )
     
-    return categories
+    return category_service.CATEGORIES.shape(fieldset, categories)
 
 @router.get("/{category_id}", response_model=CategoryOut)
-@cache(expire=60)
+@cached(expire=settings.CACHE_LONG_EXPIRE, tags=("category:{category_id}",))
 async def read_category(
     category_id: uuid.UUID, 
+    fieldset: FieldSet = Depends(category_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """Get a specific category by ID"""
-    return await category_service.get_category(db, category_id=category_id)
+    category = await category_service.get_category(db, category_id=category_id)
+    return category_service.CATEGORIES.shape(fieldset, category)
 
 @router.get("/slug/{slug}", response_model=CategoryOut)
-@cache(expire=60)
+@cached(expire=settings.CACHE_LONG_EXPIRE, tags=(category_tags,))
 async def read_category_by_slug(
     slug: str, 
+    fieldset: FieldSet = Depends(category_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """Get a specific category by slug"""
@@ -57,7 +66,7 @@ async def read_category_by_slug(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Category not found"
         )
-    return category
+    return category_service.CATEGORIES.shape(fieldset, category)
 
 @router.post("/", response_model=CategoryOut, status_code=status.HTTP_201_CREATED)
 async def create_category(
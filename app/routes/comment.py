@@ -1,20 +1,45 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..cache import EntityCache, batch_ids
+from ..config import settings
 from ..database import get_db
 from ..models import User
-from ..schemas.comment import CommentCreate, CommentUpdate, CommentOut, CommentReply
+from ..schemas.batch import BatchOut
+from ..schemas.comment import CommentCreate, CommentUpdate, CommentOutBase, CommentReply, CommentNode, CommentPage
 from ..service import comment as comment_service
+from ..service.comment_stream import comment_stream
 from ..auth.dependencies import get_current_user
+from ..utils.ratelimit import AuthenticatedRateLimit, PER_ROUTE
+from ..utils.serialization import FastJSONRoute
 
 router = APIRouter(
     prefix="/comments",
-    tags=["comments"]
+    tags=["comments"],
+    route_class=FastJSONRoute
 )
+comment_cache = EntityCache("comment", CommentOutBase, "comment_id")
 
-@router.post("/", response_model=CommentOut)
+# Bounds on one page of a thread: at most limit * replies_limit ** (depth - 1)
+# comments per level, one query per level
+page_limit = Query(20, ge=1, le=50, description="Comments per page")
+thread_depth = Query(2, ge=1, le=3, description="Levels to return, counting the page itself")
+replies_limit = Query(3, ge=0, le=5, description="Replies returned under each comment")
+
+# New comments and replies draw on one budget per user, plus a shared one
+# that caps the write rate the whole site can put on the database. Both are
+# charged only for logged-in users, so anonymous requests can't use it up
+comment_write_limits = [
+    Depends(AuthenticatedRateLimit("comments:write", settings.COMMENT_WRITE_LIMIT, settings.COMMENT_WRITE_PERIOD)),
+    Depends(AuthenticatedRateLimit(
+        "comments:write", settings.COMMENT_WRITE_GLOBAL_LIMIT, settings.COMMENT_WRITE_PERIOD, per=PER_ROUTE
+    )),
+]
+
+@router.post("/", response_model=CommentNode, dependencies=comment_write_limits)
 async def create_comment(
     comment: CommentCreate,
     db: AsyncSession = Depends(get_db),
@@ -26,13 +51,15 @@ async def create_comment(
     """
     try:
         return await comment_service.create_comment(db, comment, current_user.user_id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to create comment: {str(e)}"
         )
 
-@router.post("/{comment_id}/reply", response_model=CommentOut)
+@router.post("/{comment_id}/reply", response_model=CommentNode, dependencies=comment_write_limits)
 async def reply_to_comment(
     comment_id: UUID,
     reply: CommentReply,
@@ -44,7 +71,7 @@ async def reply_to_comment(
     """
     try:
         # First verify the parent comment exists
-        parent_comment = await comment_service.get_comment(db, comment_id)
+        parent_comment = await comment_service.find_comment(db, comment_id)
         if not parent_comment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -67,26 +94,64 @@ async def reply_to_comment(
             detail=f"Failed to create reply: {str(e)}"
         )
 
-@router.get("/post/{post_id}", response_model=List[CommentOut])
+@router.get("/post/{post_id}", response_model=CommentPage)
 async def get_comments_by_post(
     post_id: UUID,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = page_limit,
+    depth: int = thread_depth,
+    replies: int = replies_limit,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all root comments for a post with their replies.
+    Get a page of a post's top-level comments, newest first, each with its
+    first replies. Pass `next_cursor` back as `cursor` for the next page;
+    expand a comment's remaining replies with its `replies_cursor`.
     """
     try:
-        comments = await comment_service.get_comments_by_post(db, post_id, skip, limit)
-        return comments
+        items, next_cursor = await comment_service.get_post_comment_page(
+            db, post_id, cursor, limit=limit, depth=depth, replies_limit=replies
+        )
+        return {"items": items, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to get comments: {str(e)}"
         )
 
-@router.get("/user/{user_id}", response_model=List[CommentOut])
+@router.get("/post/{post_id}/stream")
+async def stream_comments_by_post(
+    post_id: UUID,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Live comment events for a post as Server-Sent Events:
+    `comment.created`, `comment.updated` (comment JSON) and `comment.deleted`
+    (`comment_id`, `parent_id`, `removed`). Reconnecting with `Last-Event-ID`
+    replays what was missed.
+    """
+    if comment_stream.full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live subscribers, try again later",
+            headers={"Retry-After": "30"},
+        )
+
+    async def events():
+        yield "retry: 3000\n\n"
+        async for event in comment_stream.subscribe(post_id, last_event_id):
+            # Comment lines keep proxies from closing idle connections
+            yield event.encode() if event is not None else ": keepalive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/user/{user_id}", response_model=List[CommentNode])
 async def get_comments_by_user(
     user_id: UUID,
     skip: int = 0,
@@ -94,7 +159,8 @@ async def get_comments_by_user(
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all comments created by a specific user.
+    Get the comments created by a specific user, newest first, each with
+    its first replies; the rest are behind its `replies_cursor`.
     """
     try:
         comments = await comment_service.get_comments_by_user(db, user_id, skip, limit)
@@ -105,16 +171,33 @@ async def get_comments_by_user(
             detail=f"Failed to get comments: {str(e)}"
         )
 
-@router.get("/{comment_id}", response_model=CommentOut)
+@router.get("/batch", response_model=BatchOut[CommentOutBase])
+async def get_comments_batch(
+    request: Request,
+    ids: List[UUID] = Depends(batch_ids),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get many comments by ID in one request: `/comments/batch?ids=a,b,c`
+    Comments come with their author but without replies.
+    """
+    return await comment_cache.resolve(
+        request, ids,
+        lambda misses: comment_service.get_comments_by_ids(db, misses)
+    )
+
+@router.get("/{comment_id}", response_model=CommentNode)
 async def get_comment(
     comment_id: UUID,
+    depth: int = thread_depth,
+    replies: int = replies_limit,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get a specific comment by ID with its replies.
+    Get a specific comment by ID with its first replies.
     """
     try:
-        comment = await comment_service.get_comment(db, comment_id)
+        comment = await comment_service.get_thread_node(db, comment_id, depth=depth, replies_limit=replies)
         if not comment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -129,20 +212,23 @@ async def get_comment(
             detail=f"Failed to get comment: {str(e)}"
         )
 
-@router.get("/{comment_id}/replies", response_model=List[CommentOut])
+@router.get("/{comment_id}/replies", response_model=CommentPage)
 async def get_replies_for_comment(
     comment_id: UUID,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = page_limit,
+    depth: int = thread_depth,
+    replies: int = replies_limit,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all direct replies for a specific comment.
-    Useful for paginated loading of comment replies.
+    Get a page of a comment's direct replies, oldest first.
+    Useful for lazily expanding a thread: pass a comment's `replies_cursor`
+    as `cursor`, then `next_cursor` for the page after.
     """
     try:
         # First verify the parent comment exists
-        parent_comment = await comment_service.get_comment(db, comment_id)
+        parent_comment = await comment_service.find_comment(db, comment_id)
         if not parent_comment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -150,8 +236,10 @@ async def get_replies_for_comment(
             )
         
         # Get the replies
-        replies = await comment_service.get_replies_for_comment(db, comment_id, skip, limit)
-        return replies
+        items, next_cursor = await comment_service.get_reply_page(
+            db, comment_id, cursor, limit=limit, depth=depth, replies_limit=replies
+        )
+        return {"items": items, "next_cursor": next_cursor}
     except HTTPException:
         raise
     except Exception as e:
@@ -160,7 +248,27 @@ async def get_replies_for_comment(
             detail=f"Failed to get replies: {str(e)}"
         )
 
-@router.patch("/{comment_id}", response_model=CommentOut)
+@router.get("/{comment_id}/thread", response_model=List[CommentOutBase])
+async def get_comment_thread(
+    comment_id: UUID,
+    max_depth: Optional[int] = Query(None, ge=0, description="Levels of replies below the comment"),
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get a comment and its replies as a flat list in threaded order.
+    Each reply follows its parent; `depth` gives the nesting level.
+    """
+    comments = await comment_service.get_comment_subtree(db, comment_id, max_depth, skip, limit)
+    if not comments:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comment not found"
+        )
+    return comments
+
+@router.patch("/{comment_id}", response_model=CommentNode)
 async def update_comment(
     comment_id: UUID,
     comment_update: CommentUpdate,
@@ -172,7 +280,7 @@ async def update_comment(
     Only the comment owner or superuser can update a comment.
     """
     try:
-        db_comment = await comment_service.get_comment(db, comment_id)
+        db_comment = await comment_service.find_comment(db, comment_id)
         if not db_comment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -207,7 +315,7 @@ async def delete_comment(
     Deleting a comment also deletes all its replies.
     """
     try:
-        db_comment = await comment_service.get_comment(db, comment_id)
+        db_comment = await comment_service.find_comment(db, comment_id)
         if not db_comment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,59 @@
+from fastapi import APIRouter
+
+from ..cache import cache_backend
+from ..database.loader import loader_stats
+from ..jobs.queue import job_queue
+from ..service.invalidation_bus import invalidation_bus
+from ..service.outbox import outbox_relay
+from ..utils.ratelimit import rate_limiter
+from ..utils.serialization import FastJSONRoute
+
+router = APIRouter(prefix="/health", tags=["health"], route_class=FastJSONRoute)
+
+@router.get("/cache")
+async def cache_health():
+    """
+    Cache backend status: current mode (redis/memory), failover and
+    recovery counters, and in-memory fallback usage.
+    """
+    return cache_backend.stats()
+
+@router.get("/loader")
+async def loader_health():
+    """
+    Request-scoped entity loader totals since startup: primary-key lookups
+    asked for, queries actually run, and the difference (queries saved).
+    """
+    return loader_stats.as_dict()
+
+@router.get("/rate-limit")
+async def rate_limit_health():
+    """
+    Rate limiter counters since startup: checks, rejections, checks served
+    by the per-worker fallback buckets and Redis errors behind them.
+    """
+    return rate_limiter.status()
+
+@router.get("/jobs")
+async def jobs_health():
+    """
+    Background job queue: mode, jobs waiting, waiting to be retried and
+    given up on, and how many ran in-process because Redis was unreachable.
+    """
+    return await job_queue.stats()
+
+@router.get("/outbox")
+async def outbox_health():
+    """
+    Outbox relay: events published and failed attempts since startup, and
+    how many events are waiting and for how long the oldest has.
+    """
+    return await outbox_relay.stats()
+
+@router.get("/invalidation-bus")
+async def invalidation_bus_health():
+    """
+    Postgres LISTEN connection of this worker: whether it is up, and the
+    notifications, oversized ones and reconnects seen since startup.
+    """
+    return invalidation_bus.stats()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_cache.decorator import cache
+from ..cache import cached
 from typing import List, Optional
 import uuid
 
@@ -10,6 +10,8 @@ from ..service import media as media_service
 from ..auth.dependencies import get_current_user
 from ..dependencies import require_superuser
 from ..models import User
+from ..utils.serialization import FastJSONRoute
+from ..utils.fieldsets import FieldSet
 
 # Helper function to convert empty strings to None for Optional UUIDs from Forms
 async def empty_str_to_none(value: Optional[str] = Form(None)) -> Optional[uuid.UUID]:
@@ -20,7 +22,8 @@ async def empty_str_to_none(value: Optional[str] = Form(None)) -> Optional[uuid.
     # Pydantic will handle the UUID conversion if it's not None or ""
     return None
 
-router = APIRouter(prefix="/media", tags=["media"])
+router = APIRouter(prefix="/media", tags=["media"], route_class=FastJSONRoute)
+media_fieldset = media_service.MEDIA.query()
 
 @router.post("/upload", response_model=MediaOut, status_code=status.HTTP_201_CREATED)
 async def upload_media(
@@ -72,18 +75,7 @@ async def upload_profile_image(
     Upload a profile image for the current logged-in user.
     This will replace any existing profile image and update the user's profile_picture field.
     """
-    # Check if user already has a profile image, if so, delete it
-    existing_media = await media_service.get_media_list(
-        db=db,
-        user_id=current_user.user_id
-    )
-    
-    for media in existing_media:
-        # Optionally, you could check if the media is actually used as a profile picture
-        # For now, we'll just delete all user media to simplify
-        await media_service.delete_media(db, media.media_id)
-    
-    # Upload new profile image
+    # Upload new profile image first, so a failed upload leaves the old one in place
     media = await media_service.create_media(
         db=db,
         file=file,
@@ -97,6 +89,10 @@ async def upload_profile_image(
     user_update = UserUpdate(profile_picture=media.file_path)
     await user_service.update_user(db, current_user.user_id, user_update)
     
+    # Delete the user's previous media (for now, all of it); their Cloudinary
+    # assets are destroyed by background jobs
+    await media_service.delete_user_media(db, current_user.user_id, keep=media.media_id)
+    
     return media
 
 @router.post("/post-image/{post_id}", response_model=MediaOut, status_code=status.HTTP_201_CREATED)
@@ -129,36 +125,41 @@ async def upload_post_image(
     )
 
 @router.get("/{media_id}", response_model=MediaOut)
-@cache(expire=60)
+@cached(expire=60)
 async def get_media_by_id(
     media_id: uuid.UUID,
+    fieldset: FieldSet = Depends(media_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get media by ID.
     """
-    return await media_service.get_media(db, media_id=media_id)
+    media = await media_service.get_media(db, media_id=media_id, fieldset=fieldset)
+    return media_service.MEDIA.shape(fieldset, media)
 
 @router.get("/", response_model=List[MediaOut])
-@cache(expire=60)
+@cached(expire=60)
 async def list_media(
     skip: int = 0,
     limit: int = 100,
     post_id: Optional[uuid.UUID] = None,
     user_id: Optional[uuid.UUID] = None,
+    fieldset: FieldSet = Depends(media_fieldset),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     List media with optional filtering by post or user.
     """
-    return await media_service.get_media_list(
+    media = await media_service.get_media_list(
         db,
         skip=skip,
         limit=limit,
         post_id=post_id,
-        user_id=user_id
+        user_id=user_id,
+        fieldset=fieldset
     )
+    return media_service.MEDIA.shape(fieldset, media)
 
 @router.delete("/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_media_by_id(
@@ -1,22 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_cache.decorator import cache
+from ..cache import cached, result_tags, EntityCache, batch_ids
+from ..config import settings
 
 from ..database.session import get_db
-from ..schemas.post import PostOut, PostUpdate, PostCreate
+from ..schemas.post import PostOut, PostUpdate, PostCreate, RelatedPostOut
+from ..schemas.batch import BatchOut
 from ..service import post as post_service
 from ..dependencies import get_current_user, require_superuser
 from ..models import User
+from ..service.views import record_post_view, record_post_view_by_slug
+from ..utils.serialization import FastJSONRoute
+from ..utils.fieldsets import FieldSet, DEFAULT_FIELDSET
 
 from typing import List, Optional
 from slugify import slugify
 import uuid
 from unidecode import unidecode
 
-router = APIRouter(prefix="/posts", tags=["posts"])
+router = APIRouter(prefix="/posts", tags=["posts"], route_class=FastJSONRoute)
+post_fieldset = post_service.POSTS.query()
+post_cache = EntityCache("post", PostOut, "post_id")
+# The posts in a response and the authors, tags and categories embedded in
+# them, so the outbox relay can purge it when any of them changes
+post_tags = result_tags(
+    "post", "post_id", "posts", user="author.user_id", tag="tags.tag_id", category="categories.category_id"
+)
 
 @router.get("/", response_model=List[PostOut])
-@cache(expire=60)
+@cached(expire=settings.CACHE_POST_EXPIRE, tags=("posts", post_tags))
 async def read_posts(
     skip: int = 0, 
     limit: int = 100,
@@ -24,6 +36,7 @@ async def read_posts(
     category_id: Optional[uuid.UUID] = Query(None, description="Filter posts by category ID"),
     tag_id: Optional[uuid.UUID] = Query(None, description="Filter posts by tag ID"),
     author_id: Optional[uuid.UUID] = Query(None, description="Filter posts by author ID"),
+    fieldset: FieldSet = Depends(post_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -35,30 +48,72 @@ async def read_posts(
     """
     # Note: Implement filtering by tag_id in the post_service
     
-    return await post_service.get_posts(
+    posts = await post_service.get_posts(
         db, 
         skip=skip, 
         limit=limit, 
         published_only=published,
         category_id=category_id,
         author_id=author_id,
-        tag_id=tag_id
+        tag_id=tag_id,
+        fieldset=fieldset
     )
+    return post_service.POSTS.shape(fieldset, posts)
 
-@router.get("/slug/{slug}", response_model=PostOut)
-@cache(expire=60)
+@router.get("/popular", response_model=List[PostOut])
+@cached(expire=60)
+async def read_popular_posts(
+    limit: int = Query(10, ge=1, le=100),
+    fieldset: FieldSet = Depends(post_fieldset),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the most viewed published posts"""
+    posts = await post_service.get_popular_posts(db, limit=limit, fieldset=fieldset)
+    return post_service.POSTS.shape(fieldset, posts)
+
+@router.get("/trending", response_model=List[PostOut])
+@cached(expire=30)
+async def read_trending_posts(
+    limit: int = Query(10, ge=1, le=100),
+    fieldset: FieldSet = Depends(post_fieldset),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get trending posts, ranked by recent views, comments and recency"""
+    posts = await post_service.get_trending_posts(db, limit=limit, fieldset=fieldset)
+    return post_service.POSTS.shape(fieldset, posts)
+
+@router.get("/batch", response_model=BatchOut[PostOut])
+async def read_posts_batch(
+    request: Request,
+    ids: List[uuid.UUID] = Depends(batch_ids),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get many posts by ID in one request: `/posts/batch?ids=a,b,c`
+
+    Posts come back in the order asked for; IDs that don't exist are listed
+    in `missing_ids`. Doesn't count as a view.
+    """
+    return await post_cache.resolve(
+        request, ids,
+        lambda misses: post_service.get_posts_by_ids(db, misses, fieldset=DEFAULT_FIELDSET)
+    )
+
+@router.get("/slug/{slug}", response_model=PostOut, dependencies=[Depends(record_post_view_by_slug)])
+@cached(expire=settings.CACHE_POST_EXPIRE, tags=(post_tags,))
 async def get_post_by_slug(
     slug: str,
+    fieldset: FieldSet = Depends(post_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """Get a post by its slug (SEO-friendly URL)"""
-    post = await post_service.get_post_by_slug(db, slug=slug)
+    post = await post_service.get_post_by_slug(db, slug=slug, fieldset=fieldset)
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
-    return post
+    return post_service.POSTS.shape(fieldset, post)
 
 @router.post("/", response_model=PostOut, status_code=status.HTTP_201_CREATED)
 async def create_post(
@@ -86,14 +141,26 @@ async def create_post(
         slug=slug
     )
 
-@router.get("/{post_id}", response_model=PostOut)
-@cache(expire=60)
+@router.get("/{post_id}", response_model=PostOut, dependencies=[Depends(record_post_view)])
+@cached(expire=settings.CACHE_POST_EXPIRE, tags=("post:{post_id}", post_tags))
 async def read_post(
     post_id: uuid.UUID, 
+    fieldset: FieldSet = Depends(post_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """Get a post by ID"""
-    return await post_service.get_post(db, post_id=post_id)
+    post = await post_service.get_post(db, post_id=post_id, fieldset=fieldset)
+    return post_service.POSTS.shape(fieldset, post)
+
+@router.get("/{post_id}/related", response_model=List[RelatedPostOut])
+@cached(expire=300)
+async def read_related_posts(
+    post_id: uuid.UUID,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get posts related to this one by shared tags and categories (precomputed)"""
+    return await post_service.get_related_posts(db, post_id, limit=limit)
 
 @router.put("/{post_id}", response_model=PostOut)
 async def update_post(
@@ -138,30 +205,34 @@ async def delete_post(
     return None
 
 @router.get("/category/{category_id}", response_model=List[PostOut])
-@cache(expire=60)
+@cached(expire=settings.CACHE_POST_EXPIRE, tags=("posts", "category:{category_id}", post_tags))
 async def get_posts_by_category(
     category_id: uuid.UUID,
     skip: int = 0,
     limit: int = 100,
     published: bool = True,
+    fieldset: FieldSet = Depends(post_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """Get all posts in a specific category"""
-    return await post_service.get_posts_by_category(
+    posts = await post_service.get_posts_by_category(
         db=db, 
         category_id=category_id,
         skip=skip,
         limit=limit,
-        published_only=published
+        published_only=published,
+        fieldset=fieldset
     )
+    return post_service.POSTS.shape(fieldset, posts)
 
 @router.get("/user/{user_id}", response_model=List[PostOut])
-@cache(expire=60)
+@cached(expire=settings.CACHE_POST_EXPIRE, tags=("posts", post_tags))
 async def get_posts_by_user(
     user_id: uuid.UUID,
     skip: int = 0,
     limit: int = 100,
     published: Optional[bool] = None,
+    fieldset: FieldSet = Depends(post_fieldset),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
@@ -179,29 +250,34 @@ async def get_posts_by_user(
     # Otherwise, decide based on the current user
     published_only = published if published is not None else not include_unpublished
     
-    return await post_service.get_posts(
+    posts = await post_service.get_posts(
         db=db,
         skip=skip,
         limit=limit,
         published_only=published_only,
-        author_id=user_id
+        author_id=user_id,
+        fieldset=fieldset
     )
+    return post_service.POSTS.shape(fieldset, posts)
 
 @router.get("/tag/{tag_id}", response_model=List[PostOut])
-@cache(expire=60)
+@cached(expire=settings.CACHE_POST_EXPIRE, tags=("posts", "tag:{tag_id}", post_tags))
 async def get_posts_by_tag(
     tag_id: uuid.UUID,
     skip: int = 0,
     limit: int = 100,
     published: bool = True,
+    fieldset: FieldSet = Depends(post_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """Get all posts with a specific tag"""
-    return await post_service.get_posts(
+    posts = await post_service.get_posts(
         db=db,
         skip=skip,
         limit=limit,
         published_only=published,
-        tag_id=tag_id
+        tag_id=tag_id,
+        fieldset=fieldset
     )
+    return post_service.POSTS.shape(fieldset, posts)
 
@@ -1,50 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_cache.decorator import cache
+from ..cache import cached, result_tags
+from ..config import settings
 
 from ..database.session import get_db
-from ..schemas.tag import TagOut, TagCreate, TagUpdate
+from ..schemas.tag import TagOut, TagCreate, TagUpdate, BulkTagging, BulkTaggingResult
 from ..service import tag as tag_service
-from ..dependencies import require_superuser
+from ..dependencies import require_superuser, get_current_user
+from ..models import User
+from ..utils.serialization import FastJSONRoute
+from ..utils.fieldsets import FieldSet
 
 from typing import List
 import uuid
 
-router = APIRouter(prefix="/tags", tags=["tags"])
+router = APIRouter(prefix="/tags", tags=["tags"], route_class=FastJSONRoute)
+tag_fieldset = tag_service.TAGS.query()
+tag_tags = result_tags("tag", "tag_id", "tags")
 
 @router.get("/", response_model=List[TagOut])
-@cache(expire=60)
+@cached(expire=settings.CACHE_LONG_EXPIRE, tags=("tags", tag_tags))
 async def read_tags(
     skip: int = 0, 
     limit: int = 100,
+    fieldset: FieldSet = Depends(tag_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get all tags with pagination.
     """
-    return await tag_service.get_tags(db, skip=skip, limit=limit)
+    tags = await tag_service.get_tags(db, skip=skip, limit=limit)
+    return tag_service.TAGS.shape(fieldset, tags)
+
+@router.get("/autocomplete", response_model=List[TagOut])
+async def autocomplete_tags(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """
+    Suggest tags for a prefix, most used first.
+    """
+    return await tag_service.autocomplete_tags(q, limit=limit)
 
 @router.get("/{tag_id}", response_model=TagOut)
-@cache(expire=60)
+@cached(expire=settings.CACHE_LONG_EXPIRE, tags=("tag:{tag_id}",))
 async def read_tag(
     tag_id: uuid.UUID,
+    fieldset: FieldSet = Depends(tag_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get a specific tag by ID.
     """
-    return await tag_service.get_tag(db, tag_id)
+    tag = await tag_service.get_tag(db, tag_id)
+    return tag_service.TAGS.shape(fieldset, tag)
 
 @router.get("/slug/{slug}", response_model=TagOut)
-@cache(expire=60)
+@cached(expire=settings.CACHE_LONG_EXPIRE, tags=(tag_tags,))
 async def read_tag_by_slug(
     slug: str,
+    fieldset: FieldSet = Depends(tag_fieldset),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get a specific tag by slug.
     """
-    return await tag_service.get_tag_by_slug(db, slug)
+    tag = await tag_service.get_tag_by_slug(db, slug)
+    return tag_service.TAGS.shape(fieldset, tag)
 
 @router.post("/", response_model=TagOut, status_code=status.HTTP_201_CREATED)
 async def create_tag(
@@ -56,6 +78,21 @@ async def create_tag(
     """
     return await tag_service.create_tag(db, tag)
 
+@router.post("/bulk", response_model=BulkTaggingResult)
+async def bulk_tag_posts(
+    tagging: BulkTagging,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Tag up to 1,000 posts by tag name in one transaction.
+
+    Missing tags are created. With `replace` (default) each listed post ends
+    up with exactly the given tags, otherwise they are only added. Authors
+    may only tag their own posts; superusers any post.
+    """
+    return await tag_service.bulk_tag_posts(db, tagging, current_user)
+
 @router.put("/{tag_id}", response_model=TagOut)
 async def update_tag(
     tag_id: uuid.UUID,
@@ -1,10 +1,11 @@
 from fastapi import APIRouter
-from fastapi_cache.decorator import cache
+from ..cache import cached
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 @router.get("/test-cache")
-@cache(expire=10)
+@cached(expire=10)
 async def test_cache():
     print("⚡ NOT FROM CACHE")
     return {"msg": "hello"}
@@ -1,20 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..database.session import get_db
 from ..schemas.user import UserCreate, UserOut, UserUpdate
 from ..schemas.post import PostOut
+from ..schemas.batch import BatchOut
 from ..service import user as user_service
 from ..service import post as post_service
 from ..models import User
 from ..dependencies import require_superuser, get_current_user
+from ..utils.serialization import FastJSONRoute
+from ..utils.fieldsets import FieldSet, DEFAULT_FIELDSET
 from typing import List
 import uuid
-from fastapi_cache.decorator import cache
+from ..cache import cached, result_tags, EntityCache, batch_ids
 from slugify import slugify
 from unidecode import unidecode
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=FastJSONRoute)
+user_fieldset = user_service.USERS.query()
+user_cache = EntityCache("user", UserOut, "user_id")
+user_tags = result_tags("user", "user_id", "users")
 
 security = HTTPBearer()
 
@@ -28,8 +34,9 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     return await user_service.create_user(db=db, user=user)
 
 @router.get("/", response_model=List[UserOut])
-@cache(expire=60)
+@cached(expire=60, tags=("users", user_tags))
 async def read_users(
+        fieldset: FieldSet = Depends(user_fieldset),
         db: AsyncSession = Depends(get_db),
         skip: int = 0, 
         limit: int = 100, 
@@ -37,10 +44,10 @@ async def read_users(
     ):
     """Get all users (superuser only)"""
     try:
-        users = await user_service.get_users(db, skip=skip, limit=limit)
+        users = await user_service.get_users(db, skip=skip, limit=limit, fieldset=fieldset)
     except HTTPException as http_exc:
         raise http_exc
-    return users
+    return user_service.USERS.shape(fieldset, users)
 
 @router.get("/me", response_model=UserOut)
 async def read_user_me(
@@ -49,15 +56,30 @@ async def read_user_me(
     """Get current logged in user profile"""
     return current_user
 
+@router.get("/batch", response_model=BatchOut[UserOut])
+async def read_users_batch(
+    request: Request,
+    ids: List[uuid.UUID] = Depends(batch_ids),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get many users by ID in one request: `/users/batch?ids=a,b,c`"""
+    return await user_cache.resolve(
+        request, ids,
+        lambda misses: user_service.get_users_by_ids(db, misses, fieldset=DEFAULT_FIELDSET)
+    )
+
 @router.get("/{user_id}", response_model=UserOut)
-@cache(expire=60)
+@cached(expire=60, tags=("user:{user_id}",))
 async def get_user_by_id(
     user_id: uuid.UUID, 
+    fieldset: FieldSet = Depends(user_fieldset),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific user by ID"""
-    return await user_service.get_user(db, user_id=user_id)
+    user = await user_service.get_user(db, user_id=user_id, fieldset=fieldset)
+    return user_service.USERS.shape(fieldset, user)
 
 @router.patch("/me", response_model=UserOut)
 async def update_current_user(
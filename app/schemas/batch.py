@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import Generic, List, TypeVar
+from uuid import UUID
+
+T = TypeVar("T")
+
+class BatchOut(BaseModel, Generic[T]):
+    """Entities found, in request order, and the requested ids that don't exist"""
+    items: List[T]
+    missing_ids: List[UUID]
@@ -19,6 +19,7 @@ class CategoryOut(CategoryBase):
     slug: str
     created_at: datetime
     updated_at: datetime
+    post_count: int = 0
     posts_count: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True) 
\ No newline at end of file
@@ -24,6 +24,8 @@ class CommentOutBase(CommentBase):
     post_id: UUID
     user_id: UUID
     parent_id: Optional[UUID] = None
+    depth: int = 0
+    reply_count: int = 0
     created_at: datetime
     updated_at: datetime
     user: UserOut
@@ -36,5 +38,18 @@ class CommentOut(CommentOutBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# A comment with one page of its replies; replies_cursor fetches the next
+# page from /comments/{comment_id}/replies and is null when there is none
+class CommentNode(CommentOutBase):
+    replies: List['CommentNode'] = Field(default_factory=list)
+    replies_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class CommentPage(BaseModel):
+    items: List[CommentNode]
+    next_cursor: Optional[str] = None
+
 # Required for self-referencing model
-CommentOut.model_rebuild()
\ No newline at end of file
+CommentOut.model_rebuild()
+CommentNode.model_rebuild()
\ No newline at end of file
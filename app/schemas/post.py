@@ -53,9 +53,20 @@ class PostOut(BaseModel):
     published_at: Optional[datetime]
     created_at: datetime
     updated_at: datetime
+    comment_count: int = 0
+    media_count: int = 0
+    view_count: int = 0
     author: UserOut
     categories: List[CategoryOut] = []
     tags: List[TagOut] = []
     media: List[MediaOut] = []
 
     model_config = ConfigDict(from_attributes=True)
+
+class RelatedPostOut(BaseModel):
+    post_id: UUID
+    title: str
+    slug: str
+    summary: Optional[str] = None
+    published_at: Optional[datetime] = None
+    score: float
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Optional, List, Annotated
 from datetime import datetime
 from uuid import UUID
 
@@ -15,8 +15,25 @@ class TagUpdate(BaseModel):
 class TagOut(TagBase):
     tag_id: UUID
     slug: str
+    post_count: int = 0
     created_at: datetime
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
 
+TagName = Annotated[str, Field(min_length=1, max_length=50)]
+
+class PostTagNames(BaseModel):
+    post_id: UUID
+    tags: List[TagName] = Field(default_factory=list, max_length=100)
+
+class BulkTagging(BaseModel):
+    posts: List[PostTagNames] = Field(..., min_length=1, max_length=1000)
+    # True: each post ends up with exactly these tags, False: tags are only added
+    replace: bool = True
+
+class BulkTaggingResult(BaseModel):
+    tags_created: List[TagOut] = []
+    links_added: int = 0
+    links_removed: int = 0
+    missing_post_ids: List[UUID] = []
@@ -1,23 +1,74 @@
+import asyncio
+import logging
+from typing import Optional, Set
+from uuid import UUID
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..utils.security.password import verify_password
+from ..database import AsyncSessionLocal
+from ..models import User
+from ..utils.security.password import needs_rehash
+from .login_guard import login_guard
 from .user import get_user_by_email
 from fastapi import HTTPException, status
 
+logger = logging.getLogger(__name__)
+
+_pending: Set[UUID] = set()
+_tasks: Set[asyncio.Task] = set()
+
+
+async def _rehash(user_id: UUID, old_hash: str, password: str) -> None:
+    try:
+        new_hash = await login_guard.hash(password)
+        async with AsyncSessionLocal() as db:
+            # Only if the password wasn't changed meanwhile
+            await db.execute(
+                update(User)
+                .where(User.user_id == user_id, User.password_hash == old_hash)
+                .values(password_hash=new_hash, updated_at=User.updated_at)
+            )
+            await db.commit()
+    except Exception as e:
+        # Stays on the old hash; the next login tries again
+        logger.warning("Password rehash for %s failed: %r", user_id, e)
+    finally:
+        _pending.discard(user_id)
+
+
+def schedule_rehash(user_id: UUID, old_hash: str, password: str) -> None:
+    """Upgrade a verified password's hash to the current cost, off the request path"""
+    if user_id in _pending:
+        return
+    _pending.add(user_id)
+    task = asyncio.create_task(_rehash(user_id, old_hash, password))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
 
 async def authenticate_user(
     db: AsyncSession, 
     email: str, 
-    password: str
+    password: str,
+    client_ip: Optional[str] = None
 ):
+    # Locked out: no lookup, no bcrypt
+    await login_guard.check(email, client_ip)
+
     user = await get_user_by_email(db, email)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Please check email or password!"
-        )
-    elif not verify_password(password, user.password_hash):
+    if user:
+        valid = await login_guard.verify(password, user.password_hash)
+    else:
+        # Same time, same answer as a wrong password
+        await login_guard.imitate_verify()
+        valid = False
+
+    if not valid:
+        await login_guard.failed(email, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not found user, please sign up!"
+            detail="Incorrect email or password"
         )
+    await login_guard.succeeded(email)
+    if needs_rehash(user.password_hash):
+        schedule_rehash(user.user_id, user.password_hash, password)
     return user
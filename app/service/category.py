@@ -5,16 +5,23 @@ from ..models import Category, Post
 from ..schemas import CategoryCreate, CategoryUpdate
 from fastapi import HTTPException, status
 from uuid import UUID
+from typing import Optional
 from datetime import datetime
 from slugify import slugify
 from unidecode import unidecode
+from .counters import bump_category_counts
+from .related import schedule_related_refresh
+from .taxonomy import taxonomy
+from .outbox import emit
+from ..schemas import CategoryOut
+from ..utils.fieldsets import Resource
+from ..database.loader import get_loader
 
-async def get_category(db: AsyncSession, category_id: UUID):
-    result = await db.execute(
-        select(Category)
-        .where(Category.category_id == category_id)
-    )
-    category = result.scalars().first()
+CATEGORIES = Resource(Category, CategoryOut)
+
+async def _load_category(db: AsyncSession, category_id: UUID) -> Category:
+    """The Category row itself, for writes"""
+    category = await get_loader(db).load(Category, category_id)
     if not category:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -22,12 +29,27 @@ async def get_category(db: AsyncSession, category_id: UUID):
         )
     return category
 
-async def get_category_by_slug(db: AsyncSession, slug: str):
-    result = await db.execute(
-        select(Category)
-        .where(Category.slug == slug)
-    )
-    return result.scalars().first()
+async def _slug_taken(db: AsyncSession, slug: str) -> bool:
+    # Uniqueness is checked against Postgres, not a possibly lagging snapshot
+    result = await db.execute(select(Category.category_id).where(Category.slug == slug))
+    return result.first() is not None
+
+async def get_category(db: AsyncSession, category_id: UUID) -> CategoryOut:
+    snapshot = await taxonomy.get()
+    category = snapshot.categories_by_id.get(category_id)
+    if not category:
+        # Possibly created by another process since the snapshot was built
+        category = CategoryOut.model_validate(await _load_category(db, category_id))
+    return category
+
+async def get_category_by_slug(db: AsyncSession, slug: str) -> Optional[CategoryOut]:
+    snapshot = await taxonomy.get()
+    category = snapshot.categories_by_slug.get(slug)
+    if not category:
+        result = await db.execute(select(Category).where(Category.slug == slug))
+        row = result.scalars().first()
+        category = CategoryOut.model_validate(row) if row else None
+    return category
 
 async def get_categories(
     db: AsyncSession, 
@@ -35,40 +57,18 @@ async def get_categories(
     limit: int = 100,
     with_post_count: bool = False
 ):
+    snapshot = await taxonomy.get()
+    categories = snapshot.categories[skip:skip + limit]
     if with_post_count:
-        # Query with post count
-        from sqlalchemy import func, distinct
-        result = await db.execute(
-            select(
-                Category,
-                func.count(distinct(Post.post_id)).label("posts_count")
-            )
-            .outerjoin(Category.posts)
-            .group_by(Category.category_id)
-            .offset(skip)
-            .limit(limit)
-        )
-        # Process the result to include post count
-        categories_with_count = []
-        for cat, count in result:
-            setattr(cat, "posts_count", count)
-            categories_with_count.append(cat)
-        return categories_with_count
-    else:
-        # Simple query without post count
-        result = await db.execute(
-            select(Category)
-            .offset(skip)
-            .limit(limit)
-        )
-        return result.scalars().all()
+        # Served from the maintained post_count column, no aggregate needed
+        categories = [cat.model_copy(update={"posts_count": cat.post_count}) for cat in categories]
+    return list(categories)
 
 async def create_category(db: AsyncSession, category: CategoryCreate):
 
     slug = unidecode(slugify(category.name))    
     
-    existing_slug = await get_category_by_slug(db, slug=slug)
-    if existing_slug:
+    if await _slug_taken(db, slug):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Category with this slug already exists"
@@ -81,8 +81,11 @@ async def create_category(db: AsyncSession, category: CategoryCreate):
     )
     
     db.add(db_category)
+    await db.flush()
+    emit(db, "category.created", db_category.category_id)
     await db.commit()
     await db.refresh(db_category)
+    await taxonomy.invalidate(category_ids=[db_category.category_id])
     return db_category
 
 async def update_category(
@@ -90,14 +93,13 @@ async def update_category(
     category_id: UUID, 
     category: CategoryUpdate
 ):
-    db_category = await get_category(db, category_id)
+    db_category = await _load_category(db, category_id)
     
     update_data = category.model_dump(exclude_unset=True)
     
     # If slug is being updated, check if the new slug exists
     if "slug" in update_data and update_data["slug"] != db_category.slug:
-        existing_slug = await get_category_by_slug(db, slug=update_data["slug"])
-        if existing_slug:
+        if await _slug_taken(db, update_data["slug"]):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Category with this slug already exists"
@@ -108,15 +110,19 @@ async def update_category(
         setattr(db_category, field, value)
     
     db_category.updated_at = datetime.utcnow()
+    emit(db, "category.updated", category_id)
     await db.commit()
     await db.refresh(db_category)
+    await taxonomy.invalidate(category_ids=[category_id])
     return db_category
 
 async def delete_category(db: AsyncSession, category_id: UUID):
-    db_category = await get_category(db, category_id)
+    db_category = await _load_category(db, category_id)
     
+    emit(db, "category.deleted", category_id)
     await db.delete(db_category)
     await db.commit()
+    await taxonomy.invalidate(category_ids=[category_id])
     return {"status": "success", "message": "Category deleted"}
 
 async def add_post_to_category(
@@ -129,7 +135,7 @@ async def add_post_to_category(
     post = await get_post(db, post_id)
     
     # Check if category exists
-    category = await get_category(db, category_id)
+    category = await _load_category(db, category_id)
     
     # Check if relationship already exists
     if category in post.categories:
@@ -140,7 +146,10 @@ async def add_post_to_category(
     
     # Add relationship
     post.categories.append(category)
+    await bump_category_counts(db, [category_id], 1)
+    emit(db, "category.posts_changed", category_id, post_ids=[post_id])
     await db.commit()
+    await schedule_related_refresh(post_id)
     return {"status": "success", "message": "Post added to category"}
 
 async def remove_post_from_category(
@@ -153,7 +162,7 @@ async def remove_post_from_category(
     post = await get_post(db, post_id)
     
     # Check if category exists
-    category = await get_category(db, category_id)
+    category = await _load_category(db, category_id)
     
     # Check if relationship exists
     if category not in post.categories:
@@ -164,5 +173,8 @@ async def remove_post_from_category(
     
     # Remove relationship
     post.categories.remove(category)
+    await bump_category_counts(db, [category_id], -1)
+    emit(db, "category.posts_changed", category_id, post_ids=[post_id])
     await db.commit()
+    await schedule_related_refresh(post_id)
     return {"status": "success", "message": "Post removed from category"} 
\ No newline at end of file
@@ -1,114 +1,243 @@
-from typing import List, Optional
-from uuid import UUID
-from sqlalchemy import select
+import base64
+import json
+import time
+from collections import defaultdict
+from typing import List, Optional, Tuple
+from uuid import UUID, uuid4
+from fastapi import HTTPException, status
+from sqlalchemy import select, func, delete, cast, bindparam, true
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from ..config import settings
+from ..database.loader import get_loader
 from ..models import Comment, User
-from ..schemas.comment import CommentCreate, CommentUpdate
+from ..schemas.comment import CommentCreate, CommentUpdate, CommentOutBase
+from ..utils.serialization import dump_json
+from .comment_stream import comment_stream
+from .counters import bump_post_counter, bump_reply_count
+from .outbox import emit
+from .trending import trending
+
+# Sorts after every character a path segment can contain
+PATH_END = "~"
+
+
+def path_segment(comment_id: UUID) -> str:
+    """
+    A comment's own part of its path: creation time in microseconds (13 hex
+    digits, good until 2112) and 3 hex digits of its id to split ties.
+    Fixed width, so siblings sort by creation time.
+    """
+    return f"{time.time_ns() // 1000:013x}{comment_id.hex[:3]}"
+
+
+def in_subtree(comment: Comment):
+    """Conditions selecting a comment and all its replies: one range on (post_id, path)"""
+    return (
+        Comment.post_id == comment.post_id,
+        Comment.path >= comment.path,
+        Comment.path < comment.path + PATH_END,
+    )
+
+
+async def _publish(event: str, comment: "ThreadNode") -> "ThreadNode":
+    """Tell live subscribers of the post; call after committing"""
+    await comment_stream.publish(comment.post_id, event, dump_json(CommentOutBase, comment).decode())
+    return comment
+
+
+async def _new_comment(
+    db: AsyncSession,
+    content: str,
+    post_id: UUID,
+    user_id: UUID,
+    parent_id: Optional[UUID] = None
+) -> Comment:
+    """A Comment placed in its thread: path and depth follow from the parent's"""
+    comment_id = uuid4()
+    path, depth = path_segment(comment_id), 0
+    if parent_id is not None:
+        # Usually already in the session, loaded by the route to check it exists
+        parent = await get_loader(db).load(Comment, parent_id)
+        if parent is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Parent comment not found"
+            )
+        if parent.post_id != post_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parent comment belongs to another post"
+            )
+        if parent.depth >= settings.COMMENT_MAX_DEPTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Thread is too deep to reply here"
+            )
+        path, depth = parent.path + path, parent.depth + 1
+    return Comment(
+        comment_id=comment_id,
+        content=content,
+        post_id=post_id,
+        user_id=user_id,
+        parent_id=parent_id,
+        path=path,
+        depth=depth
+    )
 
 async def create_comment(
     db: AsyncSession,
     comment: CommentCreate,
     user_id: UUID
-) -> Comment:
-    db_comment = Comment(
+) -> "ThreadNode":
+    db_comment = await _new_comment(
+        db,
         content=comment.content,
         post_id=comment.post_id,
         user_id=user_id,
         parent_id=comment.parent_id
     )
     db.add(db_comment)
+    await bump_post_counter(db, comment.post_id, "comment_count", 1)
+    if comment.parent_id:
+        await bump_reply_count(db, comment.parent_id, 1)
+    emit(
+        db, "comment.created", db_comment.comment_id,
+        post_ids=[comment.post_id], comment_ids=[comment.parent_id] if comment.parent_id else (),
+    )
     await db.commit()
     await db.refresh(db_comment)
+    await trending.record_comment(comment.post_id)
     
     # Get the comment with related entities to avoid async loading issues
-    return await get_comment(db, db_comment.comment_id)
+    return await _publish("comment.created", await get_comment(db, db_comment.comment_id))
 
-async def get_comments_by_post(
+async def find_comment(
     db: AsyncSession,
-    post_id: UUID,
-    skip: int = 0,
-    limit: int = 100
-) -> List[Comment]:
-    """Get root comments for a post with their replies loaded recursively"""
-    query = (
-        select(Comment)
-        .where(Comment.post_id == post_id, Comment.parent_id.is_(None))
-        .options(
-            selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.user)
-        )
-        .order_by(Comment.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-    )
-    result = await db.execute(query)
-    return list(result.scalars().unique())
+    comment_id: UUID
+) -> Optional[Comment]:
+    """The comment row alone, e.g. for existence and permission checks"""
+    return await get_loader(db).load(Comment, comment_id)
 
 async def get_comment(
     db: AsyncSession,
     comment_id: UUID
-) -> Optional[Comment]:
-    """Get a single comment with its replies loaded recursively"""
+) -> Optional["ThreadNode"]:
+    """A comment as writes return it: with its first COMMENT_REPLY_PREVIEW replies"""
+    return await get_thread_node(db, comment_id, depth=2, replies_limit=settings.COMMENT_REPLY_PREVIEW)
+
+async def get_comments_by_ids(
+    db: AsyncSession,
+    comment_ids: List[UUID]
+) -> List[Comment]:
+    """Comments with these ids and their authors, without replies"""
     query = (
         select(Comment)
-        .where(Comment.comment_id == comment_id)
-        .options(
-            selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.user)
-        )
+        .where(Comment.comment_id.in_(comment_ids))
+        .options(selectinload(Comment.user))
     )
     result = await db.execute(query)
-    return result.scalar_one_or_none()
+    return list(result.scalars())
 
 async def update_comment(
     db: AsyncSession,
     db_comment: Comment,
     comment: CommentUpdate
-) -> Comment:
+) -> "ThreadNode":
     if comment.content is not None:
         db_comment.content = comment.content
     
+    emit(db, "comment.updated", db_comment.comment_id)
     await db.commit()
     await db.refresh(db_comment)
     
     # Get the comment with related entities to avoid async loading issues
-    return await get_comment(db, db_comment.comment_id)
+    return await _publish("comment.updated", await get_comment(db, db_comment.comment_id))
+
+async def count_comment_subtree(
+    db: AsyncSession,
+    comment_id: UUID
+) -> int:
+    """Count a comment and all of its nested replies"""
+    comment = await get_loader(db).load(Comment, comment_id)
+    if comment is None:
+        return 0
+    result = await db.execute(select(func.count()).where(*in_subtree(comment)))
+    return result.scalar_one()
+
+async def get_comment_subtree(
+    db: AsyncSession,
+    comment_id: UUID,
+    max_depth: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List[Comment]:
+    """
+    A comment and its replies as a flat list in threaded order (each reply
+    right after its parent, siblings oldest first), optionally only down to
+    `max_depth` levels below the comment.
+    """
+    comment = await get_loader(db).load(Comment, comment_id)
+    if comment is None:
+        return []
+    query = (
+        select(Comment)
+        .where(*in_subtree(comment))
+        .options(selectinload(Comment.user))
+        .order_by(Comment.path)
+    )
+    if max_depth is not None:
+        query = query.where(Comment.depth <= comment.depth + max_depth)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return list(result.scalars())
 
 async def delete_comment(
     db: AsyncSession,
     db_comment: Comment
 ) -> None:
-    await db.delete(db_comment)
+    # One range delete for the comment and its replies; the counter drops by all of them
+    result = await db.execute(
+        delete(Comment)
+        .where(*in_subtree(db_comment))
+        .returning(Comment.comment_id)
+        .execution_options(synchronize_session="fetch")
+    )
+    removed = list(result.scalars())
+    await bump_post_counter(db, db_comment.post_id, "comment_count", -len(removed))
+    if db_comment.parent_id:
+        await bump_reply_count(db, db_comment.parent_id, -1)
+    emit(
+        db, "comment.deleted", db_comment.comment_id, post_ids=[db_comment.post_id],
+        comment_ids=[*removed, *([db_comment.parent_id] if db_comment.parent_id else ())],
+    )
     await db.commit()
+    await comment_stream.publish(db_comment.post_id, "comment.deleted", json.dumps({
+        "comment_id": str(db_comment.comment_id),
+        "parent_id": str(db_comment.parent_id) if db_comment.parent_id else None,
+        "removed": len(removed),
+    }))
 
 async def get_comments_by_user(
     db: AsyncSession,
     user_id: UUID,
     skip: int = 0,
     limit: int = 100
-) -> List[Comment]:
-    """Get all comments made by a specific user with nested replies"""
+) -> List["ThreadNode"]:
+    """A user's comments, newest first, each with its first COMMENT_REPLY_PREVIEW replies"""
     query = (
         select(Comment)
         .where(Comment.user_id == user_id)
-        .options(
-            selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.user),
-            selectinload(Comment.post)
-        )
+        .options(selectinload(Comment.user))
         .order_by(Comment.created_at.desc())
         .offset(skip)
         .limit(limit)
     )
     result = await db.execute(query)
-    return list(result.scalars().unique())
+    nodes = [ThreadNode(comment) for comment in result.scalars()]
+    await _expand(db, nodes, 1, settings.COMMENT_REPLY_PREVIEW)
+    return nodes
 
 async def reply_to_comment(
     db: AsyncSession,
@@ -116,10 +245,11 @@ async def reply_to_comment(
     reply_content: str,
     post_id: UUID,
     user_id: UUID
-) -> Comment:
+) -> "ThreadNode":
     """Create a reply to an existing comment"""
     # Create the reply comment
-    db_reply = Comment(
+    db_reply = await _new_comment(
+        db,
         content=reply_content,
         post_id=post_id,
         user_id=user_id,
@@ -127,30 +257,169 @@ async def reply_to_comment(
     )
     
     db.add(db_reply)
+    await bump_post_counter(db, post_id, "comment_count", 1)
+    await bump_reply_count(db, parent_comment_id, 1)
+    emit(db, "comment.created", db_reply.comment_id, post_ids=[post_id], comment_ids=[parent_comment_id])
     await db.commit()
     await db.refresh(db_reply)
+    await trending.record_comment(post_id)
     
     # Get the comment with related entities to avoid async loading issues
-    return await get_comment(db, db_reply.comment_id)
+    return await _publish("comment.created", await get_comment(db, db_reply.comment_id))
+
+
+# Paginated thread loading
+#
+# Pages are keyed on path rather than offset: top-level comments of a post
+# newest first, replies oldest first. Every node carries its reply_count and
+# at most `replies_limit` replies, `depth` levels down, so one request costs
+# a bounded number of rows and one query per level however big the thread.
+
+def encode_cursor(path: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": path}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[str]:
+    if not cursor:
+        return None
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"]
+        if not isinstance(after, str):
+            raise ValueError(after)
+        return after
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+class ThreadNode:
+    """A comment with the page of its replies loaded for this request"""
+    __slots__ = ("comment", "replies", "replies_cursor")
+
+    def __init__(self, comment: Comment):
+        self.comment = comment
+        self.replies: List["ThreadNode"] = []
+        # Not expanded: the first page of replies is one call away
+        self.replies_cursor = encode_cursor("") if comment.reply_count else None
+
+    def __getattr__(self, name):
+        return getattr(self.comment, name)
+
+
+def _page(rows: List[Comment], limit: int) -> Tuple[List[Comment], Optional[str]]:
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1].path)
+    return rows, None
+
+
+async def _first_replies(db: AsyncSession, parent_ids: List[UUID], limit: int) -> List[Comment]:
+    """Up to `limit` oldest replies of each parent: one LATERAL index range per parent"""
+    parents = func.unnest(
+        cast(bindparam("parent_ids", parent_ids), ARRAY(PG_UUID(as_uuid=True)))
+    ).table_valued("parent_id").render_derived(name="p")
+    first = (
+        select(Comment.comment_id)
+        .where(Comment.parent_id == parents.c.parent_id)
+        .order_by(Comment.path)
+        .limit(limit)
+        .correlate(parents)
+        .lateral("first_replies")
+    )
+    result = await db.execute(
+        select(Comment)
+        .select_from(parents)
+        .join(first, true())
+        .join(Comment, Comment.comment_id == first.c.comment_id)
+        .options(selectinload(Comment.user))
+        .order_by(Comment.path)
+    )
+    return list(result.scalars())
 
-async def get_replies_for_comment(
+
+async def _expand(db: AsyncSession, nodes: List[ThreadNode], levels: int, replies_limit: int) -> None:
+    level = nodes if replies_limit > 0 else []
+    while levels > 0 and level:
+        parents = [node for node in level if node.reply_count]
+        if not parents:
+            break
+        children = defaultdict(list)
+        for reply in await _first_replies(db, [node.comment_id for node in parents], replies_limit + 1):
+            children[reply.parent_id].append(reply)
+        level = []
+        for node in parents:
+            replies, node.replies_cursor = _page(children[node.comment_id], replies_limit)
+            node.replies = [ThreadNode(reply) for reply in replies]
+            level.extend(node.replies)
+        levels -= 1
+
+
+async def get_thread_node(
     db: AsyncSession,
     comment_id: UUID,
-    skip: int = 0,
-    limit: int = 100
-) -> List[Comment]:
-    """Get all direct replies for a specific comment"""
+    depth: int = 2,
+    replies_limit: int = 3
+) -> Optional[ThreadNode]:
+    """A comment with its first replies, `depth` levels including itself"""
+    result = await db.execute(
+        select(Comment)
+        .where(Comment.comment_id == comment_id)
+        .options(selectinload(Comment.user))
+    )
+    comment = result.scalar_one_or_none()
+    if comment is None:
+        return None
+    node = ThreadNode(comment)
+    await _expand(db, [node], depth - 1, replies_limit)
+    return node
+
+
+async def get_post_comment_page(
+    db: AsyncSession,
+    post_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    depth: int = 2,
+    replies_limit: int = 3
+) -> Tuple[List[ThreadNode], Optional[str]]:
+    """A page of a post's top-level comments, newest first, and the next cursor"""
+    query = (
+        select(Comment)
+        .where(Comment.post_id == post_id, Comment.parent_id.is_(None))
+        .options(selectinload(Comment.user))
+        .order_by(Comment.path.desc())
+        .limit(limit + 1)
+    )
+    after = decode_cursor(cursor)
+    if after:
+        query = query.where(Comment.path < after)
+    rows, next_cursor = _page(list((await db.execute(query)).scalars()), limit)
+    nodes = [ThreadNode(comment) for comment in rows]
+    await _expand(db, nodes, depth - 1, replies_limit)
+    return nodes, next_cursor
+
+
+async def get_reply_page(
+    db: AsyncSession,
+    comment_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    depth: int = 2,
+    replies_limit: int = 3
+) -> Tuple[List[ThreadNode], Optional[str]]:
+    """A page of a comment's direct replies, oldest first, and the next cursor"""
     query = (
         select(Comment)
         .where(Comment.parent_id == comment_id)
-        .options(
-            selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.user),
-            selectinload(Comment.replies).selectinload(Comment.replies).selectinload(Comment.user)
-        )
-        .order_by(Comment.created_at.asc())  # Show oldest replies first
-        .offset(skip)
-        .limit(limit)
+        .options(selectinload(Comment.user))
+        .order_by(Comment.path)
+        .limit(limit + 1)
     )
-    result = await db.execute(query)
-    return list(result.scalars().unique())
\ No newline at end of file
+    after = decode_cursor(cursor)
+    if after:
+        query = query.where(Comment.path > after)
+    rows, next_cursor = _page(list((await db.execute(query)).scalars()), limit)
+    nodes = [ThreadNode(comment) for comment in rows]
+    await _expand(db, nodes, depth - 1, replies_limit)
+    return nodes, next_cursor
@@ -0,0 +1,231 @@
+"""
+Live comment events for Server-Sent Events subscribers.
+
+The comment service publishes an event after each committed create, reply,
+update or delete. Publishing appends it to a capped Redis stream per post
+(``comments:stream:<post_id>``, whose entry id becomes the SSE event id)
+and PUBLISHes it on one channel, both in one Lua script, so events go out
+on the channel in stream id order whichever worker published them. Every worker holds a single subscription
+to that channel and hands each event to its local subscribers of the post,
+so thousands of idle SSE connections cost one queue each and nothing else.
+
+A client reconnecting with ``Last-Event-ID`` first gets what it missed
+from the post's stream (XRANGE after that id), then live events; live
+events at or before the last id replayed are skipped, so the two never
+overlap. A
+subscriber too slow to keep its queue drained is disconnected; it resumes
+the same way.
+
+Without Redis, events still reach the subscribers of the worker that
+published them, with local ids, and resume is best effort.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from ..cache import redis_client, redis_blocking_client
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "comments:events"
+
+# KEYS: post stream; ARGV: history, history ttl, channel, post id, event,
+# data. Returns the entry id.
+PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[5], 'data', ARGV[6])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('PUBLISH', ARGV[3], cjson.encode({post_id = ARGV[4], id = id, event = ARGV[5], data = ARGV[6]}))
+return id
+"""
+
+
+def stream_key(post_id: UUID) -> str:
+    return f"comments:stream:{post_id}"
+
+
+def _parse_id(event_id: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Redis stream ids ("<ms>-<seq>") order as integer pairs"""
+    try:
+        ms, seq = (event_id or "").split("-")
+        return int(ms), int(seq)
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class CommentEvent:
+    id: str
+    event: str
+    data: str
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {self.data}\n\n"
+
+
+class _Subscriber:
+    __slots__ = ("queue", "size", "overflowed")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.size = size
+        self.overflowed = False
+
+
+class CommentStream:
+    def __init__(
+        self,
+        redis=redis_client,
+        subscriber_redis=redis_blocking_client,
+        history: int = settings.COMMENT_STREAM_HISTORY,
+        history_ttl: int = settings.COMMENT_STREAM_HISTORY_TTL,
+        queue_size: int = settings.COMMENT_STREAM_QUEUE_SIZE,
+        max_subscribers: int = settings.COMMENT_STREAM_MAX_SUBSCRIBERS,
+    ):
+        self.redis = redis
+        self.subscriber_redis = subscriber_redis
+        self.history = history
+        self.history_ttl = history_ttl
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Dict[UUID, Set[_Subscriber]] = {}
+        self._count = 0
+        self._local_seq = itertools.count()
+        self._publish = redis.register_script(PUBLISH_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    # Publishing
+
+    async def publish(self, post_id: UUID, event: str, data: str) -> None:
+        """Call after committing the change the event describes"""
+        try:
+            await self._publish(
+                keys=[stream_key(post_id)],
+                args=[self.history, self.history_ttl, CHANNEL, str(post_id), event, data],
+            )
+        except Exception as e:
+            logger.warning("Comment event not published to Redis, local subscribers only: %r", e)
+            event_id = f"{int(time.time() * 1000)}-{next(self._local_seq)}"
+            self._dispatch(post_id, CommentEvent(event_id, event, data))
+
+    def _dispatch(self, post_id: UUID, event: CommentEvent) -> None:
+        for subscriber in list(self._subscribers.get(post_id, ())):
+            if subscriber.overflowed:
+                continue
+            if subscriber.queue.qsize() >= subscriber.size:
+                # Cut it off after what it already has rather than buffer without
+                # bound; it reconnects and resumes from history
+                subscriber.overflowed = True
+                subscriber.queue.put_nowait(None)
+            else:
+                subscriber.queue.put_nowait(event)
+
+    # Subscribing
+
+    async def _missed(self, post_id: UUID, last_event_id: str) -> List[CommentEvent]:
+        if _parse_id(last_event_id) is None:
+            return []
+        try:
+            entries = await self.redis.xrange(stream_key(post_id), min=f"({last_event_id}", max="+")
+        except Exception as e:
+            logger.warning("Comment stream history unavailable: %r", e)
+            return []
+        return [CommentEvent(entry_id, fields["event"], fields["data"]) for entry_id, fields in entries]
+
+    async def subscribe(
+        self,
+        post_id: UUID,
+        last_event_id: Optional[str] = None,
+        keepalive: float = settings.COMMENT_STREAM_KEEPALIVE,
+    ) -> AsyncIterator[Optional[CommentEvent]]:
+        """
+        Events for a post, starting after `last_event_id`. Yields None when
+        nothing happened for `keepalive` seconds; ends if the subscriber
+        falls too far behind.
+        """
+        subscriber = _Subscriber(self.queue_size)
+        # Register before reading history so nothing published meanwhile is lost
+        self._subscribers.setdefault(post_id, set()).add(subscriber)
+        self._count += 1
+        try:
+            # Live events up to here were replayed from history (or seen
+            # before the reconnect); ids past it go out in arrival order
+            replayed = _parse_id(last_event_id)
+            if last_event_id:
+                for event in await self._missed(post_id, last_event_id):
+                    replayed = _parse_id(event.id)
+                    yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                event_key = _parse_id(event.id)
+                if replayed is not None and event_key is not None and event_key <= replayed:
+                    continue
+                yield event
+        finally:
+            self._count -= 1
+            subscribers = self._subscribers.get(post_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[post_id]
+
+    # Cross-worker fan-out
+
+    async def _listen(self) -> None:
+        delay = 1.0
+        while True:
+            pubsub = self.subscriber_redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(CHANNEL)
+                delay = 1.0
+                async for message in pubsub.listen():
+                    try:
+                        payload = json.loads(message["data"])
+                        post_id = UUID(payload["post_id"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if post_id in self._subscribers:
+                        self._dispatch(post_id, CommentEvent(payload["id"], payload["event"], payload["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Comment event subscription lost, retrying in %.0fs: %r", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+comment_stream = CommentStream()
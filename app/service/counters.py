@@ -0,0 +1,62 @@
+from typing import Iterable, Mapping
+from uuid import UUID
+from sqlalchemy import update, func, cast, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Post, Tag, Category, Comment
+
+# Helpers for the denormalized counter columns. They only issue the UPDATE,
+# the caller commits so the counter changes in the same transaction as the
+# row it counts. updated_at is passed through unchanged so a counter bump
+# doesn't look like an edit of the row.
+
+async def bump_post_counter(db: AsyncSession, post_id: UUID, column: str, delta: int = 1):
+    col = getattr(Post, column)
+    await db.execute(
+        update(Post)
+        .where(Post.post_id == post_id)
+        .values({col: col + delta, Post.updated_at: Post.updated_at})
+    )
+
+async def bump_reply_count(db: AsyncSession, comment_id: UUID, delta: int = 1):
+    await db.execute(
+        update(Comment)
+        .where(Comment.comment_id == comment_id)
+        .values(reply_count=Comment.reply_count + delta, updated_at=Comment.updated_at)
+    )
+
+async def bump_tag_counts(db: AsyncSession, tag_ids: Iterable[UUID], delta: int = 1):
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    await db.execute(
+        update(Tag)
+        .where(Tag.tag_id.in_(tag_ids))
+        .values(post_count=Tag.post_count + delta, updated_at=Tag.updated_at)
+    )
+
+async def bump_category_counts(db: AsyncSession, category_ids: Iterable[UUID], delta: int = 1):
+    category_ids = list(category_ids)
+    if not category_ids:
+        return
+    await db.execute(
+        update(Category)
+        .where(Category.category_id.in_(category_ids))
+        .values(post_count=Category.post_count + delta, updated_at=Category.updated_at)
+    )
+
+async def apply_tag_count_deltas(db: AsyncSession, deltas: Mapping[UUID, int]):
+    """Different deltas for many tags in one UPDATE ... FROM unnest(ids, deltas)"""
+    deltas = {tag_id: delta for tag_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = func.unnest(
+        cast(bindparam("tag_ids", list(deltas)), ARRAY(PG_UUID(as_uuid=True))),
+        cast(bindparam("deltas", list(deltas.values())), ARRAY(Integer)),
+    ).table_valued("tag_id", "delta").render_derived(name="d")
+    await db.execute(
+        update(Tag)
+        .where(Tag.tag_id == rows.c.tag_id)
+        .values(post_count=Tag.post_count + rows.c.delta, updated_at=Tag.updated_at)
+    )
@@ -0,0 +1,163 @@
+"""
+Cross-worker invalidation of in-process state over Postgres LISTEN/NOTIFY.
+
+Every worker keeps things in its own memory: the fallback cache entries
+written while Redis is unreachable and the taxonomy snapshot. A trigger on
+the ``outbox`` table (see service.outbox) runs ``pg_notify('outbox', ...)``
+for every event, and Postgres delivers notifications only when the
+transaction commits, so a worker hears of a change exactly when it becomes
+visible, and never of one that rolled back.
+
+Each worker holds one dedicated asyncpg connection LISTENing on the
+channel, outside the SQLAlchemy pool. On each notification it:
+
+- drops its memory-cache entries tagged with what changed;
+- reloads a tag or category into its taxonomy snapshot when the row itself
+  was created, updated or deleted (bursts coalesce into one refresh). Post
+  writes only move their post_count, which is left to TAXONOMY_MAX_AGE
+  rather than have every worker reload on ordinary post traffic;
+- wakes the outbox relay, so it publishes at once rather than at its next
+  poll.
+
+None of this needs Redis, which is when memory entries exist at all.
+Payloads over the NOTIFY limit arrive marked ``overflow`` and clear the
+whole memory cache. Notifications sent while the connection is down are
+lost, so a reconnect does the same, plus a full taxonomy rebuild.
+"""
+import asyncio
+import json
+import logging
+from typing import Optional, Set
+from uuid import UUID
+
+import asyncpg
+
+from ..cache import cache_backend
+from ..config import settings
+from .outbox import ROW_CHANGES, TAXONOMY, invalidations, outbox_relay
+from .taxonomy import taxonomy
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "outbox"
+
+
+def listen_dsn(database_url: str) -> str:
+    """asyncpg DSN from the SQLAlchemy URL"""
+    return database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+class InvalidationBus:
+    def __init__(self, dsn: str = listen_dsn(settings.DATABASE_URL), enabled: bool = settings.INVALIDATION_BUS_ENABLED):
+        self.dsn = dsn
+        self.enabled = enabled
+        self.received = 0
+        self.overflows = 0
+        self.reconnects = 0
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+        self._taxonomy_task: Optional[asyncio.Task] = None
+        # What the next taxonomy refresh reloads; everything wins over ids
+        self._taxonomy_everything = False
+        self._stale_tags: Set[UUID] = set()
+        self._stale_categories: Set[UUID] = set()
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+            topic, aggregate_id = event["topic"], UUID(event["aggregate_id"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning("Unreadable invalidation notification: %.200s", payload)
+            return
+        self.received += 1
+        if event.get("overflow"):
+            self.overflows += 1
+            self._forget_everything()
+        else:
+            tags, keys = invalidations(topic, aggregate_id, event.get("payload") or {})
+            cache_backend.memory_backend.purge(tags, keys)
+            kind, _, action = topic.partition(".")
+            if kind in TAXONOMY and action in ROW_CHANGES:
+                (self._stale_tags if kind == "tag" else self._stale_categories).add(aggregate_id)
+                self._refresh_taxonomy()
+        outbox_relay.wake()
+
+    def _forget_everything(self) -> None:
+        cache_backend.memory_backend.flush()
+        self._taxonomy_everything = True
+        self._refresh_taxonomy()
+
+    def _refresh_taxonomy(self) -> None:
+        if self._taxonomy_task is None or self._taxonomy_task.done():
+            self._taxonomy_task = asyncio.create_task(self._update_taxonomy())
+
+    async def _update_taxonomy(self) -> None:
+        while self._taxonomy_everything or self._stale_tags or self._stale_categories:
+            everything, self._taxonomy_everything = self._taxonomy_everything, False
+            tag_ids, self._stale_tags = self._stale_tags, set()
+            category_ids, self._stale_categories = self._stale_categories, set()
+            try:
+                if everything:
+                    await taxonomy.rebuild(force=True)
+                else:
+                    await taxonomy.refresh(tag_ids=tag_ids, category_ids=category_ids)
+            except Exception as e:
+                logger.warning("Taxonomy update after invalidation failed: %r", e)
+
+    async def _listen(self) -> None:
+        delay = 1.0
+        first = True
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                self.connected = True
+                delay = 1.0
+                if not first:
+                    # Whatever was sent while disconnected is gone
+                    self.reconnects += 1
+                    self._forget_everything()
+                first = False
+                await lost.wait()
+                logger.warning("Invalidation bus connection lost")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Invalidation bus unavailable, retrying in %.0fs: %r", delay, e)
+                first = False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    try:
+                        await connection.close(timeout=2)
+                    except Exception:
+                        connection.terminate()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "connected": self.connected,
+            "received": self.received,
+            "overflows": self.overflows,
+            "reconnects": self.reconnects,
+        }
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._taxonomy_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = None
+        self._taxonomy_task = None
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,208 @@
+"""
+Brute-force protection for password login.
+
+Failed logins are counted per email and per client address. Past a number
+of free attempts each further failure locks that email (or address) for
+an exponentially growing time, LOGIN_BACKOFF_BASE * 2**n seconds up to
+LOGIN_BACKOFF_MAX; counters expire LOGIN_FAILURE_WINDOW seconds after the
+last failure, and a successful login clears the email's.
+
+The lock check comes before the user lookup and before any bcrypt work, so
+a locked-out attempt costs one Redis round trip. Password verification
+runs in a thread, at most LOGIN_HASH_CONCURRENCY at a time per worker;
+attempts that can't get a slot within LOGIN_HASH_QUEUE_TIMEOUT are turned
+away with 503, which bounds login CPU however hard the endpoint is hit.
+
+An unknown email does no hashing at all. It queues for a slot like a real
+verification, and is turned away with the same 503 when none frees up,
+then holds it as long as a verification currently takes (a moving average
+of the measured time) and fails the same way. Neither response times nor
+status codes tell registered addresses from unregistered ones.
+
+Counters and locks live in Redis (one Lua script per failure, one
+pipelined PTTL per check); while it is unreachable they're kept per
+worker.
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+
+from ..cache import cache_backend, redis_client, MODE_MEMORY
+from ..config import settings
+from ..utils.security.password import get_password_hash, verify_password
+
+logger = logging.getLogger(__name__)
+
+# KEYS: (failure counter, lock) per scope; ARGV: base, cap, window, then
+# the free attempts of each scope. Returns the longest lock set, in ms.
+FAILURE_SCRIPT = """
+local base, cap, window = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local longest = 0
+for i = 1, #KEYS, 2 do
+    local failures = redis.call('INCR', KEYS[i])
+    redis.call('EXPIRE', KEYS[i], window)
+    local over = failures - tonumber(ARGV[3 + (i + 1) / 2])
+    if over > 0 then
+        local lock = math.floor(math.min(cap, base * 2 ^ (over - 1)) * 1000)
+        redis.call('SET', KEYS[i + 1], 1, 'PX', lock)
+        if lock > longest then
+            longest = lock
+        end
+    end
+end
+return longest
+"""
+
+
+def _scopes(email: str, client_ip: Optional[str]) -> List[Tuple[str, int]]:
+    """(key suffix, free attempts) per scope; emails are hashed, not stored"""
+    digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+    scopes = [(f"email:{digest}", settings.LOGIN_EMAIL_FREE_ATTEMPTS)]
+    if client_ip:
+        scopes.append((f"ip:{client_ip}", settings.LOGIN_IP_FREE_ATTEMPTS))
+    return scopes
+
+
+class _LocalAttempts:
+    """FAILURE_SCRIPT's bookkeeping in a bounded in-process table"""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        # scope -> (failures, counter expiry, locked until), monotonic seconds
+        self._entries: "OrderedDict[str, Tuple[int, float, float]]" = OrderedDict()
+
+    def locked_for(self, scopes: Sequence[str]) -> float:
+        now = time.monotonic()
+        return max((self._entries.get(scope, (0, 0.0, 0.0))[2] - now for scope in scopes), default=0.0)
+
+    def fail(self, scopes: Sequence[Tuple[str, int]]) -> float:
+        now = time.monotonic()
+        longest = 0.0
+        for scope, free in scopes:
+            failures, expires, locked_until = self._entries.get(scope, (0, 0.0, 0.0))
+            failures = failures + 1 if expires > now else 1
+            over = failures - free
+            if over > 0:
+                lock = min(settings.LOGIN_BACKOFF_MAX, settings.LOGIN_BACKOFF_BASE * 2 ** (over - 1))
+                locked_until = now + lock
+                longest = max(longest, lock)
+            self._entries[scope] = (failures, now + settings.LOGIN_FAILURE_WINDOW, locked_until)
+            self._entries.move_to_end(scope)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+        return longest
+
+    def clear(self, scope: str) -> None:
+        self._entries.pop(scope, None)
+
+
+class LoginGuard:
+    def __init__(self, redis=redis_client, concurrency: int = settings.LOGIN_HASH_CONCURRENCY):
+        self.redis = redis
+        self.local = _LocalAttempts()
+        self._script = redis.register_script(FAILURE_SCRIPT)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._verify_time: Optional[float] = None
+        self._dummy_hash: Optional[str] = None
+
+    def _use_redis(self) -> bool:
+        return cache_backend.mode != MODE_MEMORY
+
+    async def check(self, email: str, client_ip: Optional[str]) -> None:
+        """Reject with 429 while the email or the client address is locked out"""
+        scopes = [scope for scope, _ in _scopes(email, client_ip)]
+        locked_for = 0.0
+        if self._use_redis():
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for scope in scopes:
+                        pipe.pttl(f"login:lock:{scope}")
+                    locked_for = max(await pipe.execute()) / 1000
+            except Exception as e:
+                logger.debug("Login lock check fell back to local state: %r", e)
+                locked_for = self.local.locked_for(scopes)
+        else:
+            locked_for = self.local.locked_for(scopes)
+        if locked_for > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many failed login attempts, try again later",
+                headers={"Retry-After": str(max(1, round(locked_for)))},
+            )
+
+    async def failed(self, email: str, client_ip: Optional[str]) -> None:
+        scopes = _scopes(email, client_ip)
+        if self._use_redis():
+            try:
+                keys = [key for scope, _ in scopes for key in (f"login:fail:{scope}", f"login:lock:{scope}")]
+                await self._script(keys=keys, args=[
+                    settings.LOGIN_BACKOFF_BASE, settings.LOGIN_BACKOFF_MAX, settings.LOGIN_FAILURE_WINDOW,
+                    *(free for _, free in scopes),
+                ])
+                return
+            except Exception as e:
+                logger.debug("Login failure recorded locally: %r", e)
+        self.local.fail(scopes)
+
+    async def succeeded(self, email: str) -> None:
+        # Only the email's counter: a valid login mustn't reset an address
+        # that is busy guessing other accounts
+        (scope, _), *_ = _scopes(email, None)
+        self.local.clear(scope)
+        if self._use_redis():
+            try:
+                await self.redis.delete(f"login:fail:{scope}", f"login:lock:{scope}")
+            except Exception as e:
+                logger.debug("Login failure counter not cleared: %r", e)
+
+    @asynccontextmanager
+    async def _slot(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), settings.LOGIN_HASH_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many logins in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _observe(self, elapsed: float) -> None:
+        self._verify_time = elapsed if self._verify_time is None else 0.9 * self._verify_time + 0.1 * elapsed
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        """bcrypt off the event loop, a bounded number at a time"""
+        async with self._slot():
+            started = time.perf_counter()
+            valid = await asyncio.to_thread(verify_password, password, password_hash)
+            self._observe(time.perf_counter() - started)
+        return valid
+
+    async def hash(self, password: str) -> str:
+        """bcrypt hashing, sharing verify()'s slots"""
+        async with self._slot():
+            return await asyncio.to_thread(get_password_hash, password)
+
+    async def imitate_verify(self) -> None:
+        """Queue, fail and take as long as verify() would, without hashing"""
+        if self._verify_time is None:
+            # Nothing measured yet in this worker: pay for one real verify
+            if self._dummy_hash is None:
+                self._dummy_hash = await asyncio.to_thread(get_password_hash, "login-timing-probe")
+            await self.verify("not-the-password", self._dummy_hash)
+            return
+        async with self._slot():
+            await asyncio.sleep(self._verify_time * random.uniform(0.9, 1.1))
+
+
+login_guard = LoginGuard()
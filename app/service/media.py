@@ -1,8 +1,10 @@
-from sqlalchemy import select
+import asyncio
+import logging
+from typing import Optional, Tuple
+from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 from ..models import Media, Post, User
-from ..schemas.media import MediaCreate
+from ..schemas.media import MediaCreate, MediaOut
 from fastapi import HTTPException, status, UploadFile
 import uuid
 import os
@@ -11,6 +13,15 @@ from datetime import datetime
 import cloudinary # Import cloudinary
 import cloudinary.uploader # Import uploader
 from ..config import settings # Import settings
+from .counters import bump_post_counter
+from .outbox import emit
+from ..utils.fieldsets import Resource, FieldSet
+from ..database.loader import get_loader
+from ..jobs.queue import job, job_queue
+
+logger = logging.getLogger(__name__)
+
+MEDIA = Resource(Media, MediaOut)
 
 # Configure Cloudinary using environment variables
 print(f"Cloudinary Config - cloud_name: {settings.CLOUD_NAME}, api_key: {settings.API_KEY}")
@@ -49,8 +60,10 @@ async def upload_to_cloudinary(file: UploadFile) -> dict:
             content = await file.read()
             buffer.write(content)
         
-        # Upload the temporary file to Cloudinary with folder parameter set to 'blog_api'
-        result = cloudinary.uploader.upload(
+        # Upload the temporary file to Cloudinary with folder parameter set to 'blog_api'.
+        # The response needs its URL, so this stays in the request, but off the event loop
+        result = await asyncio.to_thread(
+            cloudinary.uploader.upload,
             temp_file_path, 
             folder="blog_api",  # Store files in 'blog_api' folder
             resource_type="auto" # Automatically detect resource type (image, video, raw)
@@ -83,8 +96,8 @@ async def create_media(
     
     # Validate post_id if provided
     if post_id:
-        result = await db.execute(select(Post).where(Post.post_id == post_id))
-        post = result.scalar_one_or_none()
+        # Usually already loaded by the route's permission check
+        post = await get_loader(db).load(Post, post_id)
         if not post:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -93,8 +106,7 @@ async def create_media(
     
     # Validate user_id if provided
     if user_id:
-        result = await db.execute(select(User).where(User.user_id == user_id))
-        user = result.scalar_one_or_none()
+        user = await get_loader(db).load(User, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -114,17 +126,21 @@ async def create_media(
     )
     
     db.add(media)
+    if post_id:
+        await bump_post_counter(db, post_id, "media_count", 1)
+        await db.flush()
+        emit(db, "media.created", media.media_id, post_ids=[post_id])
     await db.commit()
     await db.refresh(media)
     return media
 
-async def get_media(db: AsyncSession, media_id: uuid.UUID) -> Media:
+async def get_media(db: AsyncSession, media_id: uuid.UUID, fieldset: FieldSet = None) -> Media:
     result = await db.execute(
         select(Media)
         .where(Media.media_id == media_id)
-        .options(joinedload(Media.post), joinedload(Media.user))
+        .options(*MEDIA.load_options(fieldset))
     )
-    media = result.unique().scalar_one_or_none()
+    media = result.scalar_one_or_none()
     if not media:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -137,9 +153,10 @@ async def get_media_list(
     skip: int = 0,
     limit: int = 100,
     post_id: uuid.UUID = None,
-    user_id: uuid.UUID = None
+    user_id: uuid.UUID = None,
+    fieldset: FieldSet = None
 ) -> list[Media]:
-    query = select(Media).options(joinedload(Media.post), joinedload(Media.user))
+    query = select(Media).options(*MEDIA.load_options(fieldset))
     
     if post_id:
         query = query.where(Media.post_id == post_id)
@@ -147,45 +164,61 @@ async def get_media_list(
         query = query.where(Media.user_id == user_id)
     
     result = await db.execute(query.offset(skip).limit(limit))
-    return result.unique().scalars().all()
+    return result.scalars().all()
+
+def cloudinary_asset(file_path: str) -> Optional[Tuple[str, str]]:
+    """(public_id, resource_type) of a Cloudinary URL, None for anything else"""
+    if "cloudinary.com" not in file_path:
+        return None
+    # Example URL: https://res.cloudinary.com/<cloud_name>/<resource_type>/upload/<version>/<folder>/<public_id>.<format>
+    parts = file_path.split('/')
+    if 'upload' not in parts:
+        return None
+    public_id = os.path.splitext(parts[-1])[0]
+    # Cloudinary public_id includes the folder path if it exists
+    folder_parts = parts[parts.index('upload') + 2:-1] # Get parts between 'upload' and the filename
+    full_public_id = "/".join(folder_parts + [public_id]) if folder_parts else public_id
+    # Determine resource type (needed for deletion of non-image/video types)
+    resource_type = parts[parts.index('upload') - 1]
+    return full_public_id, resource_type
+
+@job("media.destroy_asset")
+async def destroy_asset(public_id: str, resource_type: str) -> None:
+    result = await asyncio.to_thread(cloudinary.uploader.destroy, public_id, resource_type=resource_type)
+    # "not found": gone already, e.g. a repeated run
+    if result.get("result") not in ("ok", "not found"):
+        raise RuntimeError(f"Cloudinary destroy of {public_id} returned {result}")
+
+async def _destroy_assets_later(media_items) -> None:
+    for media in media_items:
+        asset = cloudinary_asset(media.file_path)
+        if asset:
+            await job_queue.enqueue(
+                "media.destroy_asset",
+                {"public_id": asset[0], "resource_type": asset[1]},
+                key=f"media.destroy:{media.media_id}",
+            )
 
 async def delete_media(db: AsyncSession, media_id: uuid.UUID):
     media = await get_media(db, media_id)
-    
-    # Delete from Cloudinary if it's a Cloudinary URL
-    if "cloudinary.com" in media.file_path:
-        try:
-            # Extract public_id from URL
-            # Example URL: https://res.cloudinary.com/<cloud_name>/<resource_type>/upload/<version>/<folder>/<public_id>.<format>
-            parts = media.file_path.split('/')
-            public_id_with_ext = parts[-1]
-            public_id = os.path.splitext(public_id_with_ext)[0]
-            
-            # Check if there's a folder structure in the URL
-            # Cloudinary public_id includes the folder path if it exists
-            folder_parts = parts[parts.index('upload') + 2:-1] # Get parts between 'upload' and the filename
-            full_public_id = "/".join(folder_parts + [public_id]) if folder_parts else public_id
-
-            # Determine resource type (needed for deletion of non-image/video types)
-            resource_type = parts[parts.index('upload') - 1] if 'upload' in parts else 'image' # Default to image
-
-            # Delete from Cloudinary
-            delete_result = cloudinary.uploader.destroy(full_public_id, resource_type=resource_type)
-            if delete_result.get("result") != "ok":
-                 print(f"Warning: Cloudinary deletion might have failed for public_id {full_public_id}. Result: {delete_result}")
-
-        except Exception as e:
-            # Log error but don't prevent DB deletion
-            print(f"Error deleting from Cloudinary (public_id likely '{full_public_id}'): {e}")
-            
-    # Delete file from filesystem (legacy cleanup, might not be needed if only Cloudinary is used)
-    # try:
-    #     if os.path.exists(media.file_path) and "cloudinary.com" not in media.file_path:
-    #         os.remove(media.file_path)
-    # except Exception as e:
-    #     print(f"Error deleting local file: {e}")
-    
-    # Delete from database
+
+    # Delete from database; the Cloudinary asset is destroyed in the background
     await db.delete(media)
+    if media.post_id:
+        await bump_post_counter(db, media.post_id, "media_count", -1)
+        emit(db, "media.deleted", media.media_id, post_ids=[media.post_id])
+    await db.commit()
+    await _destroy_assets_later([media])
+    return {"status": "success", "message": "Media deleted"}
+
+async def delete_user_media(db: AsyncSession, user_id: uuid.UUID, keep: uuid.UUID = None) -> int:
+    """Delete a user's own media (all but `keep`) in one statement; assets go in the background"""
+    query = delete(Media).where(Media.user_id == user_id)
+    if keep:
+        query = query.where(Media.media_id != keep)
+    # User media never belongs to a post (create_media refuses both), so no counters to fix
+    result = await db.execute(query.returning(Media.media_id, Media.file_path))
+    deleted = result.all()
     await db.commit()
-    return {"status": "success", "message": "Media deleted"}
\ No newline at end of file
+    await _destroy_assets_later(deleted)
+    return len(deleted)
@@ -0,0 +1,240 @@
+"""
+Transactional outbox: cache invalidation and change events.
+
+A write records what it changed in the ``outbox`` table, inside the
+transaction that makes the change, so the event exists exactly when the
+change committed:
+
+    emit(db, "post.updated", post_id, tag_ids=changed_tag_ids)
+    await db.commit()
+
+A relay in every API worker reads the table in batches of
+OUTBOX_BATCH_SIZE (FOR UPDATE SKIP LOCKED, so workers split the rows rather
+than wait on each other) and, per batch:
+
+1. purges the cached responses tagged with what changed (see
+   cache.decorator) and the batch-endpoint entities, in Redis and in this
+   worker's memory cache;
+2. appends the events to the ``events:outbox`` stream (about
+   OUTBOX_STREAM_MAXLEN kept) for consumers outside the API;
+3. deletes the rows and commits.
+
+Other workers' in-process state (memory-cache entries, taxonomy
+snapshots) is not the relay's business: the rows' NOTIFY reaches them
+through the invalidation bus, which also wakes the relays
+(service.invalidation_bus).
+
+A relay that dies between 2 and 3 publishes the batch again: delivery is
+at least once, and consumers must take repeats (purges do). While Redis is
+unreachable the rows wait and go out once it's back.
+
+Woken by the bus, a relay has a change out of the cache within a round
+trip or two of its commit; OUTBOX_POLL_INTERVAL only matters while the
+bus is down. That lets tagged endpoints keep responses for
+CACHE_LONG_EXPIRE. A read that started before the commit can still store
+what it read after the purge, so each batch is purged once more
+OUTBOX_REPURGE_DELAY seconds later. The same goes for workers answering
+tag and category reads from a taxonomy snapshot that they're still
+rebuilding.
+
+Topics are ``<kind>.<what happened>``. A change stales its aggregate
+(``<kind>:<id>``, its batch entity, the kind's collection endpoints) and
+the aggregates named in the payload's ``post_ids``, ``comment_ids``,
+``tag_ids`` and ``category_ids``, e.g. the post whose comment count a new
+comment changed. ``created``, ``updated`` and ``deleted`` are changes to
+the aggregate's own row; a tag or category gaining or losing posts is
+``posts_changed``.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..cache import cache_backend, entity_key, redis_client, tag_key, MODE_MEMORY
+from ..config import settings
+from ..database.session import AsyncSessionLocal
+from ..models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "events:outbox"
+
+# Kind of aggregate -> tag of the endpoints listing them
+COLLECTIONS: Dict[str, Optional[str]] = {
+    "post": "posts",
+    "tag": "tags",
+    "category": "categories",
+    "comment": None,
+    "media": None,
+    "user": "users",
+}
+# Kinds cached by the batch endpoints (EntityCache names)
+ENTITIES = {"post", "comment", "user"}
+# Payload lists of other aggregates a change stales
+RELATED = {"post_ids": "post", "comment_ids": "comment", "tag_ids": "tag", "category_ids": "category"}
+# Kinds served from the taxonomy snapshots
+TAXONOMY = {"tag", "category"}
+# Topics that change the aggregate's own row
+ROW_CHANGES = {"created", "updated", "deleted"}
+
+
+def emit(db: AsyncSession, topic: str, aggregate_id: UUID, **related: Iterable[UUID]) -> None:
+    """Add an event to the caller's transaction; it's published once committed"""
+    kind = topic.split(".", 1)[0]
+    if kind not in COLLECTIONS or set(related) - set(RELATED):
+        raise ValueError(f"Unknown outbox event: {topic} {sorted(related)}")
+    payload = {name: sorted({str(i) for i in ids}) for name, ids in related.items() if ids}
+    db.add(OutboxEvent(topic=topic, aggregate_id=aggregate_id, payload=payload))
+
+
+def references(topic: str, aggregate_id: Any, payload: dict) -> List[Tuple[str, Any]]:
+    """(kind, id) of every aggregate an event makes stale"""
+    refs = [(topic.split(".", 1)[0], aggregate_id)]
+    refs += [(RELATED[name], i) for name, ids in payload.items() if name in RELATED for i in ids]
+    return refs
+
+
+def invalidations(topic: str, aggregate_id: Any, payload: dict) -> Tuple[Set[str], Set[str]]:
+    """Tag set keys and entity keys an event makes stale"""
+    kind = topic.split(".", 1)[0]
+    refs = references(topic, aggregate_id, payload)
+    tags, keys = set(), set()
+    if COLLECTIONS.get(kind):
+        tags.add(tag_key(COLLECTIONS[kind]))
+    for ref_kind, ref_id in refs:
+        tags.add(tag_key(f"{ref_kind}:{ref_id}"))
+        if ref_kind in ENTITIES:
+            keys.add(entity_key(ref_kind, ref_id))
+    return tags, keys
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        redis=redis_client,
+        batch_size: int = settings.OUTBOX_BATCH_SIZE,
+        interval: float = settings.OUTBOX_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.redis = redis
+        self.batch_size = batch_size
+        self.interval = interval
+        self.published = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._tasks: List[asyncio.Task] = []
+        self._repurges: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+
+    async def _publish(self, rows: List[OutboxEvent], tags: List[str], keys: List[str]) -> None:
+        await cache_backend.purge(tags, keys)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                pipe.xadd(STREAM_KEY, {
+                    "topic": row.topic,
+                    "aggregate_id": str(row.aggregate_id),
+                    "payload": json.dumps(row.payload),
+                    "created_at": row.created_at.isoformat(),
+                }, maxlen=settings.OUTBOX_STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+
+    async def relay_once(self) -> int:
+        """Publish one batch; returns how many events it held"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(OutboxEvent)
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.scalars().all()
+            if not rows:
+                return 0
+            tags, keys = set(), set()
+            for row in rows:
+                event_tags, event_keys = invalidations(row.topic, row.aggregate_id, row.payload)
+                tags |= event_tags
+                keys |= event_keys
+            tags, keys = sorted(tags), sorted(keys)
+            # Rows are only deleted once published; an error here rolls back
+            # and they go out with the next attempt
+            await self._publish(rows, tags, keys)
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([row.id for row in rows])))
+            await db.commit()
+        self.published += len(rows)
+        self._repurge_later(tags, keys)
+        return len(rows)
+
+    def _repurge_later(self, tags: List[str], keys: List[str]) -> None:
+        task = asyncio.create_task(self._repurge(tags, keys))
+        self._repurges.add(task)
+        task.add_done_callback(self._repurges.discard)
+
+    async def _repurge(self, tags: List[str], keys: List[str]) -> None:
+        """Evict what reads racing the first purge stored"""
+        await asyncio.sleep(settings.OUTBOX_REPURGE_DELAY)
+        try:
+            await cache_backend.purge(tags, keys)
+        except Exception as e:
+            logger.debug("Outbox repurge failed: %r", e)
+
+    async def _run(self) -> None:
+        delay = self.interval
+        while True:
+            published = 0
+            # Wakes from now on mean rows this pass may not see
+            self._wake.clear()
+            # Without Redis nothing can be published: leave the rows for later
+            if cache_backend.mode != MODE_MEMORY:
+                try:
+                    published = await self.relay_once()
+                    delay = self.interval
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    self.last_error = repr(e)
+                    logger.warning("Outbox relay failed, retrying in %.1fs: %r", delay, e)
+                    delay = min(delay * 2, 30.0)
+            # A full batch means there is more waiting
+            if published < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def wake(self) -> None:
+        """Look for events now rather than at the next poll"""
+        self._wake.set()
+
+    async def stats(self) -> dict:
+        data = {"published": self.published, "failures": self.failures, "last_error": self.last_error}
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(func.count(), func.extract("epoch", func.now() - func.min(OutboxEvent.created_at)))
+                )
+                data["pending"], oldest = result.one()
+                data["oldest_pending_seconds"] = float(oldest) if oldest is not None else None
+        except Exception as e:
+            data["error"] = repr(e)
+        return data
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run())]
+
+    async def stop(self) -> None:
+        for task in [*self._tasks, *self._repurges]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._repurges, return_exceptions=True)
+        self._tasks = []
+        self._repurges.clear()
+
+
+outbox_relay = OutboxRelay()
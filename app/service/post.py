@@ -1,25 +1,38 @@
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload, joinedload
-from ..models import Post, Category, Tag
-from ..schemas import PostCreate, PostUpdate
+from ..models import Post, Category, Tag, post_categories, post_tags
+from ..schemas import PostCreate, PostUpdate, PostOut, UserOut, CategoryOut, TagOut
+from ..schemas.media import MediaOut
 from fastapi import HTTPException, status
 from uuid import UUID
 from datetime import datetime
+from typing import List
+from .counters import bump_tag_counts, bump_category_counts
+from .trending import trending
+from .related import schedule_related_refresh, get_related_posts
+from .taxonomy import taxonomy
+from .outbox import emit
+from ..utils.fieldsets import Resource, FieldSet
+from ..database.loader import get_loader
 
-async def get_post(db: AsyncSession, post_id: UUID):
-    result = await db.execute(
-        select(Post)
-        .where(Post.post_id == post_id)
-        .options(
-            selectinload(Post.author),
-            selectinload(Post.categories),
-            selectinload(Post.tags),
-            selectinload(Post.comments),
-            selectinload(Post.media)
+POSTS = Resource(Post, PostOut, relations={
+    "author": UserOut,
+    "categories": CategoryOut,
+    "tags": TagOut,
+    "media": MediaOut,
+})
+
+async def get_post(db: AsyncSession, post_id: UUID, fieldset: FieldSet = None):
+    if fieldset is None:
+        # Whole entity for internal callers: free if this request already loaded it
+        post = await get_loader(db).load(Post, post_id, POSTS.default_include)
+    else:
+        result = await db.execute(
+            select(Post)
+            .where(Post.post_id == post_id)
+            .options(*POSTS.load_options(fieldset))
         )
-    )
-    post = result.scalars().first()
+        post = result.scalars().first()
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -27,6 +40,15 @@ async def get_post(db: AsyncSession, post_id: UUID):
         )
     return post
 
+async def get_posts_by_ids(db: AsyncSession, post_ids: List[UUID], fieldset: FieldSet = None):
+    """Posts with these ids, in no particular order; unknown ids are skipped"""
+    result = await db.execute(
+        select(Post)
+        .where(Post.post_id.in_(post_ids))
+        .options(*POSTS.load_options(fieldset))
+    )
+    return result.scalars().all()
+
 async def get_posts(
     db: AsyncSession, 
     skip: int = 0, 
@@ -34,14 +56,10 @@ async def get_posts(
     published_only: bool = True,
     category_id: UUID = None,
     author_id: UUID = None,
-    tag_id: UUID = None
+    tag_id: UUID = None,
+    fieldset: FieldSet = None
 ):
-    query = select(Post).options(
-        selectinload(Post.author),
-        selectinload(Post.categories),
-        selectinload(Post.tags),
-        selectinload(Post.media)
-    )
+    query = select(Post).options(*POSTS.load_options(fieldset))
     
     if published_only:
         query = query.where(Post.is_published == True)
@@ -64,21 +82,70 @@ async def get_posts(
     result = await db.execute(query.offset(skip).limit(limit))
     return result.scalars().all()
 
-async def get_post_by_slug(db: AsyncSession, slug: str):
+async def get_popular_posts(
+    db: AsyncSession,
+    limit: int = 10,
+    published_only: bool = True,
+    fieldset: FieldSet = None
+):
+    """Most viewed posts, read from the flushed view_count column"""
+    query = select(Post).options(*POSTS.load_options(fieldset))
+    if published_only:
+        query = query.where(Post.is_published == True)
+    query = query.order_by(Post.view_count.desc(), Post.created_at.desc())
+    result = await db.execute(query.limit(limit))
+    return result.scalars().all()
+
+async def get_trending_posts(
+    db: AsyncSession,
+    limit: int = 10,
+    fieldset: FieldSet = None
+):
+    """Published posts ranked by the trending engine"""
+    # Over-fetch a little, drafts can collect views too but are filtered out here
+    ranked = await trending.top(limit * 2)
+    if not ranked:
+        return []
+    result = await db.execute(
+        select(Post)
+        .where(Post.post_id.in_([post_id for post_id, _ in ranked]), Post.is_published == True)
+        .options(*POSTS.load_options(fieldset))
+    )
+    posts = {post.post_id: post for post in result.scalars().all()}
+    return [posts[post_id] for post_id, _ in ranked if post_id in posts][:limit]
+
+async def get_post_by_slug(db: AsyncSession, slug: str, fieldset: FieldSet = None):
     result = await db.execute(
         select(Post)
         .where(Post.slug == slug)
-        .options(
-            selectinload(Post.author),
-            selectinload(Post.categories),
-            selectinload(Post.tags),
-            selectinload(Post.comments),
-            selectinload(Post.media)
-        )
+        .options(*POSTS.load_options(fieldset))
     )
     return result.scalars().first()
 
 
+async def _existing_ids(db: AsyncSession, column, ids, known) -> List[UUID]:
+    """
+    The requested ids that exist, in request order. The snapshot answers for
+    ids it knows; Postgres is only asked about the rest (e.g. created by
+    another process since the snapshot was built).
+    """
+    ids = list(dict.fromkeys(ids or []))
+    unknown = [i for i in ids if i not in known]
+    found = set()
+    if unknown:
+        result = await db.execute(select(column).where(column.in_(unknown)))
+        found = set(result.scalars().all())
+    return [i for i in ids if i in known or i in found]
+
+async def _link(db: AsyncSession, column, post_id: UUID, ids) -> None:
+    if ids:
+        await db.execute(insert(column.table), [{"post_id": post_id, column.key: i} for i in ids])
+
+async def _unlink(db: AsyncSession, column, post_id: UUID, ids) -> None:
+    if ids:
+        await db.execute(delete(column.table).where(column.table.c.post_id == post_id, column.in_(list(ids))))
+
+
 async def create_user_post(
     db: AsyncSession, 
     post: PostCreate, 
@@ -91,41 +158,26 @@ async def create_user_post(
         slug=slug
     )
     
-    # Add categories if provided
-    if post.category_ids:
-        for category_id in post.category_ids:
-            result = await db.execute(
-                select(Category).where(Category.category_id == category_id)
-            )
-            category = result.scalars().first()
-            if category:
-                db_post.categories.append(category)
-    
-    # Add tags if provided
-    if post.tag_ids:
-        for tag_id in post.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.tag_id == tag_id)
-            )
-            tag = result.scalars().first()
-            if tag:
-                db_post.tags.append(tag)
-    
     db.add(db_post)
+    await db.flush()
+    
+    # Link categories and tags that exist, validated against the taxonomy snapshot
+    snapshot = await taxonomy.get()
+    category_ids = await _existing_ids(db, Category.category_id, post.category_ids, snapshot.categories_by_id)
+    tag_ids = await _existing_ids(db, Tag.tag_id, post.tag_ids, snapshot.tags_by_id)
+    await _link(db, post_categories.c.category_id, db_post.post_id, category_ids)
+    await _link(db, post_tags.c.tag_id, db_post.post_id, tag_ids)
+    await bump_category_counts(db, category_ids, 1)
+    await bump_tag_counts(db, tag_ids, 1)
+    emit(db, "post.created", db_post.post_id, tag_ids=tag_ids, category_ids=category_ids)
     await db.commit()
+
+    if db_post.is_published:
+        await trending.record_publish(db_post.post_id)
+        await schedule_related_refresh(db_post.post_id)
     
     # Reload the post with all relationships
-    result = await db.execute(
-        select(Post)
-        .where(Post.post_id == db_post.post_id)
-        .options(
-            joinedload(Post.author),
-            joinedload(Post.categories),
-            joinedload(Post.tags),
-            joinedload(Post.media)
-        )
-    )
-    return result.unique().scalar_one()
+    return await get_loader(db).reload(Post, db_post.post_id, POSTS.default_include)
 
 async def update_post(
     db: AsyncSession, 
@@ -137,59 +189,57 @@ async def update_post(
     update_data = post.model_dump(exclude_unset=True, exclude={"category_ids", "tag_ids"})
     
     # Auto-set published_at if publishing
+    newly_published = bool(update_data.get('is_published')) and not db_post.is_published
     if update_data.get('is_published') and not db_post.published_at:
         update_data['published_at'] = datetime.utcnow()
     
     for field, value in update_data.items():
         setattr(db_post, field, value)
     
-    # Update categories if provided
-    if hasattr(post, "category_ids") and post.category_ids is not None:
-        # Clear existing categories
-        db_post.categories = []
-        
-        # Add new categories
-        for category_id in post.category_ids:
-            result = await db.execute(
-                select(Category).where(Category.category_id == category_id)
-            )
-            category = result.scalars().first()
-            if category:
-                db_post.categories.append(category)
-
-    # Update tags if provided
-    if hasattr(post, "tag_ids") and post.tag_ids is not None:
-        # Clear existing tags
-        db_post.tags = []
-        
-        # Add new tags
-        for tag_id in post.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.tag_id == tag_id)
-            )
-            tag = result.scalars().first()
-            if tag:
-                db_post.tags.append(tag)
+    # Relink categories and tags if provided, only touching the rows that change
+    snapshot = await taxonomy.get()
+    relinked_category_ids, relinked_tag_ids = set(), set()
+    if post.category_ids is not None:
+        old_category_ids = {c.category_id for c in db_post.categories}
+        new_category_ids = set(await _existing_ids(db, Category.category_id, post.category_ids, snapshot.categories_by_id))
+        await _unlink(db, post_categories.c.category_id, post_id, old_category_ids - new_category_ids)
+        await _link(db, post_categories.c.category_id, post_id, new_category_ids - old_category_ids)
+        await bump_category_counts(db, new_category_ids - old_category_ids, 1)
+        await bump_category_counts(db, old_category_ids - new_category_ids, -1)
+        relinked_category_ids = old_category_ids ^ new_category_ids
+
+    if post.tag_ids is not None:
+        old_tag_ids = {t.tag_id for t in db_post.tags}
+        new_tag_ids = set(await _existing_ids(db, Tag.tag_id, post.tag_ids, snapshot.tags_by_id))
+        await _unlink(db, post_tags.c.tag_id, post_id, old_tag_ids - new_tag_ids)
+        await _link(db, post_tags.c.tag_id, post_id, new_tag_ids - old_tag_ids)
+        await bump_tag_counts(db, new_tag_ids - old_tag_ids, 1)
+        await bump_tag_counts(db, old_tag_ids - new_tag_ids, -1)
+        relinked_tag_ids = old_tag_ids ^ new_tag_ids
     
+    emit(db, "post.updated", post_id, tag_ids=relinked_tag_ids, category_ids=relinked_category_ids)
     await db.commit()
+
+    if newly_published:
+        await trending.record_publish(post_id)
+    elif update_data.get('is_published') is False:
+        await trending.remove(post_id)
+    if 'is_published' in update_data or post.category_ids is not None or post.tag_ids is not None:
+        await schedule_related_refresh(post_id)
     
     # Reload the post with all relationships
-    result = await db.execute(
-        select(Post)
-        .where(Post.post_id == post_id)
-        .options(
-            joinedload(Post.author),
-            joinedload(Post.categories),
-            joinedload(Post.tags),
-            joinedload(Post.media)
-        )
-    )
-    return result.unique().scalar_one()
+    return await get_loader(db).reload(Post, post_id, POSTS.default_include)
 
 async def delete_post(db: AsyncSession, post_id: UUID):
     db_post = await get_post(db, post_id)
+    category_ids = {c.category_id for c in db_post.categories}
+    tag_ids = {t.tag_id for t in db_post.tags}
+    await bump_category_counts(db, category_ids, -1)
+    await bump_tag_counts(db, tag_ids, -1)
+    emit(db, "post.deleted", post_id, tag_ids=tag_ids, category_ids=category_ids)
     await db.delete(db_post)
     await db.commit()
+    await trending.remove(post_id)
     return {"status": "success", "message": "Post deleted"}
 
 async def get_posts_by_category(
@@ -197,7 +247,8 @@ async def get_posts_by_category(
     category_id: UUID,
     skip: int = 0,
     limit: int = 100,
-    published_only: bool = True
+    published_only: bool = True,
+    fieldset: FieldSet = None
 ):
     """Get all posts in a specific category"""
     return await get_posts(
@@ -205,5 +256,6 @@ async def get_posts_by_category(
         skip=skip,
         limit=limit,
         published_only=published_only,
-        category_id=category_id
+        category_id=category_id,
+        fieldset=fieldset
     )
@@ -0,0 +1,155 @@
+"""
+Refresh-token rotation with reuse detection.
+
+Every login starts a token family. Each refresh token names its family
+(``fam``) and carries its own id (``jti``), and Redis holds:
+
+- ``auth:refresh:<jti>``: the family the token was issued in, kept until
+  the token would expire, so a spent token is still recognised;
+- ``auth:family:<family>``: the one jti in the family that may still be
+  used (its head).
+
+/auth/refresh presents the head and gets a new pair, and the new refresh
+token becomes the head, all in one Lua script, so two concurrent refreshes
+with the same token can't both succeed. Presenting a token that is not
+the head means it was used already. Its copy has leaked, so the family is
+deleted, and whoever holds the current head (user or attacker) is signed
+out with it. Logging out deletes the family. Signing out everywhere bumps
+the user's revocation epoch, which retires access and refresh tokens
+alike (see utils.security.revocation).
+
+Rotation needs Redis: without it /auth/refresh answers 503 rather than
+accept tokens it can't check. Logging in still works. Its refresh token is
+simply refused later, if the family could not be recorded.
+"""
+import logging
+import uuid
+
+from fastapi import HTTPException, status
+
+from ..cache import redis_client
+from ..config import settings
+from ..utils.security.jwt import TokenPayload, create_access_token, create_refresh_token
+from ..utils.security.revocation import revocation_epochs
+
+logger = logging.getLogger(__name__)
+
+ROTATED = "rotated"
+REUSED = "reused"
+REVOKED = "revoked"
+
+# KEYS: presented token, family, new token; ARGV: presented jti, new jti,
+# family, ttl
+ROTATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[3] then
+    return 'revoked'
+end
+local head = redis.call('GET', KEYS[2])
+if not head then
+    return 'revoked'
+end
+if head ~= ARGV[1] then
+    redis.call('DEL', KEYS[2])
+    return 'reused'
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[4])
+redis.call('SET', KEYS[3], ARGV[3], 'EX', ARGV[4])
+return 'rotated'
+"""
+
+
+def token_key(jti: str) -> str:
+    return f"auth:refresh:{jti}"
+
+
+def family_key(family: str) -> str:
+    return f"auth:family:{family}"
+
+
+class RefreshTokenStore:
+    def __init__(self, redis=redis_client, ttl: int = settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400):
+        self.redis = redis
+        self.ttl = ttl
+        self._rotate = redis.register_script(ROTATE_SCRIPT)
+
+    def _pair(self, user_id: str, epoch: int, jti: str, family: str) -> dict:
+        return {
+            "access_token": create_access_token(user_id=user_id, epoch=epoch),
+            "refresh_token": create_refresh_token(user_id=user_id, epoch=epoch, jti=jti, family=family),
+            "token_type": "bearer",
+        }
+
+    async def issue(self, user_id: str) -> dict:
+        """Tokens for a fresh login, starting a new family"""
+        epoch = await revocation_epochs.current(user_id)
+        jti, family = uuid.uuid4().hex, uuid.uuid4().hex
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.set(token_key(jti), family, ex=self.ttl)
+                pipe.set(family_key(family), jti, ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Refresh token family not recorded, refresh will require a new login: %r", e)
+        return self._pair(user_id, epoch, jti, family)
+
+    async def rotate(self, payload: TokenPayload) -> dict:
+        """Spend a verified refresh token for a new pair in the same family"""
+        if not payload.jti or not payload.fam:
+            # Issued before rotation existed; nothing to check it against
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token no longer accepted, please log in again",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        # verify_token compared the epoch with this worker's cached copy,
+        # which may not know yet of a logout-everywhere; the new pair would
+        # carry the new epoch and outlive it
+        epoch = await revocation_epochs.current(payload.sub)
+        if payload.epc < epoch:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token revoked, please log in again",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        jti = uuid.uuid4().hex
+        try:
+            outcome = await self._rotate(
+                keys=[token_key(payload.jti), family_key(payload.fam), token_key(jti)],
+                args=[payload.jti, jti, payload.fam, self.ttl],
+            )
+        except Exception as e:
+            logger.warning("Refresh token rotation unavailable: %r", e)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Token refresh temporarily unavailable",
+                headers={"Retry-After": "5"},
+            )
+        if outcome == REUSED:
+            logger.warning("Refresh token reuse for user %s, family %s revoked", payload.sub, payload.fam)
+        if outcome != ROTATED:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token revoked, please log in again",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return self._pair(payload.sub, epoch, jti, payload.fam)
+
+    async def revoke_family(self, payload: TokenPayload) -> None:
+        """Log out the session the refresh token belongs to"""
+        if not payload.fam:
+            return
+        try:
+            await self.redis.delete(family_key(payload.fam))
+        except Exception as e:
+            logger.warning("Refresh token family not revoked: %r", e)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Could not log out, try again",
+            )
+
+    async def revoke_user(self, user_id: str) -> int:
+        """Log out every session of the user: access and refresh tokens"""
+        return await revocation_epochs.bump(user_id)
+
+
+refresh_tokens = RefreshTokenStore()
@@ -0,0 +1,275 @@
+"""
+Related posts, precomputed from tag and category overlap.
+
+Similarity is weighted Jaccard over each post's features (its tags and
+categories, weighted by RELATED_TAG_WEIGHT / RELATED_CATEGORY_WEIGHT):
+
+    J(A, B) = W(A ∩ B) / (W(A) + W(B) - W(A ∩ B))
+
+Intersections are computed sparsely through an inverted index: for a post
+A we only walk the posting lists of A's own features, so posts sharing
+nothing with A are never touched. Features attached to more than
+RELATED_MAX_FEATURE_POSTS posts are too common to say anything and are
+skipped when generating candidates (they still count in W(A) and W(B)).
+
+The top RELATED_POSTS_K results per post are stored in ``related_posts``.
+``rebuild_related_posts`` recomputes everything (app/jobs/related_posts.py);
+``refresh_related_for_post`` updates one post's list and merges it into
+its neighbours' lists after its tags or categories change (queued as the
+``related.refresh`` background job). A neighbour
+whose stored entry for the post got worse keeps a possibly incomplete list
+until the next full rebuild.
+"""
+import heapq
+import logging
+from collections import defaultdict
+from operator import itemgetter
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, delete, insert, tuple_, or_, union, func, cast, bindparam, any_
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..jobs.queue import job, job_queue
+from ..models import Post, Tag, Category, RelatedPost, post_tags, post_categories
+
+logger = logging.getLogger(__name__)
+
+Feature = Tuple[str, UUID]
+
+
+class FeatureIndex:
+    """Post -> weighted features, plus the inverted feature -> posts index"""
+
+    def __init__(self, max_postings: int = settings.RELATED_MAX_FEATURE_POSTS):
+        self.max_postings = max_postings
+        self.features: Dict[Hashable, Dict[Feature, float]] = defaultdict(dict)
+        self.postings: Dict[Feature, List[Hashable]] = defaultdict(list)
+        self.totals: Dict[Hashable, float] = defaultdict(float)
+
+    def add(self, post_id: Hashable, feature: Feature, weight: float) -> None:
+        if feature in self.features[post_id]:
+            return
+        self.features[post_id][feature] = weight
+        self.postings[feature].append(post_id)
+        self.totals[post_id] += weight
+
+    def intersections(self, post_id: Hashable) -> Dict[Hashable, float]:
+        shared: Dict[Hashable, float] = defaultdict(float)
+        for feature, weight in self.features.get(post_id, {}).items():
+            posting = self.postings[feature]
+            if len(posting) > self.max_postings:
+                continue
+            for other in posting:
+                shared[other] += weight
+        shared.pop(post_id, None)
+        return shared
+
+    def similar(self, post_id: Hashable, k: int) -> List[Tuple[Hashable, float]]:
+        total = self.totals.get(post_id, 0.0)
+        totals = self.totals
+        scored = (
+            (other, inter / (total + totals[other] - inter))
+            for other, inter in self.intersections(post_id).items()
+        )
+        return heapq.nlargest(k, scored, key=itemgetter(1))
+
+
+def _uuid_array(name: str, values):
+    """One array parameter, however many ids: asyncpg takes at most 32767 per statement"""
+    return cast(bindparam(name, list(values)), ARRAY(PG_UUID(as_uuid=True)))
+
+
+def _feature_weight(kind: str) -> float:
+    return settings.RELATED_TAG_WEIGHT if kind == "t" else settings.RELATED_CATEGORY_WEIGHT
+
+
+async def _load_features(db: AsyncSession, post_filter=None) -> Iterable[Tuple[UUID, str, UUID]]:
+    """(post_id, kind, feature_id) rows for published posts"""
+    rows = []
+    for kind, table, column in (
+        ("t", post_tags, post_tags.c.tag_id),
+        ("c", post_categories, post_categories.c.category_id),
+    ):
+        query = (
+            select(table.c.post_id, column)
+            .join(Post, Post.post_id == table.c.post_id)
+            .where(Post.is_published == True)
+        )
+        if post_filter is not None:
+            query = query.where(post_filter(table))
+        result = await db.execute(query)
+        rows.extend((post_id, kind, feature_id) for post_id, feature_id in result.all())
+    return rows
+
+
+async def _replace_lists(db: AsyncSession, lists: Dict[UUID, List[Tuple[UUID, float]]]) -> None:
+    if not lists:
+        return
+    await db.execute(delete(RelatedPost).where(RelatedPost.post_id.in_(list(lists))))
+    rows = [
+        {"post_id": post_id, "related_post_id": other, "score": score}
+        for post_id, related in lists.items()
+        for other, score in related
+    ]
+    if rows:
+        await db.execute(insert(RelatedPost), rows)
+
+
+async def rebuild_related_posts(
+    db: AsyncSession,
+    k: int = settings.RELATED_POSTS_K,
+    batch_size: int = 500
+) -> int:
+    """Recompute every published post's related list, returns the number of posts processed"""
+    index = FeatureIndex()
+    for post_id, kind, feature_id in await _load_features(db):
+        index.add(post_id, (kind, feature_id), _feature_weight(kind))
+
+    post_ids = list(index.features)
+    # Posts that are no longer published (or lost all features) keep no
+    # list; an anti-join against the tables, not one parameter per post
+    featured = union(*(
+        select(table.c.post_id)
+        .join(Post, Post.post_id == table.c.post_id)
+        .where(Post.is_published == True)
+        for table in (post_tags, post_categories)
+    ))
+    await db.execute(delete(RelatedPost).where(RelatedPost.post_id.notin_(featured)))
+    await db.commit()
+
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start:start + batch_size]
+        await _replace_lists(db, {post_id: index.similar(post_id, k) for post_id in batch})
+        await db.commit()
+    return len(post_ids)
+
+
+async def refresh_related_for_post(
+    db: AsyncSession,
+    post_id: UUID,
+    k: int = settings.RELATED_POSTS_K
+) -> None:
+    """Recompute one post's list and merge its new scores into its neighbours' lists"""
+    own = await _load_features(db, lambda table: table.c.post_id == post_id)
+    if not own:
+        # Unpublished or untagged: it has no list and appears in none
+        await db.execute(
+            delete(RelatedPost).where(
+                or_(RelatedPost.post_id == post_id, RelatedPost.related_post_id == post_id)
+            )
+        )
+        await db.commit()
+        return
+
+    # Only walk features that are selective enough, using the maintained counters
+    tag_ids = [fid for _, kind, fid in own if kind == "t"]
+    category_ids = [fid for _, kind, fid in own if kind == "c"]
+    usable_tags = (await db.execute(
+        select(Tag.tag_id).where(Tag.tag_id.in_(tag_ids), Tag.post_count <= settings.RELATED_MAX_FEATURE_POSTS)
+    )).scalars().all() if tag_ids else []
+    usable_categories = (await db.execute(
+        select(Category.category_id).where(
+            Category.category_id.in_(category_ids),
+            Category.post_count <= settings.RELATED_MAX_FEATURE_POSTS
+        )
+    )).scalars().all() if category_ids else []
+
+    # Candidates: published posts sharing a usable feature; load all their features for W(B)
+    candidate_ids: Set[UUID] = set()
+    for table, column, ids in (
+        (post_tags, post_tags.c.tag_id, usable_tags),
+        (post_categories, post_categories.c.category_id, usable_categories),
+    ):
+        if ids:
+            result = await db.execute(select(table.c.post_id).where(column.in_(ids)).distinct())
+            candidate_ids.update(result.scalars().all())
+    candidate_ids.discard(post_id)
+
+    index = FeatureIndex(max_postings=float("inf"))
+    for pid, kind, feature_id in own:
+        index.add(pid, (kind, feature_id), _feature_weight(kind))
+    if candidate_ids:
+        for pid, kind, feature_id in await _load_features(
+            db, lambda table: table.c.post_id == any_(_uuid_array("candidate_ids", candidate_ids))
+        ):
+            index.add(pid, (kind, feature_id), _feature_weight(kind))
+    # Features the counters marked as too common are not used for scoring either
+    usable = {("t", fid) for fid in usable_tags} | {("c", fid) for fid in usable_categories}
+    for feature in list(index.postings):
+        if feature not in usable:
+            index.postings[feature] = []
+
+    scores = dict(index.similar(post_id, len(index.features)))
+    await _replace_lists(db, {post_id: heapq.nlargest(k, scores.items(), key=itemgetter(1))})
+
+    # Merge into neighbours: drop the old entry for this post everywhere, re-add where it ranks
+    await db.execute(delete(RelatedPost).where(RelatedPost.related_post_id == post_id))
+    if scores:
+        result = await db.execute(
+            select(RelatedPost.post_id, RelatedPost.related_post_id, RelatedPost.score)
+            .where(RelatedPost.post_id == any_(_uuid_array("neighbour_ids", scores)))
+        )
+        current: Dict[UUID, List[Tuple[UUID, float]]] = defaultdict(list)
+        for owner, other, score in result.all():
+            current[owner].append((other, score))
+
+        evicted, added = [], []
+        for owner, score in scores.items():
+            entries = current.get(owner, [])
+            if len(entries) < k:
+                added.append({"post_id": owner, "related_post_id": post_id, "score": score})
+                continue
+            weakest = min(entries, key=itemgetter(1))
+            if score > weakest[1]:
+                evicted.append((owner, weakest[0]))
+                added.append({"post_id": owner, "related_post_id": post_id, "score": score})
+        if evicted:
+            pairs = func.unnest(
+                _uuid_array("evicted_post_ids", [owner for owner, _ in evicted]),
+                _uuid_array("evicted_related_ids", [other for _, other in evicted]),
+            ).table_valued("post_id", "related_post_id").render_derived(name="evicted")
+            await db.execute(
+                delete(RelatedPost).where(
+                    tuple_(RelatedPost.post_id, RelatedPost.related_post_id).in_(
+                        select(pairs.c.post_id, pairs.c.related_post_id)
+                    )
+                )
+            )
+        if added:
+            await db.execute(insert(RelatedPost), added)
+    await db.commit()
+
+
+async def get_related_posts(
+    db: AsyncSession,
+    post_id: UUID,
+    limit: int = settings.RELATED_POSTS_K
+):
+    """Stored related posts for a post, one indexed read joined to the posts"""
+    result = await db.execute(
+        select(
+            Post.post_id, Post.title, Post.slug, Post.summary,
+            Post.published_at, RelatedPost.score
+        )
+        .join(RelatedPost, RelatedPost.related_post_id == Post.post_id)
+        .where(RelatedPost.post_id == post_id)
+        .order_by(RelatedPost.score.desc())
+        .limit(limit)
+    )
+    return [row._asdict() for row in result.all()]
+
+
+@job("related.refresh", release_key_on_start=True)
+async def refresh_related_job(post_id: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await refresh_related_for_post(db, UUID(post_id))
+
+
+async def schedule_related_refresh(post_id: UUID) -> None:
+    """Refresh a post's related lists in the background, after the request's commit"""
+    # Refreshes queued for the same post before one starts collapse into it
+    await job_queue.enqueue("related.refresh", {"post_id": str(post_id)}, key=f"related.refresh:{post_id}")
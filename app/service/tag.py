@@ -1,21 +1,28 @@
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, exists, func, cast, bindparam, any_
+from sqlalchemy.dialects.postgresql import insert, ARRAY, UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from ..models import Tag, Post
+from ..models import Tag, Post, post_tags
 from ..schemas import TagCreate, TagUpdate, TagOut
+from ..schemas.tag import BulkTagging, BulkTaggingResult
 from fastapi import HTTPException, status
 from uuid import UUID
 from datetime import datetime
+from typing import Dict, List
+from collections import Counter
 from slugify import slugify
+from .counters import bump_tag_counts, apply_tag_count_deltas
+from .related import schedule_related_refresh
+from .taxonomy import taxonomy
+from .outbox import emit
+from ..utils.fieldsets import Resource
+from ..database.loader import get_loader
 
+TAGS = Resource(Tag, TagOut)
 
-async def get_tag(db: AsyncSession, tag_id: UUID) -> Tag:
-    result = await db.execute(
-        select(Tag)
-        .where(Tag.tag_id == tag_id)
-        .options(selectinload(Tag.posts))
-    )
-    tag = result.scalars().first()
+
+async def _load_tag(db: AsyncSession, tag_id: UUID) -> Tag:
+    """The Tag row itself, for writes"""
+    tag = await get_loader(db).load(Tag, tag_id)
     if not tag:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -23,18 +30,26 @@ async def get_tag(db: AsyncSession, tag_id: UUID) -> Tag:
         )
     return tag
 
-async def get_tag_by_slug(db: AsyncSession, slug: str) -> Tag:
-    result = await db.execute(
-        select(Tag)
-        .where(Tag.slug == slug)
-        .options(selectinload(Tag.posts))
-    )
-    tag = result.scalars().first()
+async def get_tag(db: AsyncSession, tag_id: UUID) -> TagOut:
+    snapshot = await taxonomy.get()
+    tag = snapshot.tags_by_id.get(tag_id)
     if not tag:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tag not found"
-        )
+        # Possibly created by another process since the snapshot was built
+        tag = TagOut.model_validate(await _load_tag(db, tag_id))
+    return tag
+
+async def get_tag_by_slug(db: AsyncSession, slug: str) -> TagOut:
+    snapshot = await taxonomy.get()
+    tag = snapshot.tags_by_slug.get(slug)
+    if not tag:
+        result = await db.execute(select(Tag).where(Tag.slug == slug))
+        row = result.scalars().first()
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Tag not found"
+            )
+        tag = TagOut.model_validate(row)
     return tag
 
 async def get_tags(
@@ -42,13 +57,13 @@ async def get_tags(
     skip: int = 0, 
     limit: int = 100
 ):
-    result = await db.execute(
-        select(Tag)
-        .options(selectinload(Tag.posts))
-        .offset(skip)
-        .limit(limit)
-    )
-    return result.scalars().all()
+    snapshot = await taxonomy.get()
+    return list(snapshot.tags[skip:skip + limit])
+
+async def autocomplete_tags(q: str, limit: int = 10) -> List[TagOut]:
+    """Tags whose name, slug or a word of the name starts with `q`, most used first"""
+    snapshot = await taxonomy.get()
+    return snapshot.tag_index.search(q, limit)
 
 async def create_tag(db: AsyncSession, tag: TagCreate) -> Tag:
     # Check if tag with same name or slug already exists
@@ -80,12 +95,15 @@ async def create_tag(db: AsyncSession, tag: TagCreate) -> Tag:
     )
     
     db.add(db_tag)
+    await db.flush()
+    emit(db, "tag.created", db_tag.tag_id)
     await db.commit()
     await db.refresh(db_tag)
+    await taxonomy.invalidate(tag_ids=[db_tag.tag_id])
     return db_tag
 
 async def update_tag(db: AsyncSession, tag_id: UUID, tag: TagUpdate) -> Tag:
-    db_tag = await get_tag(db, tag_id)
+    db_tag = await _load_tag(db, tag_id)
     
     update_data = tag.model_dump(exclude_unset=True)
     
@@ -97,38 +115,63 @@ async def update_tag(db: AsyncSession, tag_id: UUID, tag: TagUpdate) -> Tag:
         setattr(db_tag, field, value)
     
     db_tag.updated_at = datetime.utcnow()
+    emit(db, "tag.updated", tag_id)
     await db.commit()
     await db.refresh(db_tag)
+    await taxonomy.invalidate(tag_ids=[tag_id])
     return db_tag
 
 async def delete_tag(db: AsyncSession, tag_id: UUID) -> None:
-    db_tag = await get_tag(db, tag_id)
-    await db.delete(db_tag)
+    await _load_tag(db, tag_id)
+    # Bulk statements, so the ORM never loads the tag's posts to unlink them
+    await db.execute(delete(post_tags).where(post_tags.c.tag_id == tag_id))
+    await db.execute(delete(Tag).where(Tag.tag_id == tag_id))
+    emit(db, "tag.deleted", tag_id)
     await db.commit()
+    await taxonomy.invalidate(tag_ids=[tag_id])
+
+async def is_post_tagged(db: AsyncSession, tag_id: UUID, post_id: UUID) -> bool:
+    """Membership check on the post_tags primary key"""
+    result = await db.execute(
+        select(
+            exists().where(post_tags.c.post_id == post_id, post_tags.c.tag_id == tag_id)
+        )
+    )
+    return result.scalar()
+
+async def _check_post_exists(db: AsyncSession, post_id: UUID) -> None:
+    if await get_loader(db).load(Post, post_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
 
 async def add_post_to_tag(
     db: AsyncSession,
     tag_id: UUID,
     post_id: UUID
 ):
-    # Check if tag exists and load its posts
-    tag = await get_tag(db, tag_id)
+    # Check that tag and post exist, without loading either's collections
+    await get_tag(db, tag_id)
+    await _check_post_exists(db, post_id)
     
-    # Check if post exists
-    from ..service.post import get_post
-    post = await get_post(db, post_id)
-    
-    # Check if relationship already exists
-    if post in tag.posts:
+    # Insert the link; nothing comes back if it already existed
+    result = await db.execute(
+        insert(post_tags)
+        .values(post_id=post_id, tag_id=tag_id)
+        .on_conflict_do_nothing()
+        .returning(post_tags.c.post_id)
+    )
+    if result.first() is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Post is already tagged with this tag"
         )
     
-    # Add relationship
-    tag.posts.append(post)
+    await bump_tag_counts(db, [tag_id], 1)
+    emit(db, "tag.posts_changed", tag_id, post_ids=[post_id])
     await db.commit()
-    await db.refresh(tag)
+    await schedule_related_refresh(post_id)
     return {"status": "success", "message": "Post added to tag"}
 
 async def remove_post_from_tag(
@@ -136,22 +179,131 @@ async def remove_post_from_tag(
     tag_id: UUID,
     post_id: UUID
 ):
-    # Check if tag exists and load its posts
-    tag = await get_tag(db, tag_id)
-    
-    # Check if post exists
-    from ..service.post import get_post
-    post = await get_post(db, post_id)
+    # Check that tag and post exist, without loading either's collections
+    await get_tag(db, tag_id)
+    await _check_post_exists(db, post_id)
     
-    # Check if relationship exists
-    if post not in tag.posts:
+    # Delete the link; nothing comes back if there was none
+    result = await db.execute(
+        delete(post_tags)
+        .where(post_tags.c.post_id == post_id, post_tags.c.tag_id == tag_id)
+        .returning(post_tags.c.post_id)
+    )
+    if result.first() is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Post is not tagged with this tag"
         )
     
-    # Remove relationship
-    tag.posts.remove(post)
+    await bump_tag_counts(db, [tag_id], -1)
+    emit(db, "tag.posts_changed", tag_id, post_ids=[post_id])
     await db.commit()
-    await db.refresh(tag)
+    await schedule_related_refresh(post_id)
     return {"status": "success", "message": "Post removed from tag"}
+
+def _uuid_array(name: str, values):
+    return cast(bindparam(name, list(values)), ARRAY(PG_UUID(as_uuid=True)))
+
+async def bulk_tag_posts(db: AsyncSession, request: BulkTagging, user) -> BulkTaggingResult:
+    """
+    Tag many posts by tag name in one transaction.
+
+    Missing tags are created with one INSERT ... ON CONFLICT (slug) DO
+    NOTHING. The wanted (post_id, tag_id) pairs are then passed as two
+    arrays and the diff against post_tags happens in Postgres: an
+    INSERT ... SELECT FROM unnest ON CONFLICT DO NOTHING for new links and,
+    when replacing, a DELETE of the batch's links not among the wanted
+    ones. Both return the rows they touched, which drive the counters.
+    """
+    # Post -> slugs; the first spelling of a name decides the new tag's name
+    wanted: Dict[UUID, set] = {}
+    names: Dict[str, str] = {}
+    for item in request.posts:
+        slugs = wanted.setdefault(item.post_id, set())
+        for name in item.tags:
+            name = name.strip()
+            slug = slugify(name)
+            if not slug:
+                continue
+            names.setdefault(slug, name)
+            slugs.add(slug)
+
+    result = await db.execute(
+        select(Post.post_id, Post.author_id).where(Post.post_id.in_(list(wanted)))
+    )
+    authors = dict(result.all())
+    if not user.is_superuser and any(author != user.user_id for author in authors.values()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    missing = [post_id for post_id in wanted if post_id not in authors]
+    post_ids = [post_id for post_id in wanted if post_id in authors]
+
+    created = []
+    tag_ids: Dict[str, UUID] = {}
+    if names:
+        result = await db.execute(
+            insert(Tag)
+            .values([{"name": name, "slug": slug} for slug, name in names.items()])
+            .on_conflict_do_nothing(index_elements=[Tag.slug])
+            .returning(Tag)
+        )
+        created = result.scalars().all()
+        result = await db.execute(select(Tag.slug, Tag.tag_id).where(Tag.slug.in_(list(names))))
+        tag_ids = dict(result.all())
+
+    pairs = [(post_id, tag_ids[slug]) for post_id in post_ids for slug in wanted[post_id]]
+    desired = func.unnest(
+        _uuid_array("post_ids", [post_id for post_id, _ in pairs]),
+        _uuid_array("tag_ids", [tag_id for _, tag_id in pairs]),
+    ).table_valued("post_id", "tag_id").render_derived(name="desired")
+
+    added = []
+    if pairs:
+        result = await db.execute(
+            insert(post_tags)
+            .from_select(["post_id", "tag_id"], select(desired.c.post_id, desired.c.tag_id))
+            .on_conflict_do_nothing()
+            .returning(post_tags.c.post_id, post_tags.c.tag_id)
+        )
+        added = result.all()
+
+    removed = []
+    if request.replace and post_ids:
+        result = await db.execute(
+            delete(post_tags)
+            .where(
+                post_tags.c.post_id == any_(_uuid_array("batch_post_ids", post_ids)),
+                ~exists().where(
+                    desired.c.post_id == post_tags.c.post_id,
+                    desired.c.tag_id == post_tags.c.tag_id
+                )
+            )
+            .returning(post_tags.c.post_id, post_tags.c.tag_id)
+        )
+        removed = result.all()
+
+    deltas = Counter(tag_id for _, tag_id in added)
+    deltas.subtract(tag_id for _, tag_id in removed)
+    await apply_tag_count_deltas(db, deltas)
+    for tag in created:
+        emit(db, "tag.created", tag.tag_id)
+    retagged: Dict[UUID, set] = {}
+    for post_id, tag_id in [*added, *removed]:
+        retagged.setdefault(tag_id, set()).add(post_id)
+    for tag_id, tag_post_ids in retagged.items():
+        emit(db, "tag.posts_changed", tag_id, post_ids=tag_post_ids)
+    await db.commit()
+
+    if created or deltas:
+        await taxonomy.invalidate(tag_ids=[tag.tag_id for tag in created] + list(deltas))
+    for post_id in {post_id for post_id, _ in added} | {post_id for post_id, _ in removed}:
+        await schedule_related_refresh(post_id)
+
+    return BulkTaggingResult(
+        tags_created=[TagOut.model_validate(tag) for tag in created],
+        links_added=len(added),
+        links_removed=len(removed),
+        missing_post_ids=missing,
+    )
@@ -0,0 +1,277 @@
+"""
+In-process snapshot of the taxonomy (every category and tag).
+
+Both tables are small and read far more often than written, so each
+process holds an immutable TaxonomySnapshot with id and slug indexes and
+answers taxonomy reads with dictionary lookups.
+
+A process that creates, updates or deletes a category or tag INCRs the
+Redis key ``taxonomy:version`` after committing and patches its own
+snapshot straight away: it reloads just the rows it wrote and applies
+them to a copy of the snapshot, tag index included (see
+PrefixIndex.updated), so a write costs milliseconds rather than a full
+build. Other processes poll the key every
+TAXONOMY_VERSION_CHECK_INTERVAL seconds and rebuild when it moved. A
+snapshot older than TAXONOMY_MAX_AGE is rebuilt regardless; that bounds
+how far the post_count counters (bumped by post writes without a version
+change) and a missed bump while Redis was down can lag.
+
+A rebuild loads both tables in a fresh session, builds new indexes
+(including the tag autocomplete prefix index) and swaps the reference in
+one assignment, so readers never see a half-built snapshot.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from ..cache import redis_client
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models import Category, Tag
+from ..schemas import CategoryOut, TagOut
+from ..utils.prefix_index import PrefixIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "taxonomy:version"
+
+
+def tag_entry(tag: TagOut) -> tuple:
+    """A tag's PrefixIndex entry: its name, slug and the words of its name, most used first"""
+    return (
+        (tag.name, tag.slug, *normalize(tag.name).split()[1:]),
+        (-tag.post_count, len(tag.name), tag.name),
+        tag.tag_id,
+        tag,
+    )
+
+
+def build_tag_index(tags: Iterable[TagOut]) -> PrefixIndex:
+    """Tags by prefix of their name, slug or any word of the name, most used first"""
+    return PrefixIndex(map(tag_entry, tags))
+
+
+def _merged(items: tuple, by_id: Mapping, by_slug: Mapping, id_attr: str, ids: Set[UUID], rows: Dict[UUID, Any]):
+    """
+    `items` and their indexes with the items of `ids` replaced by `rows`:
+    ids without a row are dropped, rows of new ids go last (newest)
+    """
+    if not ids:
+        return items, by_id, by_slug
+    # MappingProxyType.copy() copies the dict behind it without rehashing
+    by_id, by_slug = by_id.copy(), by_slug.copy()
+    new = [row for item_id, row in rows.items() if item_id not in by_id]
+    # Old item (by identity, cheaper than hashing every UUID) -> its
+    # replacement, None if deleted
+    replaced = {}
+    for item_id in ids:
+        old = by_id.pop(item_id, None)
+        if old is not None:
+            replaced[id(old)] = rows.get(item_id)
+            if by_slug.get(old.slug) is old:
+                del by_slug[old.slug]
+    for item_id, row in rows.items():
+        by_id[item_id] = row
+        by_slug[row.slug] = row
+    kept = tuple(item for item in (replaced.get(id(item), item) for item in items) if item is not None)
+    new.sort(key=lambda row: (row.created_at, getattr(row, id_attr)))
+    return kept + tuple(new), MappingProxyType(by_id), MappingProxyType(by_slug)
+
+
+@dataclass(frozen=True)
+class TaxonomySnapshot:
+    version: Optional[int]
+    built_at: float
+    categories: Tuple[CategoryOut, ...]
+    tags: Tuple[TagOut, ...]
+    categories_by_id: Mapping[UUID, CategoryOut]
+    categories_by_slug: Mapping[str, CategoryOut]
+    tags_by_id: Mapping[UUID, TagOut]
+    tags_by_slug: Mapping[str, TagOut]
+    tag_index: PrefixIndex
+
+    @classmethod
+    def build(cls, version: Optional[int], categories: Iterable, tags: Iterable) -> "TaxonomySnapshot":
+        categories = tuple(CategoryOut.model_validate(row) for row in categories)
+        tags = tuple(TagOut.model_validate(row) for row in tags)
+        return cls(
+            version=version,
+            built_at=time.monotonic(),
+            categories=categories,
+            tags=tags,
+            categories_by_id=MappingProxyType({c.category_id: c for c in categories}),
+            categories_by_slug=MappingProxyType({c.slug: c for c in categories}),
+            tags_by_id=MappingProxyType({t.tag_id: t for t in tags}),
+            tags_by_slug=MappingProxyType({t.slug: t for t in tags}),
+            tag_index=build_tag_index(tags),
+        )
+
+    def patched(
+        self,
+        version: Optional[int],
+        categories: Iterable,
+        category_ids: Iterable[UUID],
+        tags: Iterable,
+        tag_ids: Iterable[UUID],
+    ) -> "TaxonomySnapshot":
+        """
+        A copy with the categories of `category_ids` and the tags of
+        `tag_ids` replaced by the rows in `categories` and `tags`; ids
+        without a row were deleted. Keeps built_at: only a full build
+        catches up with post_count drift.
+        """
+        category_ids, tag_ids = set(category_ids), set(tag_ids)
+        category_rows = {c.category_id: c for c in (CategoryOut.model_validate(row) for row in categories)}
+        tag_rows = {t.tag_id: t for t in (TagOut.model_validate(row) for row in tags)}
+        categories, categories_by_id, categories_by_slug = _merged(
+            self.categories, self.categories_by_id, self.categories_by_slug, "category_id", category_ids, category_rows
+        )
+        tags, tags_by_id, tags_by_slug = _merged(
+            self.tags, self.tags_by_id, self.tags_by_slug, "tag_id", tag_ids, tag_rows
+        )
+        tag_index = self.tag_index
+        if tag_ids:
+            tag_index = tag_index.updated(map(tag_entry, tag_rows.values()), removed=tag_ids - set(tag_rows))
+        return TaxonomySnapshot(
+            version=version,
+            built_at=self.built_at,
+            categories=categories,
+            tags=tags,
+            categories_by_id=categories_by_id,
+            categories_by_slug=categories_by_slug,
+            tags_by_id=tags_by_id,
+            tags_by_slug=tags_by_slug,
+            tag_index=tag_index,
+        )
+
+
+class Taxonomy:
+    def __init__(
+        self,
+        redis=redis_client,
+        session_factory=AsyncSessionLocal,
+        check_interval: float = settings.TAXONOMY_VERSION_CHECK_INTERVAL,
+        max_age: float = settings.TAXONOMY_MAX_AGE,
+    ):
+        self.redis = redis
+        self.session_factory = session_factory
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.snapshot: Optional[TaxonomySnapshot] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _stale(self, snapshot: Optional[TaxonomySnapshot]) -> bool:
+        return snapshot is None or time.monotonic() - snapshot.built_at > self.max_age
+
+    async def get(self) -> TaxonomySnapshot:
+        """The current snapshot; only a missing or expired one costs a load"""
+        snapshot = self.snapshot
+        if self._stale(snapshot):
+            snapshot = await self.rebuild()
+        return snapshot
+
+    async def _read_version(self) -> Optional[int]:
+        try:
+            return int(await self.redis.get(VERSION_KEY) or 0)
+        except Exception as e:
+            logger.debug("Taxonomy version check failed: %r", e)
+            return None
+
+    async def rebuild(self, version: Optional[int] = None, force: bool = False) -> TaxonomySnapshot:
+        before = self.snapshot
+        async with self._lock:
+            # Someone else rebuilt while we waited for the lock
+            if not force and self.snapshot is not before and not self._stale(self.snapshot):
+                return self.snapshot
+            if version is None:
+                version = await self._read_version()
+            async with self.session_factory() as db:
+                categories = (await db.execute(
+                    select(Category).order_by(Category.created_at, Category.category_id)
+                )).scalars().all()
+                tags = (await db.execute(
+                    select(Tag).order_by(Tag.created_at, Tag.tag_id)
+                )).scalars().all()
+            # Building the indexes is CPU work, keep it off the event loop
+            self.snapshot = await asyncio.to_thread(TaxonomySnapshot.build, version, categories, tags)
+            return self.snapshot
+
+    async def refresh(
+        self,
+        tag_ids: Iterable[UUID] = (),
+        category_ids: Iterable[UUID] = (),
+        bumped_to: Optional[int] = None,
+    ) -> TaxonomySnapshot:
+        """
+        Reload just these tags and categories into the snapshot. `bumped_to`
+        is the version this process's own bump returned; the snapshot takes
+        it only if no other process bumped in between, otherwise the poll
+        still sees a change it hasn't got and rebuilds.
+        """
+        tag_ids, category_ids = set(tag_ids), set(category_ids)
+        if self.snapshot is None:
+            return await self.rebuild(bumped_to, force=True)
+        async with self._lock:
+            async with self.session_factory() as db:
+                categories = (await db.execute(
+                    select(Category).where(Category.category_id.in_(category_ids))
+                )).scalars().all() if category_ids else []
+                tags = (await db.execute(
+                    select(Tag).where(Tag.tag_id.in_(tag_ids))
+                )).scalars().all() if tag_ids else []
+            snapshot = self.snapshot
+            version = snapshot.version
+            if bumped_to is not None and version is not None and bumped_to == version + 1:
+                version = bumped_to
+            self.snapshot = await asyncio.to_thread(
+                snapshot.patched, version, categories, category_ids, tags, tag_ids
+            )
+            return self.snapshot
+
+    async def invalidate(self, tag_ids: Iterable[UUID] = (), category_ids: Iterable[UUID] = ()) -> None:
+        """Call after committing category or tag writes, with the ids written"""
+        try:
+            version = int(await self.redis.incr(VERSION_KEY))
+        except Exception as e:
+            logger.warning("Taxonomy version bump failed, other processes catch up within %ss: %r", self.max_age, e)
+            version = None
+        tag_ids, category_ids = set(tag_ids), set(category_ids)
+        if tag_ids or category_ids:
+            await self.refresh(tag_ids, category_ids, version)
+        else:
+            await self.rebuild(version, force=True)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                version = await self._read_version()
+                snapshot = self.snapshot
+                if self._stale(snapshot) or (version is not None and version != snapshot.version):
+                    await self.rebuild(version, force=True)
+            except Exception as e:
+                logger.warning("Taxonomy refresh failed: %r", e)
+
+    async def start(self) -> None:
+        if self._task is None:
+            try:
+                await self.rebuild(force=True)
+            except Exception as e:
+                logger.warning("Initial taxonomy load failed, loading on first use: %r", e)
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+taxonomy = Taxonomy()
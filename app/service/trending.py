@@ -0,0 +1,171 @@
+"""
+Trending posts ranking.
+
+Each post has a score that decays exponentially with a configurable
+half-life. Instead of decaying every score on a timer, events are weighted
+forward in time (forward decay): an event at time t adds
+``weight * 2 ** ((t - epoch) / half_life)``. Relative order between posts is
+the same as with decayed scores, so a single ZINCRBY per event keeps the
+ranking current and top-k is a ZREVRANGE, O(log n + k).
+
+To keep the multipliers bounded the epoch moves forward every
+EPOCH_LENGTH seconds. Scores live in a sorted set per epoch; the first
+writer of a new epoch carries the previous set over, scaled down by the
+decay that happened in between, and lets the old set expire.
+
+While Redis is unavailable the same scheme runs on an in-process dict.
+"""
+import heapq
+import logging
+import math
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..cache import redis_client, cache_backend, MODE_MEMORY
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "trending:posts:"
+EPOCH_LENGTH = 7 * 24 * 3600
+# Scores that decayed below this are dropped when carried to a new epoch
+MIN_SCORE = 1e-3
+
+
+class RedisScoreStore:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def incr_many(self, epoch: int, items: Dict[str, float]) -> None:
+        key = f"{KEY_PREFIX}{epoch}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for member, amount in items.items():
+                pipe.zincrby(key, amount, member)
+            await pipe.execute()
+
+    async def top(self, epoch: int, k: int) -> List[Tuple[str, float]]:
+        return await self.redis.zrevrange(f"{KEY_PREFIX}{epoch}", 0, k - 1, withscores=True)
+
+    async def remove(self, epoch: int, member: str) -> None:
+        await self.redis.zrem(f"{KEY_PREFIX}{epoch}", member)
+
+    async def carry_over(self, old_epoch: int, new_epoch: int, factor: float) -> None:
+        new_key, old_key = f"{KEY_PREFIX}{new_epoch}", f"{KEY_PREFIX}{old_epoch}"
+        if not await self.redis.set(f"{new_key}:carried", "1", nx=True, ex=EPOCH_LENGTH * 2):
+            return
+        await self.redis.zunionstore(new_key, {new_key: 1, old_key: factor})
+        await self.redis.zremrangebyscore(new_key, "-inf", f"({MIN_SCORE}")
+        await self.redis.expire(old_key, 3600)
+
+
+class LocalScoreStore:
+    """In-process fallback; top-k is a heap scan, O(n log k)"""
+
+    def __init__(self):
+        self.epoch: Optional[int] = None
+        self.scores: Dict[str, float] = {}
+
+    async def incr_many(self, epoch: int, items: Dict[str, float]) -> None:
+        scores = self.scores
+        for member, amount in items.items():
+            scores[member] = scores.get(member, 0.0) + amount
+
+    async def top(self, epoch: int, k: int) -> List[Tuple[str, float]]:
+        return heapq.nlargest(k, self.scores.items(), key=lambda item: item[1])
+
+    async def remove(self, epoch: int, member: str) -> None:
+        self.scores.pop(member, None)
+
+    async def carry_over(self, old_epoch: int, new_epoch: int, factor: float) -> None:
+        if self.epoch == new_epoch:
+            return
+        self.scores = {
+            member: score * factor
+            for member, score in self.scores.items()
+            if score * factor >= MIN_SCORE
+        }
+        self.epoch = new_epoch
+
+
+class TrendingEngine:
+    def __init__(
+        self,
+        redis=redis_client,
+        half_life_hours: float = settings.TRENDING_HALF_LIFE_HOURS,
+        view_weight: float = settings.TRENDING_VIEW_WEIGHT,
+        comment_weight: float = settings.TRENDING_COMMENT_WEIGHT,
+        publish_weight: float = settings.TRENDING_PUBLISH_WEIGHT,
+        use_redis: bool = True,
+    ):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.view_weight = view_weight
+        self.comment_weight = comment_weight
+        self.publish_weight = publish_weight
+        self.use_redis = use_redis
+        self.redis_store = RedisScoreStore(redis)
+        self.local_store = LocalScoreStore()
+        self._epochs: Dict[int, int] = {}
+
+    def _store(self):
+        if self.use_redis and cache_backend.mode != MODE_MEMORY:
+            return self.redis_store
+        return self.local_store
+
+    async def _epoch(self, store, now: float) -> int:
+        epoch = int(now // EPOCH_LENGTH) * EPOCH_LENGTH
+        if self._epochs.get(id(store)) != epoch:
+            previous = epoch - EPOCH_LENGTH
+            await store.carry_over(previous, epoch, math.exp(-EPOCH_LENGTH * self.decay))
+            self._epochs[id(store)] = epoch
+        return epoch
+
+    async def record_many(self, events: Iterable[Tuple[uuid.UUID, float]], now: Optional[float] = None) -> None:
+        """Add (post_id, weight) events, all happening at `now`"""
+        now = time.time() if now is None else now
+        items: Dict[str, float] = {}
+        for post_id, weight in events:
+            items[str(post_id)] = items.get(str(post_id), 0.0) + weight
+        if not items:
+            return
+        store = self._store()
+        try:
+            epoch = await self._epoch(store, now)
+            boost = math.exp((now - epoch) * self.decay)
+            await store.incr_many(epoch, {m: w * boost for m, w in items.items()})
+        except Exception as e:
+            # Ranking is best effort, never fail the caller
+            logger.warning("Trending update failed: %r", e)
+
+    async def record_views(self, views: Iterable[Tuple[uuid.UUID, int]], now: Optional[float] = None) -> None:
+        await self.record_many(((post_id, count * self.view_weight) for post_id, count in views), now)
+
+    async def record_comment(self, post_id: uuid.UUID, now: Optional[float] = None) -> None:
+        await self.record_many([(post_id, self.comment_weight)], now)
+
+    async def record_publish(self, post_id: uuid.UUID, now: Optional[float] = None) -> None:
+        await self.record_many([(post_id, self.publish_weight)], now)
+
+    async def remove(self, post_id: uuid.UUID, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        store = self._store()
+        try:
+            await store.remove(await self._epoch(store, now), str(post_id))
+        except Exception as e:
+            logger.warning("Trending removal failed: %r", e)
+
+    async def top(self, k: int = 10, now: Optional[float] = None) -> List[Tuple[uuid.UUID, float]]:
+        """Top k post ids with their decayed score as of `now`"""
+        now = time.time() if now is None else now
+        store = self._store()
+        try:
+            epoch = await self._epoch(store, now)
+            ranked = await store.top(epoch, k)
+        except Exception as e:
+            logger.warning("Trending read failed: %r", e)
+            return []
+        scale = math.exp(-(now - epoch) * self.decay)
+        return [(uuid.UUID(member), score * scale) for member, score in ranked]
+
+
+trending = TrendingEngine()
@@ -1,18 +1,28 @@
 from sqlalchemy import select, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import User
-from ..schemas import UserCreate, UserUpdate
+from ..schemas import UserCreate, UserUpdate, UserOut
 from fastapi import HTTPException, status
 from uuid import UUID
 from datetime import datetime
+from typing import List
 from ..utils.security.password import get_password_hash
+from ..utils.fieldsets import Resource, FieldSet
+from ..database.loader import get_loader
+from .outbox import emit
 
-async def get_user(db: AsyncSession, user_id: UUID):
-    result = await db.execute(
-        select(User)
-        .where(User.user_id == user_id)
-    )
-    user = result.scalars().first()
+USERS = Resource(User, UserOut)
+
+async def get_user(db: AsyncSession, user_id: UUID, fieldset: FieldSet = None):
+    if fieldset is None:
+        user = await get_loader(db).load(User, user_id)
+    else:
+        result = await db.execute(
+            select(User)
+            .where(User.user_id == user_id)
+            .options(*USERS.load_options(fieldset))
+        )
+        user = result.scalars().first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -20,6 +30,15 @@ async def get_user(db: AsyncSession, user_id: UUID):
         )
     return user
 
+async def get_users_by_ids(db: AsyncSession, user_ids: List[UUID], fieldset: FieldSet = None):
+    """Users with these ids, in no particular order; unknown ids are skipped"""
+    result = await db.execute(
+        select(User)
+        .where(User.user_id.in_(user_ids))
+        .options(*USERS.load_options(fieldset))
+    )
+    return result.scalars().all()
+
 async def get_user_by_email(db: AsyncSession, email: str):
     result = await db.execute(
         select(User)
@@ -27,9 +46,10 @@ async def get_user_by_email(db: AsyncSession, email: str):
     )
     return result.scalars().first()
 
-async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, fieldset: FieldSet = None):
     result = await db.execute(
         select(User)
+        .options(*USERS.load_options(fieldset))
         .offset(skip)
         .limit(limit)
     )
@@ -70,6 +90,8 @@ async def create_user(db: AsyncSession, user: UserCreate):
     )
     
     db.add(db_user)
+    await db.flush()
+    emit(db, "user.created", db_user.user_id)
     await db.commit()
     await db.refresh(db_user)
     return db_user
@@ -91,6 +113,7 @@ async def update_user(
         setattr(db_user, field, value)
     
     db_user.updated_at = datetime.utcnow()
+    emit(db, "user.updated", user_id)
     await db.commit()
     await db.refresh(db_user)
     return db_user
@@ -100,6 +123,7 @@ async def delete_user(db: AsyncSession, user_id: UUID):
     
     # Soft delete (recommended)
     db_user.is_active = False
+    emit(db, "user.deleted", user_id)
     await db.commit()
     
     # Or hard delete:
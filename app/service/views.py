@@ -0,0 +1,202 @@
+"""
+Write-behind page view counter for posts.
+
+Views are counted in three stages so a GET never writes to Postgres:
+
+1. ``record_view`` bumps an in-process Counter (no I/O).
+2. Every VIEW_LOCAL_FLUSH_INTERVAL seconds the buffer is pushed to the
+   Redis hash ``post_views:pending`` with HINCRBY in one pipeline.
+3. Every VIEW_DB_FLUSH_INTERVAL seconds one worker (guarded by a Redis
+   lock) renames the pending hash to ``post_views:flushing:<batch_id>`` and
+   applies it with a single ``UPDATE posts ... FROM (VALUES ...)``.
+
+The batch id is inserted into ``post_view_flushes`` in the same
+transaction as the UPDATE, and the flushing hash is only deleted after the
+commit. A worker that crashes mid-flush leaves the hash behind; the next
+flush picks it up and either applies it or, if the batch id is already
+recorded, just deletes it. Views are therefore applied exactly once.
+
+While Redis is down the local buffer is written straight to Postgres
+instead. Only views still in the local buffer (at most one local interval)
+are lost if the process dies.
+"""
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import values, column, update, delete, func, Integer, String
+from sqlalchemy.dialects.postgresql import UUID, insert
+from redis.exceptions import ResponseError
+
+from ..cache import redis_client, cache_backend, MODE_MEMORY
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models import Post, PostViewFlush
+from .trending import trending
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "post_views:pending"
+FLUSHING_PREFIX = "post_views:flushing:"
+LOCK_KEY = "post_views:flush_lock"
+# Applied batch ids only need to outlive a crashed flush being retried
+FLUSH_LOG_RETENTION = timedelta(days=1)
+
+
+class ViewCounter:
+    def __init__(
+        self,
+        redis=redis_client,
+        session_factory=AsyncSessionLocal,
+        local_interval: float = settings.VIEW_LOCAL_FLUSH_INTERVAL,
+        db_interval: float = settings.VIEW_DB_FLUSH_INTERVAL,
+    ):
+        self.redis = redis
+        self.session_factory = session_factory
+        self.local_interval = local_interval
+        self.db_interval = db_interval
+        self._buffer: Counter = Counter()
+        self._tasks = []
+
+    def record(self, post_id: Optional[uuid.UUID] = None, slug: Optional[str] = None) -> None:
+        """Count one view, by post id or by slug (the slug route doesn't know the id)"""
+        if post_id is not None:
+            self._buffer[f"id:{post_id}"] += 1
+        elif slug is not None:
+            self._buffer[f"slug:{slug}"] += 1
+
+    def _redis_available(self) -> bool:
+        return cache_backend.mode != MODE_MEMORY
+
+    async def flush_local(self) -> None:
+        """Move the in-process buffer to Redis, or to Postgres if Redis is down"""
+        if not self._buffer:
+            return
+        buffer, self._buffer = self._buffer, Counter()
+        if self._redis_available():
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for field, count in buffer.items():
+                        pipe.hincrby(PENDING_KEY, field, count)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning("View counter could not reach Redis: %r", e)
+        try:
+            await self.apply_batch(uuid.uuid4().hex, buffer)
+        except Exception as e:
+            logger.warning("View counter flush to database failed, retrying later: %r", e)
+            self._buffer.update(buffer)
+
+    async def flush_to_db(self) -> None:
+        """Apply the pending Redis hash (and any leftover from a crashed flush) to Postgres"""
+        if not self._redis_available():
+            return
+        if not await self.redis.set(LOCK_KEY, "1", nx=True, ex=max(int(self.db_interval * 2), 10)):
+            return  # another worker is flushing
+        try:
+            keys = [key async for key in self.redis.scan_iter(match=f"{FLUSHING_PREFIX}*")]
+            batch_key = f"{FLUSHING_PREFIX}{uuid.uuid4().hex}"
+            try:
+                await self.redis.rename(PENDING_KEY, batch_key)
+                keys.append(batch_key)
+            except ResponseError:
+                pass  # no views since the last flush
+            for key in keys:
+                counts = await self.redis.hgetall(key)
+                await self.apply_batch(key[len(FLUSHING_PREFIX):], counts)
+                await self.redis.delete(key)
+        finally:
+            await self.redis.delete(LOCK_KEY)
+
+    async def apply_batch(self, batch_id: str, counts: Dict[str, int]) -> None:
+        by_id, by_slug = [], []
+        for field, count in counts.items():
+            kind, _, value = field.partition(":")
+            if kind == "id":
+                by_id.append((uuid.UUID(value), int(count)))
+            elif kind == "slug":
+                by_slug.append((value, int(count)))
+
+        applied = []
+        async with self.session_factory() as db:
+            result = await db.execute(
+                insert(PostViewFlush)
+                .values(batch_id=batch_id)
+                .on_conflict_do_nothing()
+                .returning(PostViewFlush.batch_id)
+            )
+            if result.scalar_one_or_none() is None:
+                return  # already applied before a crash, nothing to do
+
+            if by_id:
+                v = values(
+                    column("post_id", UUID(as_uuid=True)), column("delta", Integer), name="v"
+                ).data(by_id)
+                result = await db.execute(
+                    update(Post)
+                    .where(Post.post_id == v.c.post_id)
+                    .values(view_count=Post.view_count + v.c.delta, updated_at=Post.updated_at)
+                    .returning(Post.post_id, v.c.delta)
+                    .execution_options(synchronize_session=False)
+                )
+                applied.extend(result.all())
+            if by_slug:
+                v = values(
+                    column("slug", String), column("delta", Integer), name="v"
+                ).data(by_slug)
+                result = await db.execute(
+                    update(Post)
+                    .where(Post.slug == v.c.slug)
+                    .values(view_count=Post.view_count + v.c.delta, updated_at=Post.updated_at)
+                    .returning(Post.post_id, v.c.delta)
+                    .execution_options(synchronize_session=False)
+                )
+                applied.extend(result.all())
+            await db.execute(
+                delete(PostViewFlush)
+                .where(PostViewFlush.created_at < func.now() - FLUSH_LOG_RETENTION)
+            )
+            await db.commit()
+
+        # Flushed views (slug views now resolved to ids) feed the trending ranking
+        await trending.record_views(applied)
+
+    async def _run_every(self, interval: float, flush) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await flush()
+            except Exception as e:
+                logger.warning("View counter %s failed: %r", flush.__name__, e)
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run_every(self.local_interval, self.flush_local)),
+                asyncio.create_task(self._run_every(self.db_interval, self.flush_to_db)),
+            ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Don't drop views buffered in this process on a clean shutdown
+        await self.flush_local()
+
+
+view_counter = ViewCounter()
+
+
+async def record_post_view(post_id: uuid.UUID) -> None:
+    """Route dependency for /posts/{post_id}; runs even when the response is cached"""
+    view_counter.record(post_id=post_id)
+
+
+async def record_post_view_by_slug(slug: str) -> None:
+    """Route dependency for /posts/slug/{slug}"""
+    view_counter.record(slug=slug)
@@ -0,0 +1,234 @@
+"""
+Sparse fieldsets for read endpoints.
+
+    GET /api/v1/posts/?fields=title,slug,author.username&include=tags
+
+``fields`` lists the attributes to return; a dotted name selects an
+attribute of a relationship and implies including it. ``include`` lists
+the relationships to embed. Without ``fields`` every attribute of the
+resource's schema is returned, without ``include`` the relationships the
+schema embeds by default are.
+
+A FieldSet is turned into:
+
+- loader options: ``load_only`` on the selected columns, one
+  ``selectinload(...).load_only(...)`` per included relationship and
+  ``raiseload("*")`` for everything else, so a relationship nobody asked
+  for is never loaded;
+- a response model holding only the selected fields, built from the
+  resource's schema once per distinct fieldset.
+
+Primary keys, ``updated_at`` (Last-Modified) and the columns a relationship
+joins on are always loaded, even when they are not returned. Read
+endpoints always pass a FieldSet (DEFAULT_FIELDSET without parameters);
+services called with none load full entities.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+
+@dataclass(frozen=True)
+class FieldSet:
+    """Parsed ``fields``/``include``; hashable and with a stable repr, so it can key caches"""
+    fields: Optional[Tuple[str, ...]] = None
+    include: Optional[Tuple[str, ...]] = None
+    nested: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+
+    def nested_fields(self, relation: str) -> Optional[Tuple[str, ...]]:
+        return dict(self.nested).get(relation)
+
+
+DEFAULT_FIELDSET = FieldSet()
+
+
+@dataclass(frozen=True)
+class Shaped:
+    """An endpoint result together with the model it must be serialized as"""
+    model: Any
+    content: Any
+
+
+def _columns(model) -> Dict[str, Any]:
+    return {attr.key: getattr(model, attr.key) for attr in sa_inspect(model).column_attrs}
+
+
+def _always_loaded(model) -> set:
+    keys = {column.key for column in sa_inspect(model).primary_key}
+    if "updated_at" in _columns(model):
+        keys.add("updated_at")
+    return keys
+
+
+class Resource:
+    """
+    A model exposed through a schema, with the relationships it may embed.
+
+    `relations` maps relationship names to the schema of the related
+    objects; those listed in the schema itself are the default includes.
+    """
+
+    def __init__(self, model, schema: Type[BaseModel], relations: Optional[Dict[str, Type[BaseModel]]] = None):
+        self.model = model
+        self.schema = schema
+        self.relations = relations or {}
+        self.columns = _columns(model)
+        self.attributes = [
+            name for name in schema.model_fields
+            if name not in self.relations
+        ]
+        self.default_include = tuple(sorted(name for name in self.relations if name in schema.model_fields))
+
+    def __repr__(self) -> str:
+        return f"Resource({self.model.__name__})"
+
+    # Parsing
+
+    def parse(self, fields: Optional[str], include: Optional[str]) -> FieldSet:
+        selected, nested = set(), {}
+        if include is not None:
+            includes = set(_split(include))
+        else:
+            # With explicit fields only the relationships named there are embedded
+            includes = set() if fields is not None else None
+        for name in _split(fields):
+            relation, _, attribute = name.partition(".")
+            if attribute:
+                self._check_relation(relation)
+                related = self.relations[relation]
+                if attribute not in related.model_fields:
+                    _unknown(name)
+                nested.setdefault(relation, set()).add(attribute)
+                includes = (includes or set()) | {relation}
+            elif relation in self.relations:
+                # A bare relationship name in fields embeds it whole
+                includes = (includes or set()) | {relation}
+                selected.add(relation)
+            elif relation in self.attributes:
+                selected.add(relation)
+            else:
+                _unknown(name)
+        for relation in includes or ():
+            self._check_relation(relation)
+
+        return FieldSet(
+            fields=tuple(sorted(selected - set(self.relations))) if fields is not None else None,
+            include=tuple(sorted(includes)) if includes is not None else None,
+            nested=tuple(sorted((name, tuple(sorted(attrs))) for name, attrs in nested.items())),
+        )
+
+    def _check_relation(self, name: str) -> None:
+        if name not in self.relations:
+            _unknown(name)
+
+    def includes(self, fieldset: FieldSet) -> Tuple[str, ...]:
+        return self.default_include if fieldset.include is None else fieldset.include
+
+    # Loading
+
+    def load_options(self, fieldset: Optional[FieldSet] = None) -> List[Any]:
+        """
+        Loader options fetching exactly what `fieldset` returns. Without a
+        fieldset (internal callers that go on to modify the entity) whole
+        rows are loaded with the default relationships, as before.
+        """
+        if fieldset is None:
+            return [selectinload(getattr(self.model, name)) for name in self.default_include]
+        includes = self.includes(fieldset)
+        keys = set(_always_loaded(self.model))
+        keys.update(name for name in (self.attributes if fieldset.fields is None else fieldset.fields) if name in self.columns)
+
+        options = []
+        for name in includes:
+            attr = getattr(self.model, name)
+            prop = attr.property
+            # Columns the relationship joins on must be there for selectinload
+            keys.update(column.key for column in prop.local_columns if column.key in self.columns)
+            related_model = prop.mapper.class_
+            related_columns = _columns(related_model)
+            wanted = fieldset.nested_fields(name) or self.relations[name].model_fields
+            related_keys = _always_loaded(related_model)
+            related_keys.update(field for field in wanted if field in related_columns)
+            options.append(
+                selectinload(attr).options(
+                    load_only(*(related_columns[key] for key in sorted(related_keys))),
+                    raiseload("*"),
+                )
+            )
+        options.append(load_only(*(self.columns[key] for key in sorted(keys))))
+        options.append(raiseload("*"))
+        return options
+
+    # Serialization
+
+    def response_model(self, fieldset: Optional[FieldSet] = None):
+        fieldset = fieldset or DEFAULT_FIELDSET
+        if fieldset == DEFAULT_FIELDSET:
+            return self.schema
+        return _sparse_model(self, fieldset)
+
+    def shape(self, fieldset: Optional[FieldSet], content: Any) -> Any:
+        """Pair an endpoint result with the response model for `fieldset`"""
+        if not fieldset or fieldset == DEFAULT_FIELDSET:
+            return content
+        model = self.response_model(fieldset)
+        if isinstance(content, (list, tuple)):
+            model = List[model]
+        return Shaped(model, content)
+
+    def query(self):
+        """FastAPI dependency parsing the ``fields``/``include`` query parameters"""
+        def fieldset_dependency(
+            fields: Optional[str] = Query(None, description="Comma separated attributes to return, dotted for relationships"),
+            include: Optional[str] = Query(None, description="Comma separated relationships to embed"),
+        ) -> FieldSet:
+            return self.parse(fields, include)
+
+        return fieldset_dependency
+
+
+def _split(value: Optional[str]) -> Iterable[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def _unknown(name: str):
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Unknown field '{name}'"
+    )
+
+
+def _subset(schema: Type[BaseModel], names: Iterable[str], extra: Optional[Dict[str, Any]] = None):
+    names = set(names)
+    definitions = {
+        name: (field.annotation, field)
+        for name, field in schema.model_fields.items()
+        if name in names
+    }
+    definitions.update(extra or {})
+    return create_model(
+        f"{schema.__name__}Sparse",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions
+    )
+
+
+@lru_cache(maxsize=512)
+def _sparse_model(resource: Resource, fieldset: FieldSet):
+    relations = {}
+    for name in resource.includes(fieldset):
+        related_schema = resource.relations[name]
+        nested = fieldset.nested_fields(name)
+        related = _subset(related_schema, nested) if nested else related_schema
+        many = getattr(resource.model, name).property.uselist
+        relations[name] = (List[related], []) if many else (Optional[related], None)
+    names = fieldset.fields if fieldset.fields is not None else resource.attributes
+    return _subset(resource.schema, names, relations)
+
+
+__all__ = ['FieldSet', 'DEFAULT_FIELDSET', 'Shaped', 'Resource']
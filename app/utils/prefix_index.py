@@ -0,0 +1,178 @@
+"""
+Immutable prefix index over short strings, for autocomplete.
+
+Keys are ASCII-folded with unidecode and lowercased, and kept in one sorted
+list; a prefix query is two bisects giving the range of matching keys. An
+item can be reachable through several keys (e.g. a tag's name, slug and
+each word of its name) and is returned once, ordered by its sort key.
+
+Short prefixes match a large part of the list. While building, every
+prefix whose range is wider than ``scan_limit`` gets its top results
+computed up front (walking the sorted keys depth by depth, refining only
+the wide groups), so a query ranks at most ``scan_limit`` keys and the
+index never changes after construction.
+
+A few changed items don't need a new build: ``updated()`` returns a copy
+with their rows bisected out and back in, and the top results recomputed
+for the prefixes of the keys they touched only.
+"""
+import heapq
+from bisect import bisect_left, bisect_right
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, Hashable, Iterable, List, Tuple
+
+from unidecode import unidecode
+
+# Sorts after every character a normalized key can contain
+_KEY_END = "\U0010ffff"
+
+
+def normalize(text: str) -> str:
+    return " ".join(unidecode(text or "").lower().split())
+
+
+def _normalized(keys: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(sorted({normalize(key) for key in keys} - {""}))
+
+
+class PrefixIndex:
+    def __init__(
+        self,
+        entries: Iterable[Tuple[Iterable[str], Any, Hashable, Any]],
+        max_results: int = 20,
+        scan_limit: int = 256,
+    ):
+        """
+        `entries` are (keys, sort_key, item_id, item): lower sort keys rank
+        first, item_id dedupes an item reachable through several keys.
+        """
+        self.max_results = max_results
+        self.scan_limit = scan_limit
+        rows = []
+        # item_id -> its normalized keys, to find its rows again
+        self._keys_of: Dict[Hashable, Tuple[str, ...]] = {}
+        for keys, sort_key, item_id, item in entries:
+            self._keys_of[item_id] = _normalized(keys)
+            rows.extend((key, sort_key, item_id, item) for key in self._keys_of[item_id])
+        rows.sort(key=itemgetter(0))
+        self._keys = [row[0] for row in rows]
+        self._rows = rows
+        # prefix -> its best (sort_key, item_id, item), for wide prefixes
+        self._top: Dict[str, List[Tuple[Any, Hashable, Any]]] = {}
+        self._precompute(0, len(rows), 1)
+
+    def _precompute(self, lo: int, hi: int, depth: int) -> None:
+        """Top results for every prefix of length `depth` in [lo, hi) matching too many keys"""
+        start = lo
+        for prefix, group in groupby(range(lo, hi), key=lambda i: self._keys[i][:depth]):
+            end = start + sum(1 for _ in group)
+            if end - start > self.scan_limit and len(prefix) == depth:
+                self._top[prefix] = self._ranked(start, end)
+                self._precompute(start, end, depth + 1)
+            start = end
+
+    def updated(
+        self,
+        entries: Iterable[Tuple[Iterable[str], Any, Hashable, Any]] = (),
+        removed: Iterable[Hashable] = (),
+    ) -> "PrefixIndex":
+        """
+        A copy with the items `removed` (by item_id) taken out and `entries`
+        put in, replacing items of the same id. Costs a copy of the key list
+        plus a ranking per wide prefix touched, not a build.
+        """
+        entries = list(entries)
+        index = object.__new__(PrefixIndex)
+        index.max_results = self.max_results
+        index.scan_limit = self.scan_limit
+        index._keys_of = dict(self._keys_of)
+        index._keys = list(self._keys)
+        index._rows = list(self._rows)
+        index._top = dict(self._top)
+
+        changed = {*removed, *(entry[2] for entry in entries)}
+        touched = set()
+        for item_id in changed:
+            for key in index._keys_of.pop(item_id, ()):
+                lo, hi = bisect_left(index._keys, key), bisect_right(index._keys, key)
+                for i in range(lo, hi):
+                    if index._rows[i][2] == item_id:
+                        del index._keys[i]
+                        del index._rows[i]
+                        break
+                touched.add(key)
+        added: Dict[Hashable, Tuple[Any, Any, Tuple[str, ...]]] = {}
+        for keys, sort_key, item_id, item in entries:
+            index._keys_of[item_id] = _normalized(keys)
+            added[item_id] = (sort_key, item, index._keys_of[item_id])
+            for key in index._keys_of[item_id]:
+                i = bisect_right(index._keys, key)
+                index._keys.insert(i, key)
+                index._rows.insert(i, (key, sort_key, item_id, item))
+                touched.add(key)
+
+        # Only prefixes of a touched key can have a different top; ranges
+        # narrow with length, so the walk stops at the first narrow one
+        seen = set()
+        for key in touched:
+            for depth in range(1, len(key) + 1):
+                prefix = key[:depth]
+                if prefix in seen:
+                    continue
+                seen.add(prefix)
+                lo, hi = index._range(prefix)
+                if hi - lo <= index.scan_limit:
+                    index._top.pop(prefix, None)
+                    for longer in range(depth + 1, len(key) + 1):
+                        index._top.pop(key[:longer], None)
+                    break
+                index._top[prefix] = index._retop(prefix, lo, hi, index._top.get(prefix), changed, added)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + _KEY_END)
+
+    def _ranked(self, lo: int, hi: int) -> List[Tuple[Any, Hashable, Any]]:
+        """(sort_key, item_id, item) of the best items among rows [lo, hi)"""
+        best: Dict[Hashable, Tuple[Any, Any]] = {}
+        for _, sort_key, item_id, item in self._rows[lo:hi]:
+            best[item_id] = (sort_key, item)
+        top = heapq.nsmallest(self.max_results, best.items(), key=lambda entry: entry[1][0])
+        return [(sort_key, item_id, item) for item_id, (sort_key, item) in top]
+
+    def _retop(self, prefix: str, lo: int, hi: int, top, changed: set, added: dict) -> List[Tuple[Any, Hashable, Any]]:
+        """
+        The top of `prefix` once the `changed` items are replaced by `added`.
+        Merges into the old top unless one of its items left the prefix or
+        ranks lower now: then an item outside it may move up, and only a
+        ranking of the whole range can tell which.
+        """
+        if top is None:
+            return self._ranked(lo, hi)
+        best: Dict[Hashable, Tuple[Any, Any]] = {}
+        for sort_key, item_id, item in top:
+            if item_id in changed:
+                new = added.get(item_id)
+                if new is None or new[0] > sort_key or not any(key.startswith(prefix) for key in new[2]):
+                    return self._ranked(lo, hi)
+            else:
+                best[item_id] = (sort_key, item)
+        for item_id, (sort_key, item, keys) in added.items():
+            if any(key.startswith(prefix) for key in keys):
+                best[item_id] = (sort_key, item)
+        top = heapq.nsmallest(self.max_results, best.items(), key=lambda entry: entry[1][0])
+        return [(sort_key, item_id, item) for item_id, (sort_key, item) in top]
+
+    def search(self, query: str, limit: int = 10) -> List[Any]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        limit = min(limit, self.max_results)
+        top = self._top.get(prefix)
+        if top is None:
+            top = self._ranked(*self._range(prefix))
+        return [item for _, _, item in top[:limit]]
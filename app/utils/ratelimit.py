@@ -0,0 +1,262 @@
+"""
+Request rate limiting.
+
+Policies are declared on the routes they protect, as dependencies:
+
+    comment_writes = RateLimit("comments:write", limit=10, period=60)
+
+    @router.post("/", dependencies=[Depends(comment_writes)])
+
+Each policy is a token bucket of `limit` requests refilled evenly over
+`period` seconds, kept per user (the verified ``sub`` of the bearer token,
+else the client address), per client address, or once for the whole route.
+Policies sharing a name share their buckets, so several routes can draw on
+one budget.
+
+On routes that require a login, use AuthenticatedRateLimit: it runs after
+get_current_user, so a request without a valid token gets its 401 without
+drawing on any bucket (anonymous clients can't drain a route-wide budget),
+and users are keyed on their id.
+
+Buckets live in Redis as a single "theoretical arrival time" per key
+(GCRA, the token bucket reduced to one number), updated by a Lua script:
+one round trip per check, atomic across workers, timed by the Redis clock.
+While Redis is unreachable (the cache backend is in memory mode, or the
+call fails) the same algorithm runs on an in-process table, so limits hold
+per worker instead of globally rather than not at all.
+
+Every check is recorded on the request; RateLimitHeadersMiddleware turns
+the most restrictive one into ``RateLimit-*`` response headers. A request
+over the limit gets 429 with ``Retry-After``.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import jwt
+from fastapi import Depends, HTTPException, Request, status
+
+from ..auth.dependencies import get_current_user
+from ..cache import cache_backend, redis_client, MODE_MEMORY
+from ..config import settings
+from ..models import User
+
+logger = logging.getLogger(__name__)
+
+PER_USER = "user"
+PER_IP = "ip"
+PER_ROUTE = "route"
+
+STATE_KEY = "rate_limits"
+
+# KEYS[1] bucket; ARGV burst, emission interval (ms per token), cost.
+# Returns {allowed, remaining, retry_after_ms, reset_after_ms}.
+GCRA_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + cost * interval
+local allow_at = new_tat - burst * interval
+if allow_at > now then
+    return {0, 0, allow_at - now, tat - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, math.floor((now - allow_at) / interval), 0, new_tat - now}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # seconds until the request would be allowed
+    reset_after: float  # seconds until the bucket is full again
+
+
+@dataclass
+class RateLimitStats:
+    checks: int = 0
+    rejected: int = 0
+    local_checks: int = 0
+    redis_errors: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class LocalBuckets:
+    """The GCRA of GCRA_SCRIPT over a bounded in-process LRU table"""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+
+    def hit(self, key: str, burst: int, interval: float, cost: int = 1) -> Tuple[bool, int, float, float]:
+        now = time.monotonic() * 1000
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + cost * interval
+        allow_at = new_tat - burst * interval
+        if allow_at > now:
+            return False, 0, allow_at - now, tat - now
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        while len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+        return True, int((now - allow_at) // interval), 0.0, new_tat - now
+
+    @property
+    def size(self) -> int:
+        return len(self._tat)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        redis=redis_client,
+        enabled: bool = settings.RATE_LIMIT_ENABLED,
+        local_max_keys: int = settings.RATE_LIMIT_LOCAL_MAX_KEYS,
+    ):
+        self.redis = redis
+        self.enabled = enabled
+        self.local = LocalBuckets(local_max_keys)
+        self.stats = RateLimitStats()
+        self._script = redis.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, limit: int, period: float, cost: int = 1) -> RateLimitResult:
+        """Take `cost` tokens from the bucket `key` if it has them"""
+        # Whole milliseconds keep the Lua arithmetic exact
+        interval = max(1, round(period * 1000 / limit))
+        self.stats.checks += 1
+        outcome = None
+        if cache_backend.mode != MODE_MEMORY:
+            try:
+                outcome = await self._script(keys=[key], args=[limit, interval, cost])
+            except Exception as e:
+                self.stats.redis_errors += 1
+                logger.debug("Rate limit check fell back to local buckets: %r", e)
+        if outcome is None:
+            self.stats.local_checks += 1
+            outcome = self.local.hit(key, limit, interval, cost)
+        allowed, remaining, retry_after, reset_after = outcome
+        if not allowed:
+            self.stats.rejected += 1
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=int(remaining),
+            retry_after=float(retry_after) / 1000,
+            reset_after=float(reset_after) / 1000,
+        )
+
+    def status(self) -> dict:
+        return {**self.stats.as_dict(), "enabled": self.enabled, "local_keys": self.local.size}
+
+
+rate_limiter = RateLimiter()
+
+
+def _token_subject(request: Request) -> Optional[str]:
+    """The user id of a valid bearer token; the route's own auth still runs"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        return None
+
+
+def _client_address(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimit:
+    """A rate-limit policy; use it as a route dependency"""
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        period: float,
+        per: str = PER_USER,
+        cost: int = 1,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        if per not in (PER_USER, PER_IP, PER_ROUTE):
+            raise ValueError(f"Unknown rate limit scope: {per}")
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.per = per
+        self.cost = cost
+        self.limiter = limiter or rate_limiter
+
+    def key(self, request: Request, subject: Optional[str] = None) -> str:
+        if self.per == PER_ROUTE:
+            return f"ratelimit:{self.name}"
+        if self.per == PER_USER:
+            subject = subject or _token_subject(request)
+            if subject is not None:
+                return f"ratelimit:{self.name}:user:{subject}"
+        return f"ratelimit:{self.name}:ip:{_client_address(request)}"
+
+    @property
+    def policy(self) -> str:
+        return f"{self.limit};w={int(self.period)}"
+
+    async def __call__(self, request: Request) -> None:
+        await self.check(request)
+
+    async def check(self, request: Request, subject: Optional[str] = None) -> None:
+        if not self.limiter.enabled:
+            return
+        result = await self.limiter.hit(self.key(request, subject), self.limit, self.period, self.cost)
+        checks = getattr(request.state, STATE_KEY, None)
+        if checks is None:
+            checks = []
+            setattr(request.state, STATE_KEY, checks)
+        checks.append((self, result))
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))},
+            )
+
+
+class AuthenticatedRateLimit(RateLimit):
+    """A policy for routes that require a login; charged only once the user is verified"""
+
+    async def __call__(self, request: Request, current_user: User = Depends(get_current_user)) -> None:
+        await self.check(request, str(current_user.user_id))
+
+
+def rate_limit_headers(checks: Iterable[Tuple[RateLimit, RateLimitResult]]) -> List[Tuple[bytes, bytes]]:
+    """``RateLimit-*`` headers for the most restrictive of a request's checks"""
+    checks = list(checks)
+    if not checks:
+        return []
+    policy, result = min(checks, key=lambda check: (check[1].allowed, check[1].remaining))
+    headers: Dict[str, str] = {
+        "ratelimit-limit": str(result.limit),
+        "ratelimit-remaining": str(result.remaining),
+        "ratelimit-reset": str(math.ceil(result.reset_after)),
+        "ratelimit-policy": ", ".join(check[0].policy for check in checks),
+    }
+    return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+
+__all__ = [
+    'RateLimit', 'AuthenticatedRateLimit', 'RateLimiter', 'RateLimitResult', 'LocalBuckets', 'rate_limiter',
+    'rate_limit_headers', 'PER_USER', 'PER_IP', 'PER_ROUTE', 'STATE_KEY',
+]
@@ -4,35 +4,49 @@ from typing import Optional
 from fastapi import HTTPException, status
 from pydantic import BaseModel
 from ...config import settings as config
+from .revocation import revocation_epochs
 
 class TokenPayload(BaseModel):
     sub: str  # user_id
     exp: int  # timestamp
     type: str
+    epc: int = 0  # user's revocation epoch at issue
+    jti: Optional[str] = None  # refresh tokens: token id
+    fam: Optional[str] = None  # refresh tokens: rotation family
 
-def create_access_token(user_id: str, expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(user_id: str, expires_delta: Optional[timedelta] = None, epoch: int = 0) -> str:
     """Tạo JWT token từ user ID"""
     expire_minutes = int(config.ACCESS_TOKEN_EXPIRE_MINUTES)  # Convert sang int
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=expire_minutes))
     payload = {
         "sub": user_id,
         "exp": expire,
-        "type": "access" 
+        "type": "access",
+        "epc": epoch
     }
     return jwt.encode(payload, config.SECRET_KEY, algorithm=config.ALGORITHM)
 
-def create_refresh_token(user_id: str, expires_delta: Optional[timedelta] = None) -> str:
+def create_refresh_token(
+    user_id: str,
+    expires_delta: Optional[timedelta] = None,
+    epoch: int = 0,
+    jti: Optional[str] = None,
+    family: Optional[str] = None
+) -> str:
     expire_days = int(config.REFRESH_TOKEN_EXPIRE_DAYS)
     expire = datetime.utcnow() + (expires_delta or timedelta(days=expire_days))
     payload = {
         "sub": user_id,
         "exp": expire,
-        "type": "refresh"  # Important to distinguish from access token
+        "type": "refresh",  # Important to distinguish from access token
+        "epc": epoch,
+        "jti": jti,
+        "fam": family
     }
     return jwt.encode(payload, config.SECRET_KEY, algorithm=config.ALGORITHM)
 
-def verify_token(token: str, token_type: str = "access") -> TokenPayload:
-    """Xác thực JWT token"""
+async def verify_token(token: str, token_type: str = "access") -> TokenPayload:
+    """Xác thực JWT token; revocation is an epoch comparison, never a DB lookup"""
     try:
         payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
         token_data = TokenPayload(**payload)
@@ -42,7 +56,14 @@ def verify_token(token: str, token_type: str = "access") -> TokenPayload:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=f"Invalid token type: expected {token_type}",
             )
-            
+
+        if not await revocation_epochs.is_current(token_data.sub, token_data.epc):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
         return token_data
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -1,7 +1,10 @@
 # app/utils/security/password.py
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ...config import settings
+
+# Hashes made with any other cost are rehashed at the next successful login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def get_password_hash(password: str) -> str:
     """Tạo hash từ password (dùng cho đăng ký/user creation)"""
@@ -9,4 +12,8 @@ def get_password_hash(password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Kiểm tra password có khớp với hash (dùng cho đăng nhập)"""
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when the hash predates the current scheme or cost settings"""
+    return pwd_context.needs_update(hashed_password)
@@ -0,0 +1,77 @@
+"""
+Fast JSON serialization for response models.
+
+FastAPI's default path validates the endpoint result against
+response_model, converts it to Python primitives, runs jsonable_encoder
+and finally json.dumps. Here the result (usually ORM objects) is validated
+once with from_attributes and dumped straight to JSON bytes by
+pydantic-core. TypeAdapters are built once per response model and reused.
+"""
+import inspect
+from functools import lru_cache, wraps
+from typing import Any, Optional
+
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from starlette.responses import Response
+import orjson
+
+from .fieldsets import Shaped
+
+
+@lru_cache(maxsize=None)
+def get_adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def dump_json(response_model: Optional[Any], content: Any) -> bytes:
+    """Serialize `content` as `response_model` would, without the intermediate dicts"""
+    if isinstance(content, Shaped):
+        # Sparse fieldset results carry their own, narrower model
+        response_model, content = content.model, content.content
+    if response_model is None:
+        return orjson.dumps(jsonable_encoder(content))
+    adapter = get_adapter(response_model)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Route class serializing results through dump_json.
+
+    The endpoint is wrapped so it returns a ready Response; FastAPI passes
+    Response objects through untouched, which skips its own validate and
+    encode steps. Endpoints returning a Response or None (e.g. 204) behave
+    as before.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if (
+            response_model is not None
+            and not isinstance(response_model, DefaultPlaceholder)
+            and inspect.iscoroutinefunction(endpoint)
+        ):
+            endpoint = _wrap_endpoint(endpoint, response_model, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _wrap_endpoint(endpoint, response_model, status_code):
+    @wraps(endpoint)
+    async def wrapped(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        if result is None or isinstance(result, Response):
+            return result
+        return Response(
+            content=dump_json(response_model, result),
+            status_code=status_code or 200,
+            media_type="application/json",
+        )
+
+    return wrapped
+
+
+__all__ = ['get_adapter', 'dump_json', 'FastJSONRoute', 'ORJSONResponse']
@@ -0,0 +1,91 @@
+"""Realistic post/comment object graphs standing in for loaded ORM rows"""
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+_rng = random.Random(7)
+_now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+_words = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+
+def _text(words):
+    return " ".join(_rng.choice(_words) for _ in range(words))
+
+
+def _stamp():
+    return _now - timedelta(minutes=_rng.randrange(100_000))
+
+
+def make_user():
+    name = _text(1) + str(_rng.randrange(10_000))
+    return SimpleNamespace(
+        user_id=uuid.uuid4(), username=name, email=f"{name}@example.com",
+        full_name=_text(2), bio=_text(20), profile_picture=None,
+        is_active=True, is_superuser=False, created_at=_stamp(), updated_at=_stamp(),
+    )
+
+
+def make_post(users, categories, tags, content_words=800):
+    created = _stamp()
+    post_id = uuid.uuid4()
+    author = _rng.choice(users)
+    return SimpleNamespace(
+        post_id=post_id, title=_text(8), slug=_text(4).replace(" ", "-"),
+        content=_text(content_words), summary=_text(40), is_published=True,
+        author_id=author.user_id, published_at=created, created_at=created, updated_at=created,
+        comment_count=_rng.randrange(50), media_count=2, view_count=_rng.randrange(10_000),
+        author=author,
+        categories=_rng.sample(categories, 2),
+        tags=_rng.sample(tags, 5),
+        media=[
+            SimpleNamespace(
+                media_id=uuid.uuid4(), file_name="cover.jpg",
+                file_path="https://res.cloudinary.com/demo/image/upload/v1/blog_api/cover.jpg",
+                mime_type="image/jpeg", post_id=post_id, user_id=None,
+                created_at=created, updated_at=created,
+            )
+            for _ in range(2)
+        ],
+    )
+
+
+def make_posts(n=100):
+    users = [make_user() for _ in range(20)]
+    categories = [
+        SimpleNamespace(category_id=uuid.uuid4(), name=_text(2), description=_text(12), slug=_text(2),
+                        post_count=10, created_at=_stamp(), updated_at=_stamp())
+        for _ in range(10)
+    ]
+    tags = [
+        SimpleNamespace(tag_id=uuid.uuid4(), name=_text(1), slug=_text(1), post_count=5,
+                        created_at=_stamp(), updated_at=_stamp())
+        for _ in range(40)
+    ]
+    return [make_post(users, categories, tags) for _ in range(n)]
+
+
+def make_comment_tree(roots=50, fanout=3, depth=3):
+    users = [make_user() for _ in range(20)]
+    post_id = uuid.uuid4()
+
+    def node(parent_id, level):
+        comment_id = uuid.uuid4()
+        stamp = _stamp()
+        return SimpleNamespace(
+            comment_id=comment_id, content=_text(30), post_id=post_id,
+            user_id=None, parent_id=parent_id, created_at=stamp, updated_at=stamp,
+            user=_rng.choice(users),
+            replies=[node(comment_id, level + 1) for _ in range(fanout)] if level < depth else [],
+        )
+
+    comments = [node(None, 1) for _ in range(roots)]
+    for c in _walk(comments):
+        c.user_id = c.user.user_id
+    return comments
+
+
+def _walk(comments):
+    for c in comments:
+        yield c
+        yield from _walk(c.replies)
@@ -0,0 +1,189 @@
+"""
+Login -> refresh -> reuse through the real /auth router. Redis is an
+in-memory stand-in (ROTATE_SCRIPT ported to Python) and authentication
+and the database are stubbed, so what runs is the routing and the token
+store.
+"""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import dependencies as auth_dependencies
+from app.database.session import get_db
+from app.routes import auth as auth_routes
+from app.service.refresh_tokens import ROTATE_SCRIPT, RefreshTokenStore
+from app.utils.security.revocation import epoch_key, revocation_epochs
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value))
+
+    async def execute(self):
+        for key, value in self.commands:
+            await self.redis.set(key, value)
+        return [True] * len(self.commands)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = str(value)
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, source):
+        assert source == ROTATE_SCRIPT
+        return self._rotate
+
+    async def _rotate(self, keys, args):
+        token, family, new_token = keys
+        jti, new_jti, fam, _ttl = args
+        if self.data.get(token) != fam:
+            return "revoked"
+        head = self.data.get(family)
+        if head is None:
+            return "revoked"
+        if head != jti:
+            del self.data[family]
+            return "reused"
+        self.data[family] = new_jti
+        self.data[new_token] = fam
+        return "rotated"
+
+
+class FakeResult:
+    def __init__(self, user):
+        self.user = user
+
+    def scalar_one_or_none(self):
+        return self.user
+
+
+class FakeSession:
+    def __init__(self, user):
+        self.user = user
+
+    async def execute(self, query):
+        return FakeResult(self.user)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    redis = FakeRedis()
+    user = SimpleNamespace(user_id=uuid.uuid4(), is_active=True)
+
+    async def authenticate_user(db, email, password, client_ip=None):
+        return user
+
+    monkeypatch.setattr(auth_routes, "token_store", RefreshTokenStore(redis=redis))
+    monkeypatch.setattr(auth_routes, "authenticate_user", authenticate_user)
+    monkeypatch.setattr(revocation_epochs, "redis", redis)
+    revocation_epochs._cache.clear()
+
+    app = FastAPI()
+    app.include_router(auth_routes.router)
+
+    async def db():
+        yield FakeSession(user)
+
+    app.dependency_overrides[get_db] = db
+    return TestClient(app)
+
+
+def login(client):
+    response = client.post("/auth/login", json={"email": "a@example.com", "password": "secret"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def refresh(client, token):
+    return client.post("/auth/refresh", json={"refresh_token": token})
+
+
+def test_refresh_rotates_and_reuse_revokes_family(client):
+    first = login(client)
+
+    rotated = refresh(client, first["refresh_token"])
+    assert rotated.status_code == 200, rotated.text
+    second = rotated.json()
+    assert second["refresh_token"] != first["refresh_token"]
+
+    # The spent token comes back: the family is revoked, current head included
+    assert refresh(client, first["refresh_token"]).status_code == 401
+    assert refresh(client, second["refresh_token"]).status_code == 401
+
+
+def test_logout_revokes_the_session(client):
+    tokens = login(client)
+    assert client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 204
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_logout_all_revokes_tokens_issued_before(client):
+    tokens = login(client)
+    response = client.post("/auth/logout-all", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 204
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    # A login afterwards gets the new epoch straight away
+    assert refresh(client, login(client)["refresh_token"]).status_code == 200
+
+
+
+def test_refresh_checks_the_epoch_in_redis(client):
+    tokens = login(client)
+    user_id = jwt.decode(tokens["refresh_token"], options={"verify_signature": False})["sub"]
+    # Signed out everywhere on another worker while this one caches epoch 0
+    revocation_epochs._remember(user_id, 0)
+    asyncio.run(revocation_epochs.redis.incr(epoch_key(user_id)))
+
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    revocation_epochs._cache.clear()
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+
+def test_refresh_token_is_not_a_bearer_token(client, monkeypatch):
+    user = SimpleNamespace(is_active=True)
+
+    class Loader:
+        async def load(self, model, pk):
+            return user
+
+    monkeypatch.setattr(auth_dependencies, "get_loader", lambda db: Loader())
+
+    @client.app.get("/whoami")
+    async def whoami(current_user=Depends(auth_dependencies.get_current_user)):
+        return {}
+
+    tokens = login(client)
+    assert client.get("/whoami", headers={"Authorization": f"Bearer {tokens['access_token']}"}).status_code == 200
+    assert client.get("/whoami", headers={"Authorization": f"Bearer {tokens['refresh_token']}"}).status_code == 401
@@ -0,0 +1,72 @@
+"""
+AuthenticatedRateLimit on a login-only route: requests that fail
+authentication must not draw on the buckets. Buckets are the in-process
+ones (the cache backend is put in memory mode) and get_current_user is
+stubbed to accept ``Bearer user-<n>``.
+"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.testclient import TestClient
+
+from app.auth.dependencies import get_current_user
+from app.cache import cache_backend, MODE_MEMORY
+from app.middlewares.ratelimit import RateLimitHeadersMiddleware
+from app.utils.ratelimit import AuthenticatedRateLimit, RateLimiter, PER_ROUTE
+
+
+class NoRedis:
+    def register_script(self, source):
+        async def script(keys, args):
+            raise ConnectionError("no redis here")
+        return script
+
+
+async def fake_current_user(request: Request):
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme != "Bearer" or not token.startswith("user-"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    return SimpleNamespace(user_id=token)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(cache_backend.metrics, "mode", MODE_MEMORY)
+    limiter = RateLimiter(redis=NoRedis(), enabled=True)
+    limits = [
+        Depends(AuthenticatedRateLimit("test:write", 1, 60, limiter=limiter)),
+        Depends(AuthenticatedRateLimit("test:write", 3, 60, per=PER_ROUTE, limiter=limiter)),
+    ]
+    app = FastAPI()
+    app.add_middleware(RateLimitHeadersMiddleware)
+
+    @app.post("/write", dependencies=limits)
+    async def write(current_user=Depends(get_current_user)):
+        return {"user": current_user.user_id}
+
+    app.dependency_overrides[get_current_user] = fake_current_user
+    return TestClient(app)
+
+
+def login(user):
+    return {"Authorization": f"Bearer user-{user}"}
+
+
+def test_unauthenticated_requests_leave_the_route_budget_alone(client):
+    for _ in range(10):
+        assert client.post("/write").status_code == 401
+        assert client.post("/write", headers={"Authorization": "Bearer forged"}).status_code == 401
+
+    for user in range(3):
+        response = client.post("/write", headers=login(user))
+        assert response.status_code == 200
+        assert response.headers["ratelimit-remaining"] == "0"
+
+
+def test_users_are_limited_by_id(client):
+    assert client.post("/write", headers=login(1)).status_code == 200
+    response = client.post("/write", headers=login(1))
+    assert response.status_code == 429
+    assert response.headers["retry-after"]
+    assert client.post("/write", headers=login(2)).status_code == 200
@@ -0,0 +1,45 @@
+"""
+Errors the comment service raises on purpose reach the client as they
+are. The service, the user and the session are stand-ins.
+"""
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException, status
+from fastapi.testclient import TestClient
+
+from app.auth.dependencies import get_current_user
+from app.database.session import get_db
+from app.routes import comment as comment_routes
+from app.utils.ratelimit import rate_limiter
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "enabled", False)
+    app = FastAPI()
+    app.include_router(comment_routes.router)
+
+    async def db():
+        yield None
+
+    app.dependency_overrides[get_db] = db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(user_id=uuid.uuid4(), is_superuser=False)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("error", [
+    HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent comment not found"),
+    HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Thread is too deep to reply here"),
+])
+def test_create_comment_keeps_service_errors(client, monkeypatch, error):
+    async def create_comment(db, comment, user_id):
+        raise error
+
+    monkeypatch.setattr(comment_routes.comment_service, "create_comment", create_comment)
+    response = client.post("/comments/", json={
+        "content": "hi", "post_id": str(uuid.uuid4()), "parent_id": str(uuid.uuid4()),
+    })
+    assert response.status_code == error.status_code
+    assert response.json()["detail"] == error.detail
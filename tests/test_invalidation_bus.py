@@ -0,0 +1,62 @@
+"""
+What an outbox notification makes a worker reload. The taxonomy is
+replaced by a recorder; no Postgres connection is opened.
+"""
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi_cache import FastAPICache
+
+from app.service import invalidation_bus as bus_module
+from app.service.invalidation_bus import InvalidationBus
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    async def rebuild(self, force=False):
+        self.calls.append(("rebuild",))
+
+    async def refresh(self, tag_ids=(), category_ids=()):
+        self.calls.append(("refresh", set(tag_ids), set(category_ids)))
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(bus_module, "taxonomy", recorder)
+    monkeypatch.setattr(bus_module.outbox_relay, "wake", lambda: None)
+    monkeypatch.setattr(FastAPICache, "_prefix", "test")
+    return recorder
+
+
+def notify(bus, topic, aggregate_id, **payload):
+    event = {"topic": topic, "aggregate_id": str(aggregate_id), "payload": {k: [str(i) for i in v] for k, v in payload.items()}}
+    bus._on_notify(None, 0, "outbox", json.dumps(event))
+
+
+def test_only_taxonomy_row_changes_reload_it(recorder):
+    tag_id, other_tag_id, category_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    async def scenario():
+        bus = InvalidationBus(dsn="postgresql://unused", enabled=False)
+        notify(bus, "post.created", uuid.uuid4(), tag_ids=[tag_id], category_ids=[category_id])
+        notify(bus, "tag.posts_changed", tag_id, post_ids=[uuid.uuid4()])
+        notify(bus, "category.posts_changed", category_id, post_ids=[uuid.uuid4()])
+        await asyncio.sleep(0)
+        assert recorder.calls == []
+
+        notify(bus, "tag.updated", tag_id)
+        notify(bus, "tag.deleted", other_tag_id)
+        notify(bus, "category.created", category_id)
+        await bus._taxonomy_task
+        assert recorder.calls == [("refresh", {tag_id, other_tag_id}, {category_id})]
+
+        bus._on_notify(None, 0, "outbox", json.dumps({"topic": "tag.updated", "aggregate_id": str(tag_id), "overflow": True}))
+        await bus._taxonomy_task
+        assert recorder.calls[-1] == ("rebuild",)
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+"""
+A known and an unknown email must be indistinguishable while the hashing
+slots are saturated: both queue, and both get the same 503.
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.service.login_guard import LoginGuard
+
+
+class NoRedis:
+    def register_script(self, source):
+        return None
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_HASH_QUEUE_TIMEOUT", 0.05)
+    guard = LoginGuard(redis=NoRedis(), concurrency=1)
+    guard._verify_time = 0.01
+    return guard
+
+
+async def outcome(attempt):
+    try:
+        await attempt
+    except HTTPException as e:
+        return e.status_code, e.detail
+    return None
+
+
+def test_known_and_unknown_emails_fail_alike_when_saturated(guard, monkeypatch):
+    monkeypatch.setattr("app.service.login_guard.verify_password", lambda password, password_hash: False)
+
+    async def scenario():
+        async with guard._slot():
+            known = await outcome(guard.verify("secret", "hash"))
+            unknown = await outcome(guard.imitate_verify())
+        assert known == unknown
+        assert known[0] == 503
+        # With a slot free both go through
+        assert await outcome(guard.verify("secret", "hash")) is None
+        assert await outcome(guard.imitate_verify()) is None
+
+    asyncio.run(scenario())
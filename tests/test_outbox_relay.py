@@ -0,0 +1,48 @@
+"""
+The relay deletes outbox rows only once Redis has the purge. The session
+and Redis are stand-ins.
+"""
+import asyncio
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi_cache import FastAPICache
+
+from app.cache import cache_backend, MODE_MEMORY
+from app.service.outbox import OutboxRelay
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.committed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: list(self.rows)))
+
+    async def commit(self):
+        self.committed = True
+
+
+def test_rows_stay_when_the_purge_skipped_redis(monkeypatch):
+    monkeypatch.setattr(FastAPICache, "_prefix", "test")
+    monkeypatch.setattr(cache_backend.metrics, "mode", MODE_MEMORY)
+    row = SimpleNamespace(id=1, topic="post.updated", aggregate_id=uuid.uuid4(), payload={}, created_at=datetime.now())
+    session = FakeSession([row])
+    relay = OutboxRelay(session_factory=lambda: session, redis=None, batch_size=10)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(relay.relay_once())
+    assert len(session.statements) == 1  # the select, no delete
+    assert not session.committed
+    assert relay.published == 0
@@ -0,0 +1,58 @@
+"""
+PrefixIndex.updated against a fresh build over the same items. A small
+scan_limit makes most short prefixes precomputed, so the incremental
+top-list maintenance is what gets compared.
+"""
+import random
+
+import pytest
+
+from app.utils.prefix_index import PrefixIndex
+
+
+def entry(item_id, name, rank):
+    return (name, *name.split()[1:]), (rank, name, item_id), item_id, f"{item_id}:{name}"
+
+
+def random_name(rng):
+    return " ".join(
+        "".join(rng.choice("abc") for _ in range(rng.randint(1, 5)))
+        for _ in range(rng.randint(1, 3))
+    )
+
+
+def queries():
+    return [a + b for a in "abc" for b in ["", *"abc"]] + ["a b", "ab c", "z"]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_updated_matches_a_fresh_build(seed):
+    rng = random.Random(seed)
+    items = {i: (random_name(rng), rng.randint(0, 50)) for i in range(300)}
+    index = PrefixIndex((entry(i, *item) for i, item in items.items()), max_results=5, scan_limit=4)
+
+    for _ in range(5):
+        removed = rng.sample(sorted(items), 5)
+        changed = rng.sample(sorted(set(items) - set(removed)), 5)
+        for i in removed:
+            del items[i]
+        for i in changed:
+            name, rank = items[i]
+            items[i] = (random_name(rng) if rng.random() < 0.5 else name, rng.randint(0, 50))
+        for _ in range(3):
+            i = max(items) + 1 + rng.randint(0, 5)
+            items[i] = (random_name(rng), rng.randint(0, 50))
+            changed.append(i)
+
+        index = index.updated([entry(i, *items[i]) for i in changed], removed=removed)
+        fresh = PrefixIndex((entry(i, *item) for i, item in items.items()), max_results=5, scan_limit=4)
+        assert len(index) == len(fresh)
+        for q in queries():
+            assert index.search(q, 5) == fresh.search(q, 5), q
+
+
+def test_updated_leaves_the_original_alone():
+    index = PrefixIndex([entry(1, "alpha", 1), entry(2, "beta", 2)])
+    index.updated([entry(3, "alpine", 0)], removed=[1])
+    assert index.search("al") == ["1:alpha"]
+    assert index.updated(removed=[1]).search("al") == []
@@ -0,0 +1,44 @@
+"""
+Counter repairs record an outbox event per repaired row in the batch's
+transaction. The session is a stand-in answering the id query and the
+repair UPDATE in turn.
+"""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.jobs.reconcile_counters import reconcile_counter, _counter_specs
+from app.models import Tag, OutboxEvent
+
+
+class FakeSession:
+    def __init__(self, batches):
+        self.results = [ids for batch in batches for ids in batch] + [[]]
+        self.added = []
+        self.commits = []
+
+    async def execute(self, statement):
+        rows = self.results.pop(0)
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: list(rows)))
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        self.commits.append(self.added)
+        self.added = []
+
+
+def test_repaired_rows_are_announced_in_their_batch():
+    spec = next(spec for spec in _counter_specs() if spec[0] is Tag)
+    ids = sorted(uuid.uuid4() for _ in range(4))
+    # (ids of the batch, ids the UPDATE repaired)
+    session = FakeSession([(ids[:2], [ids[1]]), (ids[2:], [ids[2], ids[3]])])
+
+    repaired = asyncio.run(reconcile_counter(session, *spec, batch_size=2))
+
+    assert repaired == 3
+    assert len(session.commits) == 2
+    assert all(isinstance(event, OutboxEvent) for batch in session.commits for event in batch)
+    assert [(e.topic, e.aggregate_id) for e in session.commits[0]] == [("tag.updated", ids[1])]
+    assert [(e.topic, e.aggregate_id) for e in session.commits[1]] == [("tag.updated", ids[2]), ("tag.updated", ids[3])]
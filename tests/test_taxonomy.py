@@ -0,0 +1,109 @@
+"""
+Taxonomy writes patch the snapshot instead of rebuilding it. Redis and the
+database are stand-ins: the session answers any query with the rows the
+test says are in the table.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.service.taxonomy import Taxonomy, TaxonomySnapshot
+
+T0 = datetime(2026, 1, 1)
+
+
+def tag(name, post_count=0, minutes=0, tag_id=None):
+    return SimpleNamespace(
+        tag_id=tag_id or uuid.uuid4(), name=name, slug=name.replace(" ", "-"),
+        post_count=post_count, created_at=T0 + timedelta(minutes=minutes), updated_at=T0,
+    )
+
+
+def category(name, minutes=0):
+    return SimpleNamespace(
+        category_id=uuid.uuid4(), name=name, description=None, slug=name,
+        post_count=0, created_at=T0 + timedelta(minutes=minutes), updated_at=T0,
+    )
+
+
+class FakeRedis:
+    def __init__(self):
+        self.version = 0
+
+    async def get(self, key):
+        return str(self.version)
+
+    async def incr(self, key):
+        self.version += 1
+        return self.version
+
+
+class FakeSession:
+    """Answers a query with every row of the table it selects from"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query):
+        table = query.get_final_froms()[0].name
+        rows = self.db[table]
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: list(rows)))
+
+
+def snapshot_state(snapshot):
+    return (
+        [t.model_dump() for t in snapshot.tags],
+        [c.model_dump() for c in snapshot.categories],
+        {slug: t.tag_id for slug, t in snapshot.tags_by_slug.items()},
+        {slug: c.category_id for slug, c in snapshot.categories_by_slug.items()},
+        {q: [t.tag_id for t in snapshot.tag_index.search(q, 20)] for q in ("py", "python", "web", "d", "data")},
+    )
+
+
+def test_patched_matches_a_build():
+    tags = [tag("python", 5), tag("pytest", 3, 1), tag("web dev", 2, 2), tag("data", 9, 3)]
+    categories = [category("news"), category("docs", 1)]
+    snapshot = TaxonomySnapshot.build(1, categories, tags)
+
+    renamed = tag("python web", 7, tag_id=tags[0].tag_id)
+    added = tag("pydata", 1, 4)
+    news = SimpleNamespace(**{**vars(categories[0]), "slug": "press"})
+    patched = snapshot.patched(
+        2, [news], [news.category_id, categories[1].category_id],
+        [renamed, added], [renamed.tag_id, added.tag_id, tags[3].tag_id],
+    )
+
+    expected = TaxonomySnapshot.build(2, [news], [renamed, tags[1], tags[2], added])
+    assert snapshot_state(patched) == snapshot_state(expected)
+    assert patched.version == 2 and patched.built_at == snapshot.built_at
+
+
+def test_invalidate_patches_and_keeps_track_of_the_version():
+    db = {"categories": [], "tags": [tag("python", 5)]}
+    redis = FakeRedis()
+    taxonomy = Taxonomy(redis=redis, session_factory=lambda: FakeSession(db))
+
+    async def scenario():
+        await taxonomy.rebuild(force=True)
+        first = taxonomy.snapshot
+
+        db["tags"] = [*db["tags"], tag("pytest", 1, 1)]
+        await taxonomy.invalidate(tag_ids=[db["tags"][1].tag_id])
+        assert taxonomy.snapshot.built_at == first.built_at
+        assert taxonomy.snapshot.version == 1
+        assert [t.name for t in taxonomy.snapshot.tag_index.search("py")] == ["python", "pytest"]
+
+        # Another process bumped too: the snapshot keeps the older version,
+        # so the poll still rebuilds for the change it hasn't got
+        redis.version += 1
+        await taxonomy.invalidate(tag_ids=[db["tags"][1].tag_id])
+        assert taxonomy.snapshot.version == 1
+
+    asyncio.run(scenario())